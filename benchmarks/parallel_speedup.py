@@ -0,0 +1,92 @@
+"""Speedup of convert_gene(n_jobs=...) over a single process
+
+Builds 10X-style frames of increasing size from the bundled human lookup
+table and times convert_gene() with each number of processes. Prints one
+row per (rows, n_jobs) with the wall time and the speedup over n_jobs=1,
+and optionally writes the same table to a CSV file.
+
+    python benchmarks/parallel_speedup.py --rows 1000000 10000000 --jobs 1 2 4 8 16
+
+Inputs below tcrconvert.parallel.MIN_PARALLEL_ROWS always run in one
+process; use --min-rows to lower the threshold when measuring where
+parallelism starts to pay off. No more processes than CPUs are started.
+
+Measured results are kept in benchmarks/results/, one CSV per machine
+named by its CPU count.
+"""
+
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from tcrconvert import convert, parallel
+
+
+def make_frame(n_rows, unmapped=0.05, seed=0):
+    """10X-style gene columns with a share of unmapped genes"""
+
+    rng = np.random.default_rng(seed)
+    lookup = convert.read_lookup(convert.choose_lookup('tenx', 'imgt', verbose=False))
+    df = pd.DataFrame(index=range(n_rows))
+    for col, prefix in [
+        ('v_gene', 'V'),
+        ('d_gene', 'D'),
+        ('j_gene', 'J'),
+        ('c_gene', 'C'),
+    ]:
+        genes = lookup['tenx'][lookup['tenx'].str[3] == prefix].to_numpy()
+        values = rng.choice(genes, n_rows).astype(object)
+        values[rng.random(n_rows) < unmapped] = f'TRB{prefix}999'
+        df[col] = values
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--rows', type=int, nargs='+', default=[250_000, 1_000_000, 4_000_000]
+    )
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument(
+        '--repeat', type=int, default=3, help='Keep the best of this many runs'
+    )
+    parser.add_argument('--min-rows', type=int, default=None)
+    parser.add_argument(
+        '--output', default=None, help='Also write the results to this CSV'
+    )
+    args = parser.parse_args()
+
+    if args.min_rows is not None:
+        parallel.MIN_PARALLEL_ROWS = args.min_rows
+
+    rows = []
+    for n_rows in args.rows:
+        df = make_frame(n_rows)
+        base = None
+        for n_jobs in args.jobs:
+            best = float('inf')
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                convert.convert_gene(df, 'tenx', 'imgt', verbose=False, n_jobs=n_jobs)
+                best = min(best, time.perf_counter() - start)
+            base = base or best
+            rows.append(
+                {
+                    'rows': n_rows,
+                    'n_jobs': n_jobs,
+                    'cpus': os.cpu_count(),
+                    'seconds': round(best, 3),
+                    'speedup': round(base / best, 2),
+                }
+            )
+            print(', '.join(f'{k}={v}' for k, v in rows[-1].items()), flush=True)
+
+    table = pd.DataFrame(rows)
+    print(table.to_string(index=False))
+    if args.output:
+        table.to_csv(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,25 @@
-from .convert import convert_gene
-from .build_lookup import build_lookup_from_fastas
+from .convert import convert_gene, convert_file
+from .build_lookup import build_lookup_from_fastas, build_all_lookups
+from .arrow import convert_arrow
+from .dataset import convert_dataset
+from .converter import Converter
+from .aio import AsyncConverter, convert_gene_async, convert_file_async
+from .detect import detect_format
+from .registry import list_species
 from .utils import get_example_path
 
-__all__ = ['convert_gene', 'build_lookup_from_fastas', 'get_example_path']
+__all__ = [
+    'convert_gene',
+    'convert_file',
+    'build_lookup_from_fastas',
+    'build_all_lookups',
+    'convert_arrow',
+    'convert_dataset',
+    'Converter',
+    'AsyncConverter',
+    'convert_gene_async',
+    'convert_file_async',
+    'detect_format',
+    'list_species',
+    'get_example_path',
+]
@@ -0,0 +1,447 @@
+import os
+import time
+import uuid
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+from . import convert, registry
+from .metrics import stage
+from .convert import (
+    check_convert_args,
+    choose_lookup,
+    delimiter,
+    lookup_mapping,
+    read_lookup,
+)
+
+# Most worker threads of a converter's own executor
+MAX_WORKERS = 4
+
+# Converter used by convert_gene_async() and convert_file_async()
+_shared = None
+
+
+class AsyncConverter:
+    """Convert gene names from asyncio code without blocking the event loop
+
+    Reading lookup tables, converting and file I/O run in a bounded thread
+    pool, so a slow conversion only holds one worker while the event loop
+    keeps serving other requests. Gene name mappings are cached per
+    (species, ``frm``, ``to``) and shared by every coroutine using the
+    converter; they are reloaded when the species' tables are rebuilt.
+    Concurrent requests for a mapping that is not cached yet wait for a
+    single load instead of each reading the lookup table.
+
+    Cancelling a call stops it at the next step (detection, lookup or the
+    conversion itself). A step already running in a worker thread finishes
+    in the background and its result is dropped; ``convert_file()`` writes
+    through a temporary file, so a cancelled call never leaves an output
+    behind.
+
+    :param max_workers: Worker threads of the converter's own pool, defaults to ``MAX_WORKERS`` or the number of CPUs if lower
+    :type max_workers: int, optional
+    :param executor: Executor to run blocking work in instead of a pool of the converter's own. It is not shut down by ``close()``.
+    :type executor: concurrent.futures.Executor, optional
+
+    :Example:
+
+    >>> import asyncio
+    >>> import pandas as pd
+    >>> import tcrconvert
+    >>> df = pd.read_csv(tcrconvert.get_example_path('tenx.csv'))
+    >>> async def main():
+    ...     async with tcrconvert.AsyncConverter() as conv:
+    ...         outs = await asyncio.gather(
+    ...             *(conv.convert_gene(df, 'tenx', 'imgt', verbose=False) for _ in range(3))
+    ...         )
+    ...         return conv.loads, outs[0]['v_gene'].tolist()
+    >>> asyncio.run(main())
+    (1, ['TRAV29/DV5*01', 'TRBV20/OR9-2*01', 'TRDV2*01', 'TRGV9*01'])
+    """
+
+    def __init__(self, max_workers=None, executor=None):
+        if max_workers is None:
+            max_workers = min(MAX_WORKERS, os.cpu_count() or 1)
+        self.max_workers = max_workers
+        self._executor = executor
+        self._owner = executor is None
+        self._mappings = {}
+        self._loading = {}
+        self.loads = 0
+
+    @property
+    def executor(self):
+        """Executor that runs the blocking work, started on first use
+
+        :rtype: concurrent.futures.Executor
+        """
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                self.max_workers, thread_name_prefix='tcrconvert'
+            )
+        return self._executor
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking function in the executor
+
+        :param func: Function to call
+        :type func: callable
+        :param args: Positional arguments of ``func``
+        :param kwargs: Keyword arguments of ``func``
+        :return: What ``func`` returns
+        """
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def mapping(self, frm, to, species='human'):
+        """Get the gene name mapping for a conversion, loading it at most once
+
+        :param frm: Input format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+        :type frm: str
+        :param to: Output format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+        :type to: str
+        :param species: Species name, defaults to ``'human'``
+        :type species: str, optional
+        :return: Output gene names keyed by input gene name, as from ``convert.lookup_mapping()``
+        :rtype: dict
+        """
+
+        key = (species, frm, to)
+        cached = self._mappings.get(key)
+        if cached is not None:
+            # Rescanning the registry reads the lookup folders
+            info = await self.run(registry.get_species, species)
+            if info is not None and cached[0] == (info['path'], info['built']):
+                return cached[1]
+
+        # One load per key; waiters are shielded so that cancelling one of
+        # them does not cancel the load for the others
+        loop = asyncio.get_running_loop()
+        task = self._loading.get(key)
+        if task is None or task.get_loop() is not loop:
+            task = loop.create_task(self._load(key))
+            self._loading[key] = task
+        return await asyncio.shield(task)
+
+    async def _species_mappings(self, frm, to, species, names, metrics=None):
+        """Get the mapping, or with a species column (``names`` not ``None``) a mapping per species"""
+
+        start = time.perf_counter()
+        if names is None:
+            mapping = await self.mapping(frm, to, species)
+        else:
+            found = await asyncio.gather(*(self.mapping(frm, to, sp) for sp in names))
+            mapping = dict(zip(names, found))
+        if metrics is not None:
+            metrics.inc('tcrconvert_lookup_load_seconds', time.perf_counter() - start)
+        return mapping
+
+    async def _load(self, key):
+        try:
+            built, mapping = await self.run(_load_mapping, *key)
+            self._mappings[key] = (built, mapping)
+            self.loads += 1
+            return mapping
+        finally:
+            if self._loading.get(key) is asyncio.current_task():
+                del self._loading[key]
+
+    async def convert_gene(
+        self,
+        df,
+        frm,
+        to,
+        species='human',
+        frm_cols=[],
+        verbose=True,
+        metrics=None,
+        n_jobs=None,
+        multi_sep=None,
+        join_sep=None,
+        partial='na',
+        resolve=False,
+    ):
+        """Convert gene names
+
+        Same as ``convert_gene()``, with the lookup and the conversion run in the executor.
+
+        :param df: Dataframe containing TCR gene names
+        :type df: DataFrame
+        :param frm: Input format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+        :type frm: str
+        :param to: Output format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+        :type to: str
+        :param species: Species name, or a column of ``df`` holding each row's species. Defaults to ``'human'``.
+        :type species: str, optional
+        :param frm_cols: Custom gene column names.
+        :type frm_cols: list of str, optional
+        :param verbose: Whether to show all messages. Defaults to ``True``.
+        :type verbose: bool, optional
+        :param metrics: Metrics to record rows, unmapped genes, skipped columns and timings to
+        :type metrics: tcrconvert.metrics.Metrics, optional
+        :param n_jobs: Number of processes to convert large inputs with. Defaults to ``None`` (no parallelism).
+        :type n_jobs: int, optional
+        :param multi_sep: Characters that separate calls within a cell. Defaults to ``None`` (cells hold one gene).
+        :type multi_sep: str, optional
+        :param join_sep: Separator between converted calls. Defaults to the first character of ``multi_sep``.
+        :type join_sep: str, optional
+        :param partial: ``'na'`` or ``'drop'``, what to do with partly converted cells. Defaults to ``'na'``.
+        :type partial: str, optional
+        :param resolve: Convert genes missing from the lookup tables with the naming rules. Defaults to ``False``.
+        :type resolve: bool, optional
+        :return: Converted TCR data
+        :rtype: DataFrame
+        """
+
+        check_convert_args(df, frm, to)
+
+        names = None
+        if isinstance(species, str) and species in df.columns:
+            names = df[species].dropna().unique().tolist()
+        mapping = await self._species_mappings(frm, to, species, names, metrics)
+
+        return await self.run(
+            convert.convert_gene,
+            df,
+            frm,
+            to,
+            species,
+            frm_cols,
+            verbose,
+            metrics,
+            n_jobs,
+            multi_sep,
+            join_sep,
+            partial,
+            resolve,
+            mapping,
+        )
+
+    async def convert_file(
+        self,
+        input,
+        output,
+        frm,
+        to,
+        species='human',
+        frm_cols=[],
+        verbose=True,
+        passthrough=False,
+        dtype_backend=None,
+        metrics=None,
+        n_jobs=None,
+        multi_sep=None,
+        join_sep=None,
+        partial='na',
+        resolve=False,
+    ):
+        """Convert gene names in a CSV or TSV file
+
+        Same as ``convert_file()``, run in the executor with the converter's
+        cached mappings. The output is written to a temporary file and moved
+        into place once complete.
+
+        :param input: Input file (CSV or TSV)
+        :type input: str
+        :param output: Output file (CSV or TSV)
+        :type output: str
+        :param frm: Input format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``, or ``'auto'`` to detect it with ``detect_format()``
+        :type frm: str
+        :param to: Output format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+        :type to: str
+        :param species: Species name, or a column of the input holding each row's species. Defaults to ``'human'``.
+        :type species: str, optional
+        :param frm_cols: Custom gene column names.
+        :type frm_cols: list of str, optional
+        :param verbose: Whether to show all messages. Defaults to ``True``.
+        :type verbose: bool, optional
+        :param passthrough: Splice converted genes into the raw records instead of going through pandas. Defaults to ``False``.
+        :type passthrough: bool, optional
+        :param dtype_backend: ``'pyarrow'`` to read columns as ``ArrowDtype`` strings. Defaults to ``None`` (object strings). Not used with ``passthrough``.
+        :type dtype_backend: str, optional
+        :param metrics: Metrics to record rows, unmapped genes, skipped columns, bytes and stage timings to
+        :type metrics: tcrconvert.metrics.Metrics, optional
+        :param n_jobs: Number of processes, see ``convert_file()``
+        :type n_jobs: int, optional
+        :param multi_sep: Characters that separate calls within a cell, see ``convert_gene()``. Not used with ``passthrough``.
+        :type multi_sep: str, optional
+        :param join_sep: Separator between converted calls
+        :type join_sep: str, optional
+        :param partial: ``'na'`` or ``'drop'``, what to do with partly converted cells
+        :type partial: str, optional
+        :param resolve: Convert genes missing from the lookup tables with the naming rules, see ``convert_gene()``. Not used with ``passthrough``.
+        :type resolve: bool, optional
+        :return: Path to the output file
+        :rtype: str
+        """
+
+        cancelled = threading.Event()
+        try:
+            if frm == 'auto':
+                found = await self.run(_detect_file, input, species, verbose, metrics)
+                frm = found['frm']
+                if not frm_cols:
+                    frm_cols = found['columns']
+
+            names = None
+            if not passthrough:
+                names = await self.run(_species_names, input, species)
+            mapping = await self._species_mappings(frm, to, species, names, metrics)
+
+            await self.run(
+                _write_atomic,
+                output,
+                cancelled,
+                functools.partial(
+                    convert.convert_file,
+                    input,
+                    frm=frm,
+                    to=to,
+                    species=species,
+                    frm_cols=frm_cols,
+                    verbose=verbose,
+                    passthrough=passthrough,
+                    dtype_backend=dtype_backend,
+                    metrics=metrics,
+                    n_jobs=n_jobs,
+                    multi_sep=multi_sep,
+                    join_sep=join_sep,
+                    partial=partial,
+                    resolve=resolve,
+                    mapping=mapping,
+                ),
+            )
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+        return output
+
+    def close(self):
+        """Shut down the converter's own thread pool
+
+        Work already submitted still finishes. Cached mappings are kept, so
+        the converter can be used again and starts a new pool.
+
+        :return: None
+        """
+
+        if self._owner and self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+
+def _load_mapping(species, frm, to):
+    """Read one gene name mapping, with the build of the tables it came from"""
+
+    mapping = lookup_mapping(
+        read_lookup(choose_lookup(frm, to, species, verbose=False)), frm, to
+    )
+    info = registry.get_species(species)
+    return (info['path'], info['built']), mapping
+
+
+def _detect_file(input, species, verbose, metrics=None):
+    """Detect the format of a file as ``convert_file()`` does"""
+
+    from .detect import detect_format
+
+    with stage(metrics, 'detect'):
+        known = registry.get_species(species) is not None
+        return detect_format(input, species if known else None, verbose=verbose)
+
+
+def _species_names(input, species):
+    """Species named in a file's ``species`` column, or ``None`` if it has no such column"""
+
+    df = pd.read_csv(
+        input, sep=delimiter(input), usecols=lambda col: col == species, dtype=str
+    )
+    if species not in df.columns:
+        return None
+    return df[species].dropna().unique().tolist()
+
+
+def _write_atomic(output, cancelled, write):
+    """Call ``write`` on a temporary file and move it to ``output`` unless cancelled
+
+    The temporary file keeps the extension of ``output``, so ``write`` picks
+    the same delimiter.
+    """
+
+    folder, name = os.path.split(os.path.abspath(output))
+    tmp = os.path.join(folder, f'.tmp-{uuid.uuid4().hex}-{name}')
+    try:
+        write(tmp)
+        if not cancelled.is_set():
+            os.replace(tmp, output)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def get_converter():
+    """Get the converter shared by ``convert_gene_async()`` and ``convert_file_async()``
+
+    :return: Converter, created on first use
+    :rtype: AsyncConverter
+    """
+
+    global _shared
+    if _shared is None:
+        _shared = AsyncConverter()
+    return _shared
+
+
+async def convert_gene_async(df, frm, to, **kwargs):
+    """Convert gene names without blocking the event loop
+
+    Same as ``convert_gene()``, run by the shared ``AsyncConverter`` (see
+    ``get_converter()``), so every caller in the process uses the same warm
+    mappings and worker threads. Takes the arguments of ``AsyncConverter.convert_gene()``.
+
+    :param df: Dataframe containing TCR gene names
+    :type df: DataFrame
+    :param frm: Input format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type frm: str
+    :param to: Output format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type to: str
+    :return: Converted TCR data
+    :rtype: DataFrame
+    """
+
+    return await get_converter().convert_gene(df, frm, to, **kwargs)
+
+
+async def convert_file_async(input, output, frm, to, **kwargs):
+    """Convert gene names in a CSV or TSV file without blocking the event loop
+
+    Same as ``convert_file()``, run by the shared ``AsyncConverter`` (see
+    ``get_converter()``). Takes the arguments of ``AsyncConverter.convert_file()``.
+
+    :param input: Input file (CSV or TSV)
+    :type input: str
+    :param output: Output file (CSV or TSV)
+    :type output: str
+    :param frm: Input format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type frm: str
+    :param to: Output format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type to: str
+    :return: Path to the output file
+    :rtype: str
+    """
+
+    return await get_converter().convert_file(input, output, frm, to, **kwargs)
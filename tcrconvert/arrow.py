@@ -0,0 +1,418 @@
+import logging
+import click
+import pandas as pd
+
+from .convert import (
+    choose_lookup,
+    logger,
+    lookup_mapping,
+    read_lookup,
+    warn_skipped,
+    warn_unmapped,
+    which_frm_cols,
+)
+
+
+def import_pyarrow():
+    """Import pyarrow, with a helpful message if it is missing"""
+
+    try:
+        import pyarrow
+    except ImportError:
+        logger.error(
+            'pyarrow is needed for Arrow data. Install it with: pip install "tcrconvert[arrow]"'
+        )
+        raise
+    return pyarrow
+
+
+def check_pandas_arrow():
+    """Check that pandas can read files into ``ArrowDtype`` columns
+
+    ``read_csv(dtype_backend=...)`` needs pandas 2.0 or later.
+
+    :return: None
+    :raises ImportError: If pandas is older
+    """
+
+    if int(pd.__version__.split('.')[0]) < 2:
+        logger.error(
+            f'Arrow-backed columns need pandas 2.0 or later, but pandas {pd.__version__} is installed. Upgrade it with: pip install "pandas>=2.0"'
+        )
+        raise (ImportError)
+
+
+def map_dictionary(arr, mapping, memo):
+    """Map one Arrow array through its dictionary
+
+    The input is dictionary-encoded if it is not already. Only the dictionary
+    values are looked up. When every dictionary value maps to a distinct
+    gene, the result reuses the input's indices buffer; otherwise (several
+    inputs map to one gene, or some cannot be mapped) the indices are
+    remapped in one integer pass so the output dictionary stays unique and
+    free of nulls.
+
+    :param arr: Gene names
+    :type arr: pyarrow.Array
+    :param mapping: Output gene names keyed by input gene name, as returned by ``convert.lookup_mapping()``
+    :type mapping: dict
+    :param memo: Results for dictionary values already seen, updated in place
+    :type memo: dict
+    :return: Converted gene names (null where missing or not in ``mapping``),
+        the number of non-null rows that could not be mapped, and those
+        unmapped gene names
+    :rtype: tuple of (pyarrow.DictionaryArray, int, list of str)
+    """
+
+    pa = import_pyarrow()
+
+    if not pa.types.is_dictionary(arr.type):
+        arr = arr.dictionary_encode()
+
+    values = arr.dictionary.to_pylist()
+    mapped = []
+    unmapped = []
+    for i, gene in enumerate(values):
+        if gene is None:
+            mapped.append(None)
+            continue
+        if gene not in memo:
+            out = mapping.get(gene)
+            memo[gene] = None if out is None or pd.isna(out) else out
+        out = memo[gene]
+        if out is None:
+            unmapped.append(i)
+        mapped.append(None if out == 'NoData' else out)
+
+    n_bad = 0
+    bad_genes = []
+    if unmapped:
+        counts = arr.indices.value_counts()
+        used = dict(
+            zip(counts.field('values').to_pylist(), counts.field('counts').to_pylist())
+        )
+        for i in unmapped:
+            if used.get(i):
+                n_bad += used[i]
+                bad_genes.append(values[i])
+
+    # Unique output dictionary, and where each input entry lands in it
+    outputs = {}
+    transpose = [
+        None if out is None else outputs.setdefault(out, len(outputs)) for out in mapped
+    ]
+    dictionary = pa.array(list(outputs), type=arr.dictionary.type)
+    if transpose == list(range(len(transpose))):
+        indices = arr.indices
+    else:
+        indices = pa.array(transpose, type=arr.indices.type).take(arr.indices)
+    converted = pa.DictionaryArray.from_arrays(indices, dictionary)
+
+    return converted, n_bad, bad_genes
+
+
+def map_chunks(column, mapping):
+    """Map every chunk of an Arrow column
+
+    :param column: Gene names
+    :type column: pyarrow.Array or pyarrow.ChunkedArray
+    :param mapping: Output gene names keyed by input gene name
+    :type mapping: dict
+    :return: Converted gene names, the number of non-null rows that could not
+        be mapped, and those unmapped gene names
+    :rtype: tuple of (pyarrow.Array or pyarrow.ChunkedArray, int, list of str)
+    """
+
+    pa = import_pyarrow()
+
+    memo = {}
+    if not isinstance(column, pa.ChunkedArray):
+        return map_dictionary(column, mapping, memo)
+
+    chunks = []
+    n_bad = 0
+    bad_genes = set()
+    for chunk in column.chunks:
+        converted, chunk_bad, chunk_genes = map_dictionary(chunk, mapping, memo)
+        chunks.append(converted)
+        n_bad += chunk_bad
+        bad_genes.update(chunk_genes)
+
+    if chunks:
+        converted = pa.chunked_array(chunks)
+    else:
+        converted = column.dictionary_encode()
+
+    return converted, n_bad, sorted(bad_genes)
+
+
+def convert_arrow(data, frm, to, species='human', columns=[], verbose=True):
+    """Convert gene names in Arrow data
+
+    Works like ``convert_gene()`` on a ``pyarrow.Table`` or
+    ``pyarrow.RecordBatch``, or on a single array of gene names. Each gene
+    column is dictionary-encoded (an existing dictionary is reused) and only
+    the dictionary is looked up, so the cost scales with the number of
+    distinct genes. Converted columns are dictionary arrays that share the
+    input's indices buffer whenever the mapping allows it (see
+    ``map_dictionary()``); other columns are passed through without copying.
+
+    :param data: TCR data, or gene names
+    :type data: pyarrow.Table, pyarrow.RecordBatch, pyarrow.ChunkedArray or pyarrow.Array
+    :param frm: Input format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type frm: str
+    :param to: Output format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type to: str
+    :param species: Species name. Defaults to ``'human'``.
+    :type species: str, optional
+    :param columns: Custom gene column names. Ignored for arrays.
+    :type columns: list of str, optional
+    :param verbose: Whether to show all messages. Defaults to ``True``.
+    :type verbose: bool, optional
+    :return: Converted data, of the same kind as ``data``
+    :rtype: pyarrow.Table, pyarrow.RecordBatch, pyarrow.ChunkedArray or pyarrow.DictionaryArray
+
+    :Example:
+
+    >>> import pandas as pd
+    >>> import pyarrow as pa
+    >>> import tcrconvert
+    >>> tcr_file = tcrconvert.get_example_path('tenx.csv')
+    >>> table = pa.Table.from_pandas(pd.read_csv(tcr_file))
+    >>> out = tcrconvert.convert_arrow(table, 'tenx', 'imgt', verbose=False)
+    >>> out.column('v_gene').to_pylist()[:2]
+    ['TRAV29/DV5*01', 'TRBV20/OR9-2*01']
+    """
+
+    pa = import_pyarrow()
+
+    if verbose:
+        logger.setLevel(logging.INFO)
+    else:
+        logger.setLevel(logging.WARNING)
+
+    if frm == to:
+        logger.error('"frm" and "to" formats should be different.')
+        raise (ValueError)
+    if not isinstance(data, (pa.Table, pa.RecordBatch, pa.ChunkedArray, pa.Array)):
+        logger.error('Input is not an Arrow table, record batch or array.')
+        raise (TypeError)
+    if len(data) == 0:
+        logger.error('Input data is empty.')
+        raise (ValueError)
+    if to == 'adaptive' or to == 'adaptivev2':
+        logger.warning('Adaptive only captures VDJ genes; C genes will be NA.')
+
+    lookup_f = choose_lookup(frm, to, species, verbose)
+    mapping = lookup_mapping(read_lookup(lookup_f), frm, to)
+
+    if isinstance(data, (pa.ChunkedArray, pa.Array)):
+        converted, _, bad_genes = map_chunks(data, mapping)
+        warn_unmapped(bad_genes)
+        return converted
+
+    names = data.schema.names
+    cols_from = which_frm_cols(pd.DataFrame(columns=names), frm, columns, verbose)
+
+    arrays = list(data.columns)
+    fields = list(data.schema)
+    bad_genes = []
+    for col in cols_from:
+        if col not in names:
+            continue
+        i = names.index(col)
+        converted, n_bad, new_bad_genes = map_chunks(arrays[i], mapping)
+        # We don't expect the entire column of genes to be empty.
+        if n_bad < len(data):
+            arrays[i] = converted
+            fields[i] = fields[i].with_type(converted.type)
+            bad_genes += new_bad_genes
+        else:
+            warn_skipped(col)
+
+    # Display genes we couldn't convert
+    warn_unmapped(bad_genes)
+
+    schema = pa.schema(fields, metadata=data.schema.metadata)
+    if isinstance(data, pa.Table):
+        return pa.Table.from_arrays(arrays, schema=schema)
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def convert_stream(source, sink, frm, to, species='human', columns=[], verbose=True):
+    """Convert gene names in an Arrow IPC stream, one record batch at a time
+
+    Reads record batches from ``source`` and writes each one to ``sink`` as
+    soon as it is converted, so memory use stays at about one batch. The
+    lookup table is loaded once, and the result for every distinct gene is
+    kept across batches (see ``map_dictionary()``), so only genes not seen
+    before are looked up.
+
+    The output has the same schema as the input: gene columns keep their
+    type, so dictionary-encoded columns stay dictionary-encoded and string
+    columns stay strings. Gene columns should hold ``string`` or
+    ``large_string`` values. Because the schema is written before the first
+    batch, every gene column is converted, even one with no valid genes
+    (``convert_arrow()`` would leave it as is). Unmapped genes are reported
+    once the stream ends.
+
+    :param source: Arrow IPC stream to read
+    :type source: file object, bytes or pyarrow.NativeFile
+    :param sink: Where to write the converted stream
+    :type sink: file object or pyarrow.NativeFile
+    :param frm: Input format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type frm: str
+    :param to: Output format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type to: str
+    :param species: Species name. Defaults to ``'human'``.
+    :type species: str, optional
+    :param columns: Custom gene column names.
+    :type columns: list of str, optional
+    :param verbose: Whether to show all messages. Defaults to ``True``.
+    :type verbose: bool, optional
+    :return: Number of record batches and of rows written
+    :rtype: tuple of (int, int)
+
+    :Example:
+
+    >>> import io
+    >>> import pyarrow as pa
+    >>> from tcrconvert.arrow import convert_stream
+    >>> source = io.BytesIO()
+    >>> batch = pa.record_batch({'v_gene': ['TRAV1-2', 'TRBV15']})
+    >>> with pa.ipc.new_stream(source, batch.schema) as writer:
+    ...     writer.write_batch(batch)
+    >>> sink = io.BytesIO()
+    >>> convert_stream(source.getvalue(), sink, 'tenx', 'imgt', verbose=False)
+    (1, 2)
+    >>> pa.ipc.open_stream(sink.getvalue()).read_all().column('v_gene').to_pylist()
+    ['TRAV1-2*01', 'TRBV15*01']
+    """
+
+    pa = import_pyarrow()
+
+    if verbose:
+        logger.setLevel(logging.INFO)
+    else:
+        logger.setLevel(logging.WARNING)
+
+    if frm == to:
+        logger.error('"frm" and "to" formats should be different.')
+        raise (ValueError)
+    if to == 'adaptive' or to == 'adaptivev2':
+        logger.warning('Adaptive only captures VDJ genes; C genes will be NA.')
+
+    lookup_f = choose_lookup(frm, to, species, verbose)
+    mapping = lookup_mapping(read_lookup(lookup_f), frm, to)
+
+    reader = pa.ipc.open_stream(source)
+    schema = reader.schema
+    names = schema.names
+    cols_from = which_frm_cols(pd.DataFrame(columns=names), frm, columns, verbose)
+    positions = [names.index(col) for col in cols_from if col in names]
+    memos = {i: {} for i in positions}
+
+    # The converted dictionary is cast back to the column's type, which
+    # Arrow supports for these types only
+    for i in positions:
+        value_type = schema.field(i).type
+        if pa.types.is_dictionary(value_type):
+            value_type = value_type.value_type
+        if not (pa.types.is_string(value_type) or pa.types.is_large_string(value_type)):
+            logger.error(
+                f'Gene column {names[i]} has type {schema.field(i).type}; '
+                'use string or large_string, dictionary-encoded or not.'
+            )
+            raise (ValueError)
+
+    n_batches = n_rows = 0
+    bad_genes = set()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in reader:
+            if len(batch):
+                arrays = list(batch.columns)
+                for i in positions:
+                    converted, _, new_bad_genes = map_dictionary(
+                        arrays[i], mapping, memos[i]
+                    )
+                    if not pa.types.is_dictionary(schema.field(i).type):
+                        converted = converted.cast(schema.field(i).type)
+                    arrays[i] = converted
+                    bad_genes.update(new_bad_genes)
+                batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+            writer.write_batch(batch)
+            if hasattr(sink, 'flush'):
+                sink.flush()
+            n_batches += 1
+            n_rows += len(batch)
+
+    # Display genes we couldn't convert
+    warn_unmapped(sorted(bad_genes))
+
+    return n_batches, n_rows
+
+
+# Command-line version of convert_stream()
+@click.command(name='arrow-stream')
+@click.option(
+    '-i',
+    '--input',
+    default='-',
+    type=click.File('rb'),
+    help='Arrow IPC stream to read',
+    show_default='stdin',
+)
+@click.option(
+    '-o',
+    '--output',
+    default='-',
+    type=click.File('wb'),
+    help='Where to write the converted stream',
+    show_default='stdout',
+)
+@click.option(
+    '-f',
+    '--frm',
+    help='Input TCR gene format',
+    required=True,
+    type=click.Choice(['tenx', 'adaptive', 'adaptivev2', 'imgt'], case_sensitive=False),
+)
+@click.option(
+    '-t',
+    '--to',
+    help='Output TCR gene format',
+    required=True,
+    type=click.Choice(['tenx', 'adaptive', 'adaptivev2', 'imgt'], case_sensitive=False),
+)
+@click.option(
+    '-s', '--species', default='human', help='Species name', show_default=True
+)
+@click.option(
+    '-c',
+    '--column',
+    default=[],
+    help='Custom gene column name',
+    show_default=True,
+    multiple=True,
+)
+@click.option(
+    '-v',
+    '--verbose',
+    default=True,
+    help='Show INFO-level messages',
+    show_default=True,
+)
+def convert_stream_cli(input, output, frm, to, species, column, verbose):
+    """Convert gene names in an Arrow IPC stream, batch by batch.
+
+    Messages go to stderr, so the output can be piped.
+
+    :Example:
+
+    .. code-block:: bash
+
+       \b
+       $ produce-tcrs | tcrconvert arrow-stream --frm tenx --to imgt | consume-tcrs
+    """
+
+    convert_stream(input, output, frm, to, species, list(column), verbose)
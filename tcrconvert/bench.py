@@ -0,0 +1,390 @@
+import os
+import re
+import sys
+import time
+import tempfile
+import click
+import numpy as np
+import pandas as pd
+
+from . import shard
+from .metrics import Metrics
+from .convert import (
+    choose_lookup,
+    col_ref,
+    convert_file,
+    delimiter,
+    logger,
+    read_lookup,
+)
+
+# convert_file() options of each conversion path
+PATHS = {
+    'pandas': {},
+    'pyarrow': {'dtype_backend': 'pyarrow'},
+    'passthrough': {'passthrough': True},
+}
+
+# Paths run when none are chosen; 'pyarrow' needs the optional dependency
+DEFAULT_PATHS = ['pandas', 'passthrough']
+
+# Gene type letter of 10X, IMGT and Adaptive gene names
+GENE_TYPE_RE = re.compile(r'TC?R[ABDG]([VDJC])')
+
+# Well-formed gene names that are in no lookup table, by input format
+UNMAPPED = {
+    'tenx': 'TRB{}999',
+    'imgt': 'TRB{}999*01',
+    'adaptive': 'TCRB{}99-99*01',
+    'adaptivev2': 'TCRB{}99-99*01',
+}
+
+
+def make_input(path, n_rows, frm='tenx', species='human', unmapped=0.05, seed=0):
+    """Write a synthetic TCR file drawn from a species' lookup tables
+
+    Each gene column of ``frm`` (see ``convert.col_ref``) holds genes of its
+    type picked at random from the species' table, except for a share
+    ``unmapped`` of cells that hold a gene name no table knows. A barcode,
+    a CDR3 and a read count column are added so that the rows look like
+    real data.
+
+    :param path: Output file (CSV or TSV)
+    :type path: str
+    :param n_rows: Number of rows
+    :type n_rows: int
+    :param frm: Gene format ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``, defaults to ``'tenx'``
+    :type frm: str, optional
+    :param species: Species name, defaults to ``'human'``
+    :type species: str, optional
+    :param unmapped: Share of gene cells that cannot be converted, defaults to ``0.05``
+    :type unmapped: float, optional
+    :param seed: Random seed, defaults to ``0``
+    :type seed: int, optional
+    :return: Path to the file
+    :rtype: str
+
+    :Example:
+
+    >>> import tempfile
+    >>> from tcrconvert.bench import make_input
+    >>> path = make_input(os.path.join(tempfile.mkdtemp(), 'tcrs.csv'), 100)
+    >>> pd.read_csv(path).columns.tolist()
+    ['barcode', 'v_gene', 'd_gene', 'j_gene', 'c_gene', 'cdr3', 'reads']
+    """
+
+    if not 0 <= unmapped <= 1:
+        logger.error('"unmapped" should be between 0 and 1.')
+        raise (ValueError)
+
+    rng = np.random.default_rng(seed)
+    to = 'tenx' if frm == 'imgt' else 'imgt'
+    lookup = read_lookup(choose_lookup(frm, to, species, verbose=False))
+    names = lookup['adaptive' if frm == 'adaptivev2' else frm].dropna()
+    names = names[names != 'NoData'].drop_duplicates()
+    types = names.str.extract(GENE_TYPE_RE, expand=False)
+
+    df = pd.DataFrame({'barcode': [f'BC{i:09d}-1' for i in range(n_rows)]})
+    for col in col_ref[frm]:
+        gene_type = col[0].upper()
+        genes = names[types == gene_type].to_numpy()
+        if len(genes) == 0:
+            logger.error(f'No {gene_type} genes in the {species} lookup table.')
+            raise (ValueError)
+        values = rng.choice(genes, n_rows).astype(object)
+        values[rng.random(n_rows) < unmapped] = UNMAPPED[frm].format(gene_type)
+        df[col] = values
+    df['cdr3'] = rng.choice(
+        ['CASSLGQAYEQYF', 'CAVMDSSYKLIF', 'CASSGLAGGYNEQFF'], n_rows
+    )
+    df['reads'] = rng.integers(1, 10000, n_rows)
+    df.to_csv(path, sep=delimiter(path), index=False)
+
+    return path
+
+
+def peak_rss():
+    """Largest RSS high-water mark of this process and its finished children
+
+    :return: Bytes, or ``None`` where the ``resource`` module is missing (Windows)
+    :rtype: int or None
+    """
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    rss = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def run_path(path, input, output, frm, to, species='human', n_jobs=None):
+    """Convert a file with one conversion path and measure it
+
+    Meant to run in a fresh process (see ``run_bench()``), so that the peak
+    RSS belongs to this conversion alone.
+
+    :param path: Conversion path, a key of ``PATHS``
+    :type path: str
+    :param input: Input file
+    :type input: str
+    :param output: Output file
+    :type output: str
+    :param frm: Input format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type frm: str
+    :param to: Output format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type to: str
+    :param species: Species name, defaults to ``'human'``
+    :type species: str, optional
+    :param n_jobs: Number of processes, see ``convert_file()``
+    :type n_jobs: int, optional
+    :return: Wall time in seconds, seconds spent in each stage (including
+        ``'lookup'`` for loading the lookup tables), and peak RSS in bytes
+    :rtype: dict
+    """
+
+    # The synthetic unmapped genes would be reported on every run
+    logger.disabled = True
+    metrics = Metrics()
+    start = time.perf_counter()
+    convert_file(
+        input,
+        output,
+        frm,
+        to,
+        species,
+        verbose=False,
+        metrics=metrics,
+        n_jobs=n_jobs,
+        **PATHS[path],
+    )
+    seconds = time.perf_counter() - start
+
+    stages = {'lookup': metrics.value('tcrconvert_lookup_load_seconds') or 0.0}
+    for (name, labels), value in metrics.samples.items():
+        if name == 'tcrconvert_stage_seconds':
+            stages[dict(labels)['stage']] = value
+
+    return {'seconds': seconds, 'stages': stages, 'peak_rss': peak_rss()}
+
+
+def run_bench(
+    rows=[100_000],
+    frm='tenx',
+    to='imgt',
+    species='human',
+    unmapped=0.05,
+    paths=None,
+    n_jobs=None,
+    repeat=1,
+    workdir=None,
+    seed=0,
+):
+    """Measure conversion throughput on synthetic data
+
+    For every size in ``rows`` an input is written with ``make_input()``
+    and converted with each path of ``paths`` through ``convert_file()``.
+    Every run happens in a new process, so that its peak RSS (the largest
+    of the converting process and its workers) does not include earlier
+    runs. With ``repeat`` the fastest run is kept.
+
+    :param rows: Input sizes in rows, defaults to ``[100_000]``
+    :type rows: list of int, optional
+    :param frm: Input format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``, defaults to ``'tenx'``
+    :type frm: str, optional
+    :param to: Output format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``, defaults to ``'imgt'``
+    :type to: str, optional
+    :param species: Species name, defaults to ``'human'``
+    :type species: str, optional
+    :param unmapped: Share of gene cells that cannot be converted, defaults to ``0.05``
+    :type unmapped: float, optional
+    :param paths: Conversion paths, keys of ``PATHS``. Defaults to ``DEFAULT_PATHS``.
+    :type paths: list of str, optional
+    :param n_jobs: Number of processes, see ``convert_file()``
+    :type n_jobs: int, optional
+    :param repeat: Runs of each path and size, defaults to ``1``
+    :type repeat: int, optional
+    :param workdir: Folder for the inputs and outputs. Defaults to a temporary folder that is removed afterwards.
+    :type workdir: str, optional
+    :param seed: Random seed, defaults to ``0``
+    :type seed: int, optional
+    :return: One row per size and path with the ``rows``, input size in
+        ``mb``, wall time in ``seconds``, ``rows_per_s``, ``mb_per_s``,
+        ``peak_rss_mb`` and the seconds spent in each stage
+        (``lookup_s``, ``read_s``, ...)
+    :rtype: DataFrame
+    """
+
+    if frm == to:
+        logger.error('"frm" and "to" formats should be different.')
+        raise (ValueError)
+    paths = DEFAULT_PATHS if paths is None else list(paths)
+    unknown = [p for p in paths if p not in PATHS]
+    if unknown:
+        logger.error(f'Unknown conversion paths: {unknown}')
+        raise (ValueError)
+    if repeat < 1:
+        logger.error('"repeat" should be at least 1.')
+        raise (ValueError)
+
+    if workdir is None:
+        with tempfile.TemporaryDirectory() as tmp:
+            return run_bench(
+                rows, frm, to, species, unmapped, paths, n_jobs, repeat, tmp, seed
+            )
+
+    os.makedirs(workdir, exist_ok=True)
+    results = []
+    for n_rows in rows:
+        input = make_input(
+            os.path.join(workdir, f'bench-{n_rows}.csv'),
+            n_rows,
+            frm,
+            species,
+            unmapped,
+            seed,
+        )
+        mb = os.path.getsize(input) / 1024**2
+        for path in paths:
+            output = os.path.join(workdir, f'bench-{n_rows}-{path}.csv')
+            best = None
+            rss = []
+            for _ in range(repeat):
+                with shard.new_pool(1) as pool:
+                    run = pool.submit(
+                        run_path, path, input, output, frm, to, species, n_jobs
+                    ).result()
+                rss.append(run['peak_rss'])
+                if best is None or run['seconds'] < best['seconds']:
+                    best = run
+            os.remove(output)
+
+            seconds = best['seconds']
+            result = {
+                'path': path,
+                'rows': n_rows,
+                'mb': round(mb, 3),
+                'seconds': round(seconds, 4),
+                'rows_per_s': round(n_rows / seconds),
+                'mb_per_s': round(mb / seconds, 3),
+                'peak_rss_mb': None if rss[0] is None else round(max(rss) / 1024**2, 1),
+            }
+            for name, value in best['stages'].items():
+                result[f'{name}_s'] = round(value, 4)
+            results.append(result)
+        os.remove(input)
+
+    return pd.DataFrame(results)
+
+
+# Command-line version of run_bench()
+@click.command(name='bench')
+@click.option(
+    '-n',
+    '--rows',
+    default=[100_000],
+    type=click.IntRange(1),
+    multiple=True,
+    help='Input size in rows; repeat for several sizes',
+    show_default=True,
+)
+@click.option(
+    '-f',
+    '--frm',
+    default='tenx',
+    help='Input TCR gene format',
+    type=click.Choice(['tenx', 'adaptive', 'adaptivev2', 'imgt'], case_sensitive=False),
+    show_default=True,
+)
+@click.option(
+    '-t',
+    '--to',
+    default='imgt',
+    help='Output TCR gene format',
+    type=click.Choice(['tenx', 'adaptive', 'adaptivev2', 'imgt'], case_sensitive=False),
+    show_default=True,
+)
+@click.option(
+    '-s', '--species', default='human', help='Species name', show_default=True
+)
+@click.option(
+    '--unmapped',
+    default=0.05,
+    type=click.FloatRange(0, 1),
+    help='Share of gene cells that cannot be converted',
+    show_default=True,
+)
+@click.option(
+    '-p',
+    '--path',
+    'paths',
+    default=DEFAULT_PATHS,
+    type=click.Choice(list(PATHS)),
+    multiple=True,
+    help='Conversion path to run; repeat for several',
+    show_default=True,
+)
+@click.option(
+    '-j',
+    '--jobs',
+    default=None,
+    type=int,
+    help='Number of processes, -1 for one per CPU [default: 1]',
+)
+@click.option(
+    '--repeat',
+    default=1,
+    type=click.IntRange(1),
+    help='Runs of each path and size; the fastest is reported',
+    show_default=True,
+)
+@click.option(
+    '--workdir',
+    default=None,
+    type=click.Path(file_okay=False),
+    help='Folder for the synthetic files [default: a temporary folder]',
+)
+@click.option(
+    '--format',
+    'output_format',
+    type=click.Choice(['table', 'json']),
+    default='table',
+    help='Report format',
+    show_default=True,
+)
+def bench_cli(
+    rows, frm, to, species, unmapped, paths, jobs, repeat, workdir, output_format
+):
+    """Measure conversion throughput on synthetic data.
+
+    :Example:
+
+    .. code-block:: bash
+
+       \b
+       $ tcrconvert bench \\
+           --rows 100000 --rows 1000000 \\
+           --path pandas --path passthrough \\
+           --format json
+    """
+
+    report = run_bench(
+        list(rows),
+        frm,
+        to,
+        species,
+        unmapped,
+        list(paths),
+        jobs,
+        repeat,
+        workdir,
+    )
+
+    if output_format == 'json':
+        click.echo(report.to_json(orient='records'))
+    else:
+        click.echo(report.to_string(index=False))
@@ -1,14 +1,67 @@
 import os
 import re
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from importlib.metadata import version, PackageNotFoundError
 import pandas as pd
 import click
 import platformdirs
 import logging
 
+from . import registry
+from .metrics import record_metrics, stage
+from .utils import file_lock, lookup_lock_path, swap_directory
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Bump whenever the IMGT -> 10X/Adaptive renaming rules in ``imgt_to_tenx()``,
+# ``imgt_to_adaptive()`` or ``make_lookup_tables()`` change so that existing
+# lookup tables get rebuilt.
+RULESET_VERSION = 1
+
+MANIFEST_NAME = 'manifest.json'
+LOOKUP_NAMES = ['lookup.csv', 'lookup_from_tenx.csv', 'lookup_from_adaptive.csv']
+
+# Dual TRA/TRD genes written differently by 10X, applied in order
+TENX_RENAMES = [
+    ('TRAV13-4/DV7', 'TRAV13-4-DV7'),
+    ('TRAV14D-3/DV8', 'TRAV14D-3-DV8'),
+    ('TRAV15-1/DV6-1', 'TRAV15-1-DV6-1'),
+    ('TRAV15-2/DV6-2', 'TRAV15-2-DV6-2'),
+    ('TRAV15D-1/DV6D-1', 'TRAV15D-1-DV6D-1'),
+    ('TRAV15D-2/DV6D-2', 'TRAV15D-2-DV6D-2'),
+    ('TRAV16D/DV11', 'TRAV16D-DV11'),
+    ('TRAV21/DV12', 'TRAV21-DV12'),
+    ('TRAV4-4/DV10', 'TRAV4-4-DV10'),
+    ('TRAV6-7/DV9', 'TRAV6-7-DV9'),
+]
+
+# Dual TRA/TRD genes written differently by Adaptive, applied in order
+ADAPTIVE_RENAMES = [
+    ('TRAV14/DV4', 'TRAV14-1'),
+    ('TRAV23/DV6', 'TRAV23-1'),
+    ('TRAV29/DV5', 'TRAV29-1'),
+    ('TRAV36/DV7', 'TRAV36-1'),
+    ('TRAV38-2/DV8', 'TRAV38-2'),
+    ('TRAV4-4/DV10', 'TRAV4-4/'),
+    ('TRAV6-7/DV9', 'TRAV6-7'),
+    ('TRAV13-4/DV7', 'TRAV13-4'),
+    ('TRAV14D-3/DV8', 'TRAV14D-3'),
+    ('TRAV15D-1/DV6D-1', 'TRAV15D-1'),
+    ('TRAV15-1/DV6-1', 'TRAV15-1'),
+    ('TRAV16D/DV11', 'TRAV16D-1'),
+    ('TRAV21/DV12', 'TRAV21-1'),
+    ('TRAV15-2/DV6-2', 'TRAV15-2'),
+    ('TRAV15D-2/DV6D-2', 'TRAV15D-2'),
+]
+
 
 def parse_imgt_fasta(infile):
     """Extract gene names from a reference FASTA
@@ -97,21 +150,196 @@ def extract_imgt_genes(data_dir):
     9  TRBV29/OR9-2*01
     """
 
+    imgt = []
+    for fa in find_fastas(data_dir):
+        imgt = imgt + parse_imgt_fasta(fa)
+
+    return genes_to_frame(imgt)
+
+
+def find_fastas(data_dir):
+    """List the FASTA files in a folder
+
+    :param data_dir: Path to directory containing FASTA files
+    :type data_dir: str
+    :return: Paths to files ending in ``.fa`` or ``.fasta``, sorted by name
+    :rtype: list of str
+
+    :Example:
+
+    >>> import tcrconvert
+    >>> fastadir = tcrconvert.get_example_path('fasta_dir')
+    >>> [os.path.basename(f) for f in tcrconvert.build_lookup.find_fastas(fastadir)]
+    ['test_trav.fa', 'test_trbv.fa']
+    """
+
     fastas = []
-    for file in os.listdir(data_dir):
+    for file in sorted(os.listdir(data_dir)):
         if file.endswith('.fa') | file.endswith('.fasta'):
             fastas.append(os.path.join(data_dir, file))
-    imgt = []
-    for fa in fastas:
-        imgt = imgt + parse_imgt_fasta(fa)
 
-    # Create and sort output data frame
+    return fastas
+
+
+def genes_to_frame(imgt):
+    """Put IMGT gene names into a sorted dataframe
+
+    :param imgt: Gene names
+    :type imgt: list of str
+    :return: Gene names in an ``imgt`` column, sorted alphabetically
+    :rtype: DataFrame
+    """
+
     lookup = pd.DataFrame({'imgt': imgt})
     lookup_sorted = lookup.sort_values('imgt').reset_index(drop=True)
 
     return lookup_sorted
 
 
+def file_sha256(path):
+    """Compute the SHA-256 digest of a file
+
+    :param path: Path to file
+    :type path: str
+    :return: Hex digest
+    :rtype: str
+    """
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def tcrconvert_version():
+    """Get the installed TCRconvert version
+
+    :return: Version string, or ``'unknown'`` when running from a source tree
+        that was never installed
+    :rtype: str
+    """
+
+    try:
+        return version('tcrconvert')
+    except PackageNotFoundError:
+        return 'unknown'
+
+
+def read_manifest(save_dir):
+    """Read the manifest stored alongside a species' lookup tables
+
+    :param save_dir: Path to the species' lookup table directory
+    :type save_dir: str
+    :return: Manifest contents, or ``None`` if it is missing or unreadable
+    :rtype: dict or None
+    """
+
+    manifest_f = os.path.join(save_dir, MANIFEST_NAME)
+    try:
+        with open(manifest_f) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(manifest, dict):
+        return None
+    return manifest
+
+
+def scan_fastas(data_dir, manifest=None, force=False):
+    """Hash FASTA files and collect their gene names
+
+    Every FASTA in ``data_dir`` is hashed. Gene names are only parsed from
+    files whose size or SHA-256 digest differ from the entry recorded in
+    ``manifest``; unchanged files reuse the cached header list.
+
+    :param data_dir: Directory containing FASTA files
+    :type data_dir: str
+    :param manifest: Manifest from a previous build, defaults to ``None``
+    :type manifest: dict, optional
+    :param force: Re-parse every file regardless of the manifest, defaults to ``False``
+    :type force: bool, optional
+    :return: Manifest entries keyed by file name, and the names of files that were parsed
+    :rtype: tuple of (dict, list of str)
+    """
+
+    cached = {}
+    if manifest and not force:
+        cached = manifest.get('fastas', {})
+
+    entries = {}
+    parsed = []
+    for fa in find_fastas(data_dir):
+        name = os.path.basename(fa)
+        size = os.path.getsize(fa)
+        sha = file_sha256(fa)
+        old = cached.get(name)
+        if old and old.get('size') == size and old.get('sha256') == sha:
+            genes = old['genes']
+        else:
+            genes = parse_imgt_fasta(fa)
+            parsed.append(name)
+        entries[name] = {'sha256': sha, 'size': size, 'genes': genes}
+
+    return entries, parsed
+
+
+def is_up_to_date(manifest, entries, save_dir):
+    """Check whether existing lookup tables match the current FASTAs
+
+    :param manifest: Manifest from a previous build
+    :type manifest: dict or None
+    :param entries: Current FASTA entries from ``scan_fastas()``
+    :type entries: dict
+    :param save_dir: Path to the species' lookup table directory
+    :type save_dir: str
+    :return: ``True`` if the tables were built from identical inputs with the
+        same TCRconvert and rule-set versions
+    :rtype: bool
+    """
+
+    if not manifest:
+        return False
+    if manifest.get('tcrconvert_version') != tcrconvert_version():
+        return False
+    if manifest.get('ruleset_version') != RULESET_VERSION:
+        return False
+
+    old = manifest.get('fastas', {})
+    if set(old) != set(entries):
+        return False
+    for name, entry in entries.items():
+        if old[name].get('sha256') != entry['sha256']:
+            return False
+
+    return all(os.path.exists(os.path.join(save_dir, f)) for f in LOOKUP_NAMES)
+
+
+def write_manifest(save_dir, entries, tables):
+    """Write the manifest describing a build
+
+    :param save_dir: Path to the species' lookup table directory
+    :type save_dir: str
+    :param entries: FASTA entries from ``scan_fastas()``
+    :type entries: dict
+    :param tables: Lookup tables keyed by file name
+    :type tables: dict of DataFrame
+    :return: None
+    """
+
+    manifest = {
+        'tcrconvert_version': tcrconvert_version(),
+        'ruleset_version': RULESET_VERSION,
+        'built': time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime()),
+        'gene_counts': {name: len(df) for name, df in tables.items()},
+        'fastas': entries,
+    }
+    with open(os.path.join(save_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+
 def add_dash_one(gene_str):
     """Add ``-01`` to gene names lacking gene-level info
 
@@ -193,106 +421,77 @@ def save_lookup(df, savedir, name):
     df.to_csv(file_path, index=False)
 
 
-def build_lookup_from_fastas(data_dir, species):
-    """Create lookup tables
+def imgt_to_tenx(gene_str):
+    """Apply the IMGT to 10X renaming rules to one gene
 
-    Process IMGT reference FASTA files in a given folder to generate lookup
-    tables used for making gene name conversions. It extracts all gene names
-    and transforms them into 10X and Adaptive formats following predefined
-    conversion rules. The resulting files are created:
+    Drops the allele and joins the DV part of some dual TRA/TRD genes with a
+    dash instead of a slash (see ``TENX_RENAMES``).
 
-    - ``lookup.csv``: IMGT gene names and their 10X and Adaptive equivalents.
-    - ``lookup_from_tenx.csv``: Gene names aggregated by their 10X identifiers, with one representative allele (``*01``) for each.
-    - ``lookup_from_adaptive.csv``: Adaptive gene names, with or without alleles, and their IMGT and 10X equivalents.
+    :param gene_str: IMGT gene name with an allele
+    :type gene_str: str
+    :return: 10X gene name
+    :rtype: str
 
-    The files are saved in a given subfolder (``species``) within the appropriate
-    application folder via ``platformdirs``. For example:
+    :Example:
 
-    - MacOS: ``~/Library/Application Support/<AppName>``
-    - Windows: ``C:\\Documents and Settings\\<User>\\Application Data\\Local Settings\\<AppAuthor>\\<AppName>``
-    - Linux: ``~/.local/share/<AppName>``
+    >>> import tcrconvert
+    >>> tcrconvert.build_lookup.imgt_to_tenx('TRAV21/DV12*01')
+    'TRAV21-DV12'
+    """
 
-    If a folder named ``species`` already exists in that location, it will be replaced.
+    gene_str = gene_str[:-3]
+    for imgt, tenx in TENX_RENAMES:
+        gene_str = gene_str.replace(imgt, tenx)
+    return gene_str
 
-    Key transformations from IMGT:
 
-    - **10X:**
-        - Remove allele information (e.g., ``*01``) and modify ``/DV`` occurrences.
-    - **Adaptive:**
-        - Apply renaming rules such as adding gene-level designations and zero-padding single-digit numbers.
-        - Convert constant genes to ``'NoData'`` (Adaptive only captures VDJ) which will become ``NA`` after the merge in ``convert_gene()``.
+def imgt_to_adaptive(gene_str):
+    """Apply the IMGT to Adaptive renaming rules to one gene
 
-    :param data_dir: Directory containing FASTA files
-    :type data_dir: str
-    :param species: Name of species that will be used when running TCRconvert with these lookup tables.
-    :type species: str
-    :return: Path to the new lookup directory
+    Renames dual TRA/TRD genes (see ``ADAPTIVE_RENAMES``), writes ``TCR``
+    for ``TR``, pads gene-level numbers to two digits (see
+    ``add_dash_one()`` and ``pad_single_digit()``) and gives ``'NoData'``
+    for C genes, which Adaptive does not capture.
+
+    :param gene_str: IMGT gene name with an allele
+    :type gene_str: str
+    :return: Adaptive gene name, or ``'NoData'``
     :rtype: str
 
     :Example:
 
     >>> import tcrconvert
-    >>> fastadir = tcrconvert.get_example_path('fasta_dir')
-    >>> tcrconvert.build_lookup.build_lookup_from_fastas(fastadir, 'rabbit') # doctest: +ELLIPSIS
-    '...tcrconvert/rabbit'
+    >>> tcrconvert.build_lookup.imgt_to_adaptive('TRBV20/OR9-2*01')
+    'TCRBV20-or09_02*01'
     """
 
-    # Check that species can be a valid folder name
-    forbidden_char = r'[/\\:*?\"<>|~`\n\t]'
-    if re.search(forbidden_char, species):
-        sanitized = re.sub(forbidden_char, '_', species)
-        raise ValueError(
-            f"Proposed folder name '{species}' contains invalid characters.\n"
-            f'Suggestion: {sanitized}'
-        )
-
-    # Get the user data directory for saving lookup tables
-    user_dir = platformdirs.user_data_dir('tcrconvert', 'Emmma Bishop')
-    save_dir = os.path.join(user_dir, species)
-    os.makedirs(save_dir, exist_ok=True)
-
-    lookup = extract_imgt_genes(data_dir)
-
-    # Create 10X column
-    lookup['tenx'] = lookup['imgt'].apply(lambda x: x[:-3])
-    lookup['tenx'] = lookup['tenx'].apply(
-        lambda x: x.replace('TRAV13-4/DV7', 'TRAV13-4-DV7')
-        .replace('TRAV14D-3/DV8', 'TRAV14D-3-DV8')
-        .replace('TRAV15-1/DV6-1', 'TRAV15-1-DV6-1')
-        .replace('TRAV15-2/DV6-2', 'TRAV15-2-DV6-2')
-        .replace('TRAV15D-1/DV6D-1', 'TRAV15D-1-DV6D-1')
-        .replace('TRAV15D-2/DV6D-2', 'TRAV15D-2-DV6D-2')
-        .replace('TRAV16D/DV11', 'TRAV16D-DV11')
-        .replace('TRAV21/DV12', 'TRAV21-DV12')
-        .replace('TRAV4-4/DV10', 'TRAV4-4-DV10')
-        .replace('TRAV6-7/DV9', 'TRAV6-7-DV9')
+    if 'C' in gene_str:
+        return 'NoData'
+    for imgt, adaptive in ADAPTIVE_RENAMES:
+        gene_str = gene_str.replace(imgt, adaptive)
+    gene_str = (
+        gene_str.replace('TR', 'TCR').replace('-', '-0').replace('/OR9-02', '-or09_02')
     )
+    return pad_single_digit(add_dash_one(gene_str))
 
-    # Create Adaptive columns
-    lookup['adaptive'] = lookup['imgt'].apply(
-        lambda x: x.replace('TRAV14/DV4', 'TRAV14-1')
-        .replace('TRAV23/DV6', 'TRAV23-1')
-        .replace('TRAV29/DV5', 'TRAV29-1')
-        .replace('TRAV36/DV7', 'TRAV36-1')
-        .replace('TRAV38-2/DV8', 'TRAV38-2')
-        .replace('TRAV4-4/DV10', 'TRAV4-4/')
-        .replace('TRAV6-7/DV9', 'TRAV6-7')
-        .replace('TRAV13-4/DV7', 'TRAV13-4')
-        .replace('TRAV14D-3/DV8', 'TRAV14D-3')
-        .replace('TRAV15D-1/DV6D-1', 'TRAV15D-1')
-        .replace('TRAV15-1/DV6-1', 'TRAV15-1')
-        .replace('TRAV16D/DV11', 'TRAV16D-1')
-        .replace('TRAV21/DV12', 'TRAV21-1')
-        .replace('TRAV15-2/DV6-2', 'TRAV15-2')
-        .replace('TRAV15D-2/DV6D-2', 'TRAV15D-2')
-        .replace('TR', 'TCR')
-        .replace('-', '-0')
-        .replace('/OR9-02', '-or09_02')
-    )
-    lookup['adaptive'] = lookup['adaptive'].apply(lambda x: add_dash_one(x))
-    lookup['adaptive'] = lookup['adaptive'].apply(lambda x: pad_single_digit(x))
+
+def make_lookup_tables(lookup):
+    """Apply the IMGT to 10X and Adaptive renaming rules
+
+    Take a dataframe of IMGT gene names (as returned by ``extract_imgt_genes()``)
+    and derive the three lookup tables written by ``build_lookup_from_fastas()``.
+    See that function for a description of the rules.
+
+    :param lookup: Sorted IMGT gene names in an ``imgt`` column
+    :type lookup: DataFrame
+    :return: Lookup tables keyed by their file names
+    :rtype: dict of DataFrame
+    """
+
+    # Create 10X and Adaptive columns
+    lookup['tenx'] = lookup['imgt'].apply(imgt_to_tenx)
+    lookup['adaptive'] = lookup['imgt'].apply(imgt_to_adaptive)
     lookup['adaptivev2'] = lookup['adaptive']
-    lookup.loc[lookup['imgt'].str.contains('C'), ['adaptive', 'adaptivev2']] = 'NoData'
 
     # If converting from 10X will just need the *01 allele
     from_tenx = lookup.groupby('tenx').first().reset_index()
@@ -365,15 +564,296 @@ def build_lookup_from_fastas(data_dir, species):
     from_tenx.drop_duplicates(inplace=True)
     from_adaptive.drop_duplicates(inplace=True)
 
-    # Save
-    logger.info(f'Writing lookup tables to: {save_dir}')
-    save_lookup(lookup, save_dir, 'lookup.csv')
-    save_lookup(from_tenx, save_dir, 'lookup_from_tenx.csv')
-    save_lookup(from_adaptive, save_dir, 'lookup_from_adaptive.csv')
+    return {
+        'lookup.csv': lookup,
+        'lookup_from_tenx.csv': from_tenx,
+        'lookup_from_adaptive.csv': from_adaptive,
+    }
+
+
+def build_lookup_from_fastas(data_dir, species, force=False, metrics=None):
+    """Create lookup tables
+
+    Process IMGT reference FASTA files in a given folder to generate lookup
+    tables used for making gene name conversions. It extracts all gene names
+    and transforms them into 10X and Adaptive formats following predefined
+    conversion rules. The resulting files are created:
+
+    - ``lookup.csv``: IMGT gene names and their 10X and Adaptive equivalents.
+    - ``lookup_from_tenx.csv``: Gene names aggregated by their 10X identifiers, with one representative allele (``*01``) for each.
+    - ``lookup_from_adaptive.csv``: Adaptive gene names, with or without alleles, and their IMGT and 10X equivalents.
+
+    The files are saved in a given subfolder (``species``) within the appropriate
+    application folder via ``platformdirs``. For example:
+
+    - MacOS: ``~/Library/Application Support/<AppName>``
+    - Windows: ``C:\\Documents and Settings\\<User>\\Application Data\\Local Settings\\<AppAuthor>\\<AppName>``
+    - Linux: ``~/.local/share/<AppName>``
+
+    If a folder named ``species`` already exists in that location, it will be replaced.
+    The tables are first written to a temporary folder that is then swapped in
+    while holding a lock file (``.<species>.lock``), so ``convert_gene()``
+    running concurrently always reads a complete set of tables.
+
+    A ``manifest.json`` is written next to the lookup tables recording the
+    size, SHA-256 digest and gene names of every FASTA, along with the
+    TCRconvert and rule-set versions. If a later build finds the same FASTAs
+    and versions, it is skipped. Otherwise only FASTAs that changed are
+    re-parsed and the tables are regenerated. Use ``force=True`` to ignore the
+    manifest.
+
+    Key transformations from IMGT:
+
+    - **10X:**
+        - Remove allele information (e.g., ``*01``) and modify ``/DV`` occurrences.
+    - **Adaptive:**
+        - Apply renaming rules such as adding gene-level designations and zero-padding single-digit numbers.
+        - Convert constant genes to ``'NoData'`` (Adaptive only captures VDJ) which will become ``NA`` after the merge in ``convert_gene()``.
+
+    :param data_dir: Directory containing FASTA files
+    :type data_dir: str
+    :param species: Name of species that will be used when running TCRconvert with these lookup tables.
+    :type species: str
+    :param force: Re-parse every FASTA and rewrite the tables even if they are up to date, defaults to ``False``
+    :type force: bool, optional
+    :param metrics: Metrics to record bytes, table sizes and stage timings to
+    :type metrics: tcrconvert.metrics.Metrics, optional
+    :return: Path to the new lookup directory
+    :rtype: str
+
+    :Example:
+
+    >>> import tcrconvert
+    >>> fastadir = tcrconvert.get_example_path('fasta_dir')
+    >>> tcrconvert.build_lookup.build_lookup_from_fastas(fastadir, 'rabbit') # doctest: +ELLIPSIS
+    '...tcrconvert/rabbit'
+    """
+
+    validate_species(species)
+
+    # Get the user data directory for saving lookup tables
+    user_dir = platformdirs.user_data_dir('tcrconvert', 'Emmma Bishop')
+    save_dir, _ = _build_lookup(data_dir, species, user_dir, force, metrics)
 
     return save_dir
 
 
+def _build_lookup(data_dir, species, user_dir, force=False, metrics=None):
+    """Build one species' lookup tables under ``user_dir``
+
+    :return: Path to the lookup directory, and whether the tables were rewritten
+    :rtype: tuple of (str, bool)
+    """
+
+    save_dir = os.path.join(user_dir, species)
+    os.makedirs(user_dir, exist_ok=True)
+
+    # Compare FASTAs against the previous build, re-parsing only changed files
+    with stage(metrics, 'scan'):
+        manifest = read_manifest(save_dir)
+        entries, parsed = scan_fastas(data_dir, manifest, force)
+    if metrics is not None:
+        metrics.inc(
+            'tcrconvert_read_bytes', sum(entry['size'] for entry in entries.values())
+        )
+    if not force and is_up_to_date(manifest, entries, save_dir):
+        logger.info(f'Lookup tables for {species} are up to date: {save_dir}')
+        if metrics is not None:
+            metrics.set('tcrconvert_lookup_built', 0)
+        return save_dir, False
+    logger.info(f'Parsed {len(parsed)} of {len(entries)} FASTA files')
+
+    with stage(metrics, 'build'):
+        imgt = []
+        for entry in entries.values():
+            imgt = imgt + entry['genes']
+        tables = make_lookup_tables(genes_to_frame(imgt))
+
+    # Write the new generation of tables next to the old one, then swap it in
+    # under the lock so readers never see a partial or mixed set of tables
+    tmp_dir = os.path.join(user_dir, f'.{species}.tmp-{uuid.uuid4().hex}')
+    os.mkdir(tmp_dir)
+    try:
+        with stage(metrics, 'write'):
+            for name, df in tables.items():
+                save_lookup(df, tmp_dir, name)
+            write_manifest(tmp_dir, entries, tables)
+            written = sum(
+                os.path.getsize(os.path.join(tmp_dir, name))
+                for name in os.listdir(tmp_dir)
+            )
+
+            logger.info(f'Writing lookup tables to: {save_dir}')
+            with file_lock(lookup_lock_path(save_dir)):
+                swap_directory(tmp_dir, save_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    registry.refresh()
+
+    if metrics is not None:
+        metrics.set('tcrconvert_lookup_built', 1)
+        metrics.inc('tcrconvert_written_bytes', written)
+        for name, df in tables.items():
+            metrics.set('tcrconvert_lookup_genes', len(df), table=name)
+
+    return save_dir, True
+
+
+def validate_species(species):
+    """Check that a species name can be used as a folder name
+
+    :param species: Species name
+    :type species: str
+    :raises ValueError: If the name contains characters that are not allowed in folder names
+    :return: None
+
+    :Example:
+
+    >>> import tcrconvert
+    >>> tcrconvert.build_lookup.validate_species('rabbit')
+    """
+
+    forbidden_char = r'[/\\:*?\"<>|~`\n\t]'
+    if re.search(forbidden_char, species):
+        sanitized = re.sub(forbidden_char, '_', species)
+        raise ValueError(
+            f"Proposed folder name '{species}' contains invalid characters.\n"
+            f'Suggestion: {sanitized}'
+        )
+
+
+def find_species_dirs(root_dir):
+    """Find species folders of FASTA files under a reference root
+
+    Each non-hidden subfolder of ``root_dir`` holding at least one ``.fa`` or
+    ``.fasta`` file is a species, named after the subfolder.
+
+    :param root_dir: Directory laid out as ``<root_dir>/<species>/*.fasta``
+    :type root_dir: str
+    :return: FASTA folder paths keyed by species name, sorted by name
+    :rtype: dict of str
+
+    :Example:
+
+    >>> import tcrconvert
+    >>> root = os.path.dirname(tcrconvert.get_example_path('fasta_dir'))
+    >>> tcrconvert.build_lookup.find_species_dirs(root) # doctest: +ELLIPSIS
+    {'fasta_dir': '.../tcrconvert/examples/fasta_dir'}
+    """
+
+    species_dirs = {}
+    for name in sorted(os.listdir(root_dir)):
+        path = os.path.join(root_dir, name)
+        if name.startswith('.') or not os.path.isdir(path):
+            continue
+        if find_fastas(path):
+            species_dirs[name] = path
+
+    return species_dirs
+
+
+class _LastError(logging.Handler):
+    """Remember the last error logged by tcrconvert"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.message = None
+
+    def emit(self, record):
+        self.message = record.getMessage()
+
+
+def _build_species(data_dir, species, user_dir, force):
+    """Process pool worker for ``build_all_lookups()``"""
+
+    start = time.perf_counter()
+    row = {'species': species, 'status': 'failed'}
+    # Errors are logged before a bare ValueError is raised, so keep the message
+    last_error = _LastError()
+    package_logger = logging.getLogger('tcrconvert')
+    package_logger.addHandler(last_error)
+    try:
+        save_dir, built = _build_lookup(data_dir, species, user_dir, force)
+    except (ValueError, OSError) as e:
+        row['error'] = f'{type(e).__name__}: {str(e) or last_error.message}'
+    else:
+        counts = (read_manifest(save_dir) or {}).get('gene_counts', {})
+        row['status'] = 'built' if built else 'up to date'
+        for name, col in zip(LOOKUP_NAMES, ['imgt', 'tenx', 'adaptive']):
+            row[col] = counts.get(name)
+    finally:
+        package_logger.removeHandler(last_error)
+    row['seconds'] = round(time.perf_counter() - start, 3)
+
+    return row
+
+
+def build_all_lookups(root_dir, n_jobs=None, force=False):
+    """Create lookup tables for every species under a reference root
+
+    Runs ``build_lookup_from_fastas()`` for each species folder found by
+    ``find_species_dirs()``, spreading species across ``n_jobs`` worker
+    processes. All species names are validated before any building starts.
+    A species that fails to build does not stop the others; its error is
+    reported in the summary.
+
+    :param root_dir: Directory laid out as ``<root_dir>/<species>/*.fasta``
+    :type root_dir: str
+    :param n_jobs: Number of worker processes. Defaults to the number of CPUs; ``1`` builds in the current process.
+    :type n_jobs: int, optional
+    :param force: Rebuild species whose FASTAs are unchanged, defaults to ``False``
+    :type force: bool, optional
+    :return: One row per species with its ``status`` (``'built'``, ``'up to date'`` or ``'failed'``), lookup table row counts (``imgt``, ``tenx``, ``adaptive``), build time in ``seconds`` and any ``error``
+    :rtype: DataFrame
+
+    :Example:
+
+    >>> import tcrconvert
+    >>> root = os.path.dirname(tcrconvert.get_example_path('fasta_dir'))
+    >>> summary = tcrconvert.build_lookup.build_all_lookups(root, n_jobs=1)
+    >>> summary[['species', 'status', 'imgt', 'tenx', 'adaptive']] # doctest: +SKIP
+         species status  imgt  tenx  adaptive
+    0  fasta_dir  built    10     8        21
+    """
+
+    species_dirs = find_species_dirs(root_dir)
+    if not species_dirs:
+        logger.error(f'No species folders with FASTA files found in: {root_dir}')
+        raise (ValueError)
+
+    invalid = []
+    for species in species_dirs:
+        try:
+            validate_species(species)
+        except ValueError as e:
+            invalid.append(str(e))
+    if invalid:
+        raise ValueError('\n'.join(invalid))
+
+    user_dir = platformdirs.user_data_dir('tcrconvert', 'Emmma Bishop')
+    os.makedirs(user_dir, exist_ok=True)
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(species_dirs))
+
+    args = [(path, species, user_dir, force) for species, path in species_dirs.items()]
+    if n_jobs == 1:
+        rows = [_build_species(*a) for a in args]
+    else:
+        # Spawn rather than fork: the caller may be multi-threaded
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=ctx) as pool:
+            rows = list(pool.map(_build_species, *zip(*args)))
+    registry.refresh()
+
+    summary = pd.DataFrame(
+        rows,
+        columns=['species', 'status', 'imgt', 'tenx', 'adaptive', 'seconds', 'error'],
+    )
+    for col in ['imgt', 'tenx', 'adaptive']:
+        summary[col] = summary[col].astype('Int64')
+
+    return summary
+
+
 # Command-line version of build_lookup_from_fastas()
 @click.command(name='build', no_args_is_help=True)
 @click.option(
@@ -384,7 +864,18 @@ def build_lookup_from_fastas(data_dir, species):
     type=click.Path(exists=True),
 )
 @click.option('-s', '--species', help='Species name.', required=True)
-def build_lookup_from_fastas_cli(input, species):
+@click.option(
+    '--force',
+    is_flag=True,
+    default=False,
+    help='Rebuild even if the FASTAs are unchanged since the last build',
+)
+@click.option(
+    '--metrics-file',
+    default=None,
+    help='Write job metrics to this file in OpenMetrics text format',
+)
+def build_lookup_from_fastas_cli(input, species, force, metrics_file):
     """Create lookup tables
     :Example:
 
@@ -393,5 +884,61 @@ def build_lookup_from_fastas_cli(input, species):
        $ tcrconvert build -i tcrconvert/examples/fasta_dir/ -s rabbit
     """
 
-    file_path = build_lookup_from_fastas(input, species)
+    with record_metrics(metrics_file, command='build', species=species) as metrics:
+        file_path = build_lookup_from_fastas(input, species, force, metrics)
     click.echo(f'Lookup table written to: {file_path}')
+
+
+# Command-line version of build_all_lookups()
+@click.command(name='build-all', no_args_is_help=True)
+@click.option(
+    '-i',
+    '--input',
+    help='Folder with one subfolder of FASTA files per species',
+    required=True,
+    type=click.Path(exists=True, file_okay=False),
+)
+@click.option(
+    '-j',
+    '--jobs',
+    default=None,
+    type=click.IntRange(min=1),
+    help='Number of worker processes  [default: number of CPUs]',
+)
+@click.option(
+    '--force',
+    is_flag=True,
+    default=False,
+    help='Rebuild even if the FASTAs are unchanged since the last build',
+)
+@click.option(
+    '--summary',
+    default=None,
+    help='Write the per-species summary to this file (CSV or TSV)',
+)
+def build_all_lookups_cli(input, jobs, force, summary):
+    """Create lookup tables for every species in a folder
+    :Example:
+
+    .. code-block:: bash
+
+       \b
+       $ tcrconvert build-all -i references/ -j 8 --summary build_summary.tsv
+    """
+
+    if summary and not summary.endswith(('csv', 'tsv')):
+        raise click.BadParameter('"summary" must be a .csv or .tsv file')
+
+    out = build_all_lookups(input, jobs, force)
+    click.echo(out.drop(columns='error').to_string(index=False))
+
+    if summary:
+        sep_out = ',' if summary.endswith('csv') else '\t'
+        out.to_csv(summary, sep=sep_out, index=False)
+        click.echo(f'Summary written to: {summary}')
+
+    failed = out[out['status'] == 'failed']
+    if not failed.empty:
+        for species, error in zip(failed['species'], failed['error']):
+            click.echo(f'{species}: {error}', err=True)
+        raise click.ClickException(f'{len(failed)} species failed to build')
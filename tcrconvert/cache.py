@@ -0,0 +1,395 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+import platformdirs
+from contextlib import contextmanager, suppress
+from importlib import metadata
+
+from . import registry
+from .build_lookup import LOOKUP_NAMES
+from .convert import logger
+from .metrics import Metrics
+
+# Default size limit of a result cache, in bytes
+DEFAULT_MAX_BYTES = 1024**3
+
+# Metrics that describe the result rather than the run, replayed on hits
+NOTED_METRICS = (
+    'tcrconvert_rows',
+    'tcrconvert_unmapped_rows',
+    'tcrconvert_rule_derived_genes',
+    'tcrconvert_skipped_columns',
+)
+
+# Lookup table digests keyed by (species folder, build time)
+_digests = {}
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """Hash the contents of a file
+
+    :param path: Path to a file
+    :type path: str
+    :param chunk_size: Bytes read at a time, defaults to 1 MiB
+    :type chunk_size: int, optional
+    :return: SHA-256 hex digest
+    :rtype: str
+    """
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def lookup_digest(species):
+    """Hash the lookup tables a conversion depends on
+
+    Covers every lookup table of ``species``, or of every species if
+    ``species`` is not one (for example because it names a column). Digests
+    are cached until the tables are rebuilt.
+
+    :param species: Species name
+    :type species: str
+    :return: SHA-256 hex digest
+    :rtype: str
+    """
+
+    info = registry.get_species(species)
+    infos = [info] if info else list(registry.get_registry().values())
+
+    h = hashlib.sha256()
+    for info in infos:
+        key = (info['path'], info['built'])
+        if key not in _digests:
+            tables = [
+                (name, file_digest(os.path.join(info['path'], name)))
+                for name in LOOKUP_NAMES
+                if name in info['tables']
+            ]
+            _digests[key] = hashlib.sha256(json.dumps(tables).encode()).hexdigest()
+        h.update(f'{info["species"]}:{_digests[key]}\n'.encode())
+    return h.hexdigest()
+
+
+def package_version():
+    """Get the installed version of tcrconvert"""
+
+    try:
+        return metadata.version('tcrconvert')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+class ResultCache:
+    """On-disk cache of converted files
+
+    Entries are keyed by a hash of the input file's bytes, the conversion
+    parameters, the contents of the lookup tables and the tcrconvert version,
+    so any change to one of them is a miss. Pass an instance as ``cache`` to
+    ``convert_file()`` to reuse the output of an identical earlier run: a hit
+    copies (or with ``link=True`` hardlinks) the cached file to the output
+    instead of converting again.
+
+    Each entry has a ``.json`` sidecar holding the warnings and result
+    metrics of the run that stored it, which hits replay. The sidecar's
+    modification time records when the entry was last used, so hits never
+    touch the entry itself or outputs linked to it. Once the entries take
+    more than ``max_bytes``, the least recently used ones are removed.
+    Entries are written atomically, so several processes may share one
+    cache folder.
+
+    :param path: Cache folder. Defaults to a ``results`` folder in the user cache directory.
+    :type path: str, optional
+    :param max_bytes: Size limit in bytes, defaults to 1 GiB
+    :type max_bytes: int, optional
+    :param link: Hardlink cached files to outputs instead of copying them.
+        Outputs then share storage with the cache and must not be modified
+        in place. Falls back to copying across filesystems. Defaults to ``False``.
+    :type link: bool, optional
+
+    :Example:
+
+    >>> import tempfile
+    >>> import tcrconvert
+    >>> from tcrconvert.cache import ResultCache
+    >>> cache = ResultCache(tempfile.mkdtemp())
+    >>> tcr_file = tcrconvert.get_example_path('tenx.csv')
+    >>> out_file = os.path.join(tempfile.mkdtemp(), 'tenx2imgt.csv')
+    >>> for _ in range(2):
+    ...     _ = tcrconvert.convert_file(tcr_file, out_file, 'tenx', 'imgt', verbose=False, cache=cache)
+    >>> cache.hits, cache.misses
+    (1, 1)
+    """
+
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES, link=False):
+        if path is None:
+            path = os.path.join(
+                platformdirs.user_cache_dir('tcrconvert', 'Emmma Bishop'), 'results'
+            )
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.link = link
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, input, **params):
+        """Compute the cache key of a conversion
+
+        :param input: Input file
+        :type input: str
+        :param params: Conversion parameters that affect the output. ``species`` is also used to find the lookup tables.
+        :type params: str, list or None
+        :return: SHA-256 hex digest
+        :rtype: str
+        """
+
+        parts = {
+            'input': file_digest(input),
+            'params': params,
+            'lookups': lookup_digest(params.get('species', 'human')),
+            'version': package_version(),
+        }
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+    def entry(self, key):
+        """Get the path of a cache entry
+
+        :param key: Cache key, as from ``key()``
+        :type key: str
+        :return: Path where the entry is or would be stored
+        :rtype: str
+        """
+
+        return os.path.join(self.path, key[:2], key)
+
+    def notes(self, key):
+        """Get the warnings and metrics stored with a cache entry
+
+        :param key: Cache key, as from ``key()``
+        :type key: str
+        :return: Notes as from ``record_notes()``, empty if the entry has none
+        :rtype: dict
+        """
+
+        try:
+            with open(self.entry(key) + '.json') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def get(self, key, output):
+        """Put a cached result at ``output`` if there is one
+
+        :param key: Cache key, as from ``key()``
+        :type key: str
+        :param output: Output file
+        :type output: str
+        :return: Whether the entry was found
+        :rtype: bool
+        """
+
+        entry = self.entry(key)
+        try:
+            self._place(entry, output, self.link)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+
+        # Mark as recently used on the sidecar, which no output shares
+        try:
+            os.utime(entry + '.json')
+        except FileNotFoundError:
+            self._write_notes(entry, {})
+
+        self.hits += 1
+        return True
+
+    def put(self, key, output, notes=None):
+        """Store a result and evict old entries if over the size limit
+
+        :param key: Cache key, as from ``key()``
+        :type key: str
+        :param output: Output file to store
+        :type output: str
+        :param notes: Warnings and metrics of the run, as from ``record_notes()``
+        :type notes: dict, optional
+        :return: None
+        """
+
+        entry = self.entry(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        # The sidecar goes first so that a hit always finds it
+        self._write_notes(entry, notes or {})
+        self._place(output, entry, self.link)
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in ``max_bytes``
+
+        :return: Number of entries removed
+        :rtype: int
+        """
+
+        entries = []
+        for root, _, names in os.walk(self.path):
+            for name in names:
+                if name.startswith('.') or name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                used, size = st.st_mtime_ns, st.st_size
+                try:
+                    st = os.stat(path + '.json')
+                    used, size = st.st_mtime_ns, size + st.st_size
+                except FileNotFoundError:
+                    pass
+                entries.append((used, size, path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for name in (path, path + '.json'):
+                with suppress(FileNotFoundError):
+                    os.remove(name)
+            total -= size
+            removed += 1
+
+        return removed
+
+    @staticmethod
+    def _write_notes(entry, notes):
+        """Write the sidecar of ``entry`` through a temporary file"""
+
+        folder, name = os.path.split(entry)
+        tmp = os.path.join(folder, f'.{name}.json.tmp-{uuid.uuid4().hex}')
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(notes, f)
+            os.replace(tmp, entry + '.json')
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    @staticmethod
+    def _place(src, dst, link):
+        """Hardlink or copy ``src`` to ``dst`` through a temporary file"""
+
+        folder, name = os.path.split(os.path.abspath(dst))
+        tmp = os.path.join(folder, f'.{name}.tmp-{uuid.uuid4().hex}')
+        try:
+            if link:
+                try:
+                    os.link(src, tmp)
+                except OSError:
+                    shutil.copyfile(src, tmp)
+            else:
+                shutil.copyfile(src, tmp)
+            os.replace(tmp, dst)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+def cached_output(cache, input, output, **params):
+    """Reuse a cached output if there is one
+
+    :param cache: Result cache, or ``None``
+    :type cache: ResultCache or None
+    :param input: Input file
+    :type input: str
+    :param output: Output file
+    :type output: str
+    :param params: Conversion parameters that affect the output
+    :return: Cache key (``None`` without a cache) and, if ``output`` was taken from the cache, the notes stored with it, else ``None``
+    :rtype: tuple of (str or None, dict or None)
+    """
+
+    if cache is None:
+        return None, None
+
+    key = cache.key(input, **params)
+    if cache.get(key, output):
+        logger.info(f'Reused cached output for {input}')
+        return key, cache.notes(key)
+    return key, None
+
+
+class _WarningRecorder(logging.Handler):
+    """Keep the warnings logged by one thread"""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.thread = threading.get_ident()
+        self.messages = []
+
+    def emit(self, record):
+        if record.thread == self.thread:
+            self.messages.append(record.getMessage())
+
+
+@contextmanager
+def record_notes(metrics=None):
+    """Record the warnings and result metrics of a conversion
+
+    Yields a ``Metrics`` for the conversion to record to and a dict that is
+    filled in on exit, to be stored with ``ResultCache.put()`` and replayed
+    with ``replay_notes()``. The conversion's metrics are also added to
+    ``metrics``.
+
+    :param metrics: Metrics of the caller
+    :type metrics: tcrconvert.metrics.Metrics, optional
+    :return: Context manager yielding ``(Metrics, dict)``
+    """
+
+    job = Metrics()
+    notes = {}
+    recorder = _WarningRecorder()
+    logger.addHandler(recorder)
+    try:
+        yield job, notes
+    finally:
+        logger.removeHandler(recorder)
+        if metrics is not None:
+            metrics.merge(job)
+
+    notes['warnings'] = recorder.messages
+    notes['metrics'] = [
+        [name, dict(labels), value]
+        for (name, labels), value in job.samples.items()
+        if name in NOTED_METRICS
+    ]
+    notes['unmapped'] = sorted(job.unmapped)
+
+
+def replay_notes(notes, metrics=None):
+    """Log the warnings and record the metrics stored with a cache entry
+
+    :param notes: Notes as from ``record_notes()``
+    :type notes: dict
+    :param metrics: Metrics to record to
+    :type metrics: tcrconvert.metrics.Metrics, optional
+    :return: None
+    """
+
+    for message in notes.get('warnings', []):
+        logger.warning(message)
+
+    if metrics is not None:
+        job = Metrics()
+        for name, labels, value in notes.get('metrics', []):
+            job.set(name, value, **labels)
+        if 'unmapped' in notes:
+            job.add_unmapped(notes['unmapped'])
+        metrics.merge(job)
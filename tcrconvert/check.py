@@ -0,0 +1,356 @@
+import re
+import sys
+import logging
+from collections import Counter
+import click
+import pandas as pd
+
+from .resolve import resolve_misses
+from .convert import (
+    choose_lookup,
+    delimiter,
+    logger,
+    lookup_mapping,
+    multi_mapping,
+    read_lookup,
+    which_frm_cols,
+)
+
+COLUMNS = [
+    'column',
+    'rows',
+    'missing',
+    'mapped',
+    'no_equivalent',
+    'rule_derived',
+    'unmapped',
+    'distinct',
+    'distinct_unmapped',
+    'coverage',
+    'skipped',
+    'top_unmapped',
+]
+
+
+def count_genes(data, cols, n_rows=None, chunksize=500_000):
+    """Count the distinct values of some columns
+
+    Files are streamed in chunks and only ``cols`` are parsed.
+
+    :param data: Data frame, or path to a CSV or TSV file
+    :type data: DataFrame or str
+    :param cols: Columns to count
+    :type cols: list of str
+    :param n_rows: Only count the first ``n_rows`` rows, defaults to ``None`` (all rows)
+    :type n_rows: int, optional
+    :param chunksize: Rows read at a time from files, defaults to ``500_000``
+    :type chunksize: int, optional
+    :return: Number of rows, and for each column its number of missing values
+        and the count of every non-missing value
+    :rtype: tuple of (int, dict of int, dict of Counter)
+    """
+
+    missing = {col: 0 for col in cols}
+    counts = {col: Counter() for col in cols}
+    n = 0
+
+    if isinstance(data, pd.DataFrame):
+        chunks = [data.head(n_rows) if n_rows is not None else data]
+    else:
+        chunks = pd.read_csv(
+            data,
+            sep=delimiter(str(data)),
+            usecols=cols,
+            dtype=str,
+            nrows=n_rows,
+            chunksize=chunksize,
+        )
+
+    for chunk in chunks:
+        n += len(chunk)
+        for col in cols:
+            genes = chunk[col]
+            missing[col] += int(genes.isna().sum())
+            counts[col].update(genes.value_counts().to_dict())
+
+    return n, missing, counts
+
+
+def check_coverage(
+    data,
+    frm,
+    to,
+    species='human',
+    frm_cols=[],
+    n_rows=None,
+    multi_sep=None,
+    partial='na',
+    resolve=False,
+    verbose=True,
+):
+    """Check how much of each gene column would convert
+
+    Reads only the gene columns (see ``count_genes()``) and looks up each
+    distinct value once, without converting or writing anything. Missing
+    values are not counted against a column. Genes that are known but have
+    no equivalent in ``to`` (such as C genes in Adaptive) count as
+    ``no_equivalent``, not as unmapped: ``convert_gene()`` sets them to
+    ``NaN`` without a warning. A column is ``skipped`` if ``convert_gene()``
+    would leave it as is because none of its values can be converted.
+    With ``resolve=True`` genes missing from the lookup tables are resolved
+    as in ``convert_gene()``; cells converted that way count as mapped and
+    as ``rule_derived``.
+
+    :param data: Data frame, or path to a CSV or TSV file
+    :type data: DataFrame or str
+    :param frm: Input format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type frm: str
+    :param to: Output format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type to: str
+    :param species: Species name. Defaults to ``'human'``.
+    :type species: str, optional
+    :param frm_cols: Custom gene column names.
+    :type frm_cols: list of str, optional
+    :param n_rows: Only check the first ``n_rows`` rows, defaults to ``None`` (all rows)
+    :type n_rows: int, optional
+    :param multi_sep: Characters that separate calls within a cell, see ``convert_gene()``
+    :type multi_sep: str, optional
+    :param partial: ``'na'`` or ``'drop'``, what to do with partly converted cells, see ``convert_gene()``
+    :type partial: str, optional
+    :param resolve: Convert genes missing from the lookup tables with the naming rules. Defaults to ``False``.
+    :type resolve: bool, optional
+    :param verbose: Whether to show all messages. Defaults to ``True``.
+    :type verbose: bool, optional
+    :return: One row per gene column with its numbers of ``rows``,
+        ``missing``, ``mapped``, ``no_equivalent``, ``rule_derived`` and
+        ``unmapped`` values,
+        of ``distinct`` and ``distinct_unmapped`` values, the ``coverage``
+        (share of non-missing values that are not unmapped), whether it would
+        be ``skipped``, and its most common unmapped genes
+    :rtype: DataFrame
+
+    :Example:
+
+    >>> import tcrconvert
+    >>> from tcrconvert.check import check_coverage
+    >>> tcr_file = tcrconvert.get_example_path('tenx.csv')
+    >>> check_coverage(tcr_file, 'tenx', 'adaptive', verbose=False)[['column', 'mapped', 'no_equivalent', 'coverage']]
+       column  mapped  no_equivalent  coverage
+    0  v_gene       4              0       1.0
+    1  d_gene       2              0       1.0
+    2  j_gene       4              0       1.0
+    3  c_gene       0              4       1.0
+    """
+
+    if verbose:
+        logger.setLevel(logging.INFO)
+    else:
+        logger.setLevel(logging.WARNING)
+
+    if frm == to:
+        logger.error('"frm" and "to" formats should be different.')
+        raise (ValueError)
+
+    if isinstance(data, pd.DataFrame):
+        header = data.columns
+    else:
+        header = pd.read_csv(data, sep=delimiter(str(data)), nrows=0).columns
+    cols_from = which_frm_cols(pd.DataFrame(columns=header), frm, frm_cols, verbose)
+    cols = [col for col in cols_from if col in header]
+
+    lookup_f = choose_lookup(frm, to, species, verbose)
+    mapping = lookup_mapping(read_lookup(lookup_f), frm, to)
+
+    n, missing, counts = count_genes(data, cols, n_rows)
+    if n == 0:
+        logger.error('Input data is empty.')
+        raise (ValueError)
+    values = [pd.Series(list(counts[col]), dtype=object) for col in cols]
+    derived = {}
+    if resolve:
+        derived = resolve_misses(values, mapping, frm, to, species, multi_sep)
+        mapping = {**mapping, **derived}
+    if multi_sep:
+        mapping = multi_mapping(values, mapping, multi_sep, partial=partial)
+
+    rows = []
+    for col in cols:
+        mapped = no_equivalent = rule_derived = 0
+        unmapped = Counter()
+        for gene, count in counts[col].items():
+            out = mapping.get(gene)
+            if out == 'NoData':
+                no_equivalent += count
+            elif isinstance(out, str):
+                mapped += count
+            else:
+                unmapped[gene] = count
+            if (
+                derived
+                and isinstance(out, str)
+                and is_rule_derived(gene, derived, multi_sep)
+            ):
+                rule_derived += count
+        n_bad = sum(unmapped.values())
+        present = n - missing[col]
+        rows.append(
+            {
+                'column': col,
+                'rows': n,
+                'missing': missing[col],
+                'mapped': mapped,
+                'no_equivalent': no_equivalent,
+                'rule_derived': rule_derived,
+                'unmapped': n_bad,
+                'distinct': len(counts[col]),
+                'distinct_unmapped': len(unmapped),
+                'coverage': round(1 - n_bad / present, 6) if present else 1.0,
+                # We don't expect the entire column of genes to be empty.
+                'skipped': n_bad >= n,
+                'top_unmapped': [gene for gene, _ in unmapped.most_common(10)],
+            }
+        )
+
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def is_rule_derived(gene, derived, multi_sep=None):
+    """Whether a cell, or with ``multi_sep`` one of its calls, was converted with the naming rules"""
+
+    if gene in derived:
+        return True
+    if multi_sep:
+        calls = re.split(f'[{re.escape(multi_sep)}]', gene)
+        return any(call in derived for call in calls)
+    return False
+
+
+# Command-line version of check_coverage()
+@click.command(name='check', no_args_is_help=True)
+@click.option(
+    '-i',
+    '--input',
+    help='Input file (CSV or TSV)',
+    required=True,
+    type=click.Path(exists=True),
+)
+@click.option(
+    '-f',
+    '--frm',
+    help='Input TCR gene format',
+    required=True,
+    type=click.Choice(['tenx', 'adaptive', 'adaptivev2', 'imgt'], case_sensitive=False),
+)
+@click.option(
+    '-t',
+    '--to',
+    help='Output TCR gene format',
+    required=True,
+    type=click.Choice(['tenx', 'adaptive', 'adaptivev2', 'imgt'], case_sensitive=False),
+)
+@click.option(
+    '-s', '--species', default='human', help='Species name', show_default=True
+)
+@click.option(
+    '-c',
+    '--column',
+    default=[],
+    help='Custom gene column name',
+    show_default=True,
+    multiple=True,
+)
+@click.option(
+    '-n',
+    '--rows',
+    default=None,
+    type=int,
+    help='Only check the first ROWS rows [default: all rows]',
+)
+@click.option(
+    '--min-coverage',
+    default=1.0,
+    type=click.FloatRange(0, 1),
+    help='Exit with status 1 if a column covers less than this share of its values',
+    show_default=True,
+)
+@click.option(
+    '--multi-sep',
+    default=None,
+    help='Characters that separate several gene calls in one cell, e.g. ",/"',
+)
+@click.option(
+    '--resolve',
+    is_flag=True,
+    default=False,
+    help='Convert genes missing from the lookup tables with the naming rules',
+)
+@click.option(
+    '--format',
+    'output_format',
+    type=click.Choice(['table', 'json']),
+    default='table',
+    help='Report format',
+    show_default=True,
+)
+@click.option(
+    '-v',
+    '--verbose',
+    default=True,
+    help='Show INFO-level messages',
+    show_default=True,
+)
+def check_coverage_cli(
+    input,
+    frm,
+    to,
+    species,
+    column,
+    rows,
+    min_coverage,
+    multi_sep,
+    resolve,
+    output_format,
+    verbose,
+):
+    """Check how much of each gene column would convert, without converting.
+
+    :Example:
+
+    .. code-block:: bash
+
+       \b
+       $ tcrconvert check \\
+           --input tcrconvert/examples/tenx.csv \\
+           --frm tenx \\
+           --to imgt \\
+           --min-coverage 0.99
+    """
+
+    report = check_coverage(
+        input,
+        frm,
+        to,
+        species,
+        list(column),
+        rows,
+        multi_sep,
+        resolve=resolve,
+        verbose=verbose,
+    )
+
+    if output_format == 'json':
+        click.echo(report.to_json(orient='records'))
+    else:
+        click.echo(report.drop(columns='top_unmapped').to_string(index=False))
+        for col, genes in zip(report['column'], report['top_unmapped']):
+            if genes:
+                click.echo(f'Most common unmapped genes in {col}: {", ".join(genes)}')
+
+    low = report[report['coverage'] < min_coverage]
+    if not low.empty:
+        if verbose:
+            click.echo(
+                f'Coverage below {min_coverage} in: {", ".join(low["column"])}',
+                err=True,
+            )
+        sys.exit(1)
@@ -0,0 +1,180 @@
+import os
+import json
+import uuid
+
+from . import stream
+from .convert import logger
+
+# Input bytes converted between checkpoints
+CHECKPOINT_BYTES = 256 * 1024**2
+
+
+def checkpoint_path(output):
+    """Get the checkpoint file kept next to an output file"""
+
+    return f'{output}.checkpoint.json'
+
+
+class Checkpoint:
+    """Progress of a streaming conversion, for resuming it after a crash
+
+    Saved as a JSON file next to the output (see ``checkpoint_path()``)
+    every ``every`` input bytes. Each save records how far the input has
+    been read, how long the output is at that point, the columns left as
+    is, and the row and unmapped gene counts so far. The output is synced to
+    disk before the checkpoint is written, and the checkpoint is replaced
+    atomically, so it never points past what was really written.
+
+    :param output: Output file of the conversion
+    :type output: str
+    :param params: Conversion parameters; a checkpoint saved with other parameters cannot be resumed
+    :type params: dict
+    :param every: Input bytes between saves, defaults to ``CHECKPOINT_BYTES``
+    :type every: int, optional
+    """
+
+    def __init__(self, output, params, every=None):
+        self.output = output
+        self.path = checkpoint_path(output)
+        self.params = params
+        self.every = CHECKPOINT_BYTES if every is None else every
+
+    def load(self):
+        """Read the last checkpoint
+
+        :return: Saved state with ``skip``, ``offset``, ``output_bytes`` and
+            ``stats``, or ``None`` if there is no checkpoint
+        :rtype: dict or None
+        :raises ValueError: If the checkpoint was saved for another input or
+            other parameters, or the output is shorter than it records
+        """
+
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        if state['params'] != json.loads(json.dumps(self.params)):
+            logger.error(
+                f'{self.path} was saved for another input or other options; delete it to start over.'
+            )
+            raise (ValueError)
+        if (
+            not os.path.exists(self.output)
+            or os.path.getsize(self.output) < state['output_bytes']
+        ):
+            logger.error(
+                f'{self.output} is shorter than {self.path} records; delete it to start over.'
+            )
+            raise (ValueError)
+
+        state['skip'] = set(state['skip'])
+        state['stats'] = {
+            int(pos): {
+                'rows': st['rows'],
+                'bad': st['bad'],
+                'bad_genes': set(st['bad_genes']),
+            }
+            for pos, st in state['stats'].items()
+        }
+        return state
+
+    def save(self, skip, offset, output_bytes, stats):
+        """Write a checkpoint, replacing the previous one
+
+        :param skip: Gene columns left as is
+        :type skip: set of str
+        :param offset: Input bytes read, up to the end of a record
+        :type offset: int
+        :param output_bytes: Output length for that input, already synced to disk
+        :type output_bytes: int
+        :param stats: Per-position counts, as from ``stream.new_stats()``
+        :type stats: dict of dict
+        :return: None
+        """
+
+        state = {
+            'params': self.params,
+            'skip': sorted(skip),
+            'offset': offset,
+            'output_bytes': output_bytes,
+            'stats': {
+                str(pos): {
+                    'rows': st['rows'],
+                    'bad': st['bad'],
+                    'bad_genes': sorted(st['bad_genes']),
+                }
+                for pos, st in stats.items()
+            },
+        }
+        folder, name = os.path.split(os.path.abspath(self.path))
+        tmp = os.path.join(folder, f'.{name}.tmp-{uuid.uuid4().hex}')
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def remove(self):
+        """Delete the checkpoint of a finished conversion"""
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def record_bytes(record):
+    """Get the length in bytes of a raw record as it is stored in the file"""
+
+    if record.isascii():
+        return len(record)
+    return len(record.encode('utf-8', 'surrogateescape'))
+
+
+def splice_with_checkpoints(records, out, sep, mappings, stats, ckpt, skip, offset):
+    """Rewrite records like ``stream.splice_records()``, saving checkpoints
+
+    :param records: Raw data records, as from ``stream.iter_records()``
+    :type records: iterator of str
+    :param out: Output file opened in text mode
+    :type out: file object
+    :param sep: Field delimiter
+    :type sep: str
+    :param mappings: Output gene names keyed by input gene name, for each field position to rewrite
+    :type mappings: dict of dict
+    :param stats: Per-position counts from ``stream.new_stats()``, updated as records are rewritten
+    :type stats: dict of dict
+    :param ckpt: Checkpoint to save
+    :type ckpt: Checkpoint
+    :param skip: Gene columns left as is
+    :type skip: set of str
+    :param offset: Input offset of the first record
+    :type offset: int
+    :return: None
+    """
+
+    read = [offset]
+
+    def counted():
+        for record in records:
+            read[0] += record_bytes(record)
+            yield record
+
+    def save():
+        out.flush()
+        os.fsync(out.fileno())
+        ckpt.save(skip, read[0], os.fstat(out.fileno()).st_size, stats)
+
+    # A checkpoint at the start of every pass, so that a crash before the
+    # first regular one never resumes from an earlier pass
+    save()
+    next_save = read[0] + ckpt.every
+    for record in stream.splice_records(counted(), sep, mappings, stats):
+        out.write(record)
+        if read[0] >= next_save:
+            save()
+            next_save = read[0] + ckpt.every
@@ -1,7 +1,13 @@
 import click
 
+from .arrow import convert_stream_cli
+from .bench import bench_cli
+from .check import check_coverage_cli
 from .convert import convert_gene_cli
-from .build_lookup import build_lookup_from_fastas_cli
+from .dataset import convert_dataset_cli
+from .registry import list_species_cli
+from .build_lookup import build_lookup_from_fastas_cli, build_all_lookups_cli
+from .watch import watch_cli
 
 
 @click.group(invoke_without_command=True, no_args_is_help=True)
@@ -13,3 +19,10 @@ def entry_point():
 
 entry_point.add_command(convert_gene_cli)
 entry_point.add_command(build_lookup_from_fastas_cli)
+entry_point.add_command(build_all_lookups_cli)
+entry_point.add_command(list_species_cli)
+entry_point.add_command(watch_cli)
+entry_point.add_command(check_coverage_cli)
+entry_point.add_command(convert_stream_cli)
+entry_point.add_command(bench_cli)
+entry_point.add_command(convert_dataset_cli)
@@ -1,9 +1,15 @@
+import numpy as np
 import pandas as pd
-from importlib.resources import files
 import logging
 import click
+import contextlib
 import os
-import platformdirs
+import re
+import time
+
+from . import parallel, registry, shard, stream
+from .metrics import record_metrics, stage
+from .utils import file_lock, lookup_lock_path
 
 # Set up logging
 logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
@@ -22,7 +28,9 @@ def choose_lookup(frm, to, species='human', verbose=True):
     """Choose lookup table
 
     Determine which CSV lookup table to use based on the the input format
-    (``frm``) and returns the path to that file.
+    (``frm``) and returns the path to that file. Species are resolved through
+    the cached registry (see ``list_species()``), so repeated calls do not
+    touch the filesystem.
 
     :param frm: Input format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
     :type frm: str
@@ -47,31 +55,80 @@ def choose_lookup(frm, to, species='human', verbose=True):
     else:
         logger.setLevel(logging.WARNING)
 
-    # Determine where to find lookup tables
-    if species in ['human', 'mouse', 'rhesus']:
-        lookup_dir = os.path.join(files('tcrconvert'), 'data')
+    # Resolve the species through the cached registry of lookup folders
+    info = registry.get_species(species)
+    name = lookup_name(frm)
+    log_lookup_notes(frm, to)
+
+    if info is not None and name in info['tables']:
+        return os.path.join(info['path'], name)
     else:
-        lookup_dir = platformdirs.user_data_dir('tcrconvert', 'Emmma Bishop')
+        logger.error('Lookup table not found, please run build_lookup_from_fastas().')
+        raise (FileNotFoundError)
+
+
+def lookup_name(frm):
+    """Get the file name of the lookup table used for an input format
+
+    :param frm: Input format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type frm: str
+    :return: Lookup table file name
+    :rtype: str
+
+    :Example:
 
-    data_path = os.path.join(lookup_dir, species)
+    >>> import tcrconvert
+    >>> tcrconvert.convert.lookup_name('adaptivev2')
+    'lookup_from_adaptive.csv'
+    """
 
     if frm == 'tenx':
-        lookup_f = os.path.join(data_path, 'lookup_from_tenx.csv')
-        logger.info('Converting from 10X. Using *01 as allele for all genes.')
+        return 'lookup_from_tenx.csv'
     elif frm == 'adaptive' or frm == 'adaptivev2':
-        lookup_f = os.path.join(data_path, 'lookup_from_adaptive.csv')
-        if to == 'imgt':
-            logger.info(
-                'Converting from Adaptive to IMGT. Using *01 for genes lacking alleles.'
-            )
+        return 'lookup_from_adaptive.csv'
     else:
-        lookup_f = os.path.join(data_path, 'lookup.csv')
+        return 'lookup.csv'
 
-    if os.path.exists(lookup_f):
-        return lookup_f
-    else:
-        logger.error('Lookup table not found, please run build_lookup_from_fastas().')
-        raise (FileNotFoundError)
+
+def log_lookup_notes(frm, to):
+    """Log how alleles are filled in for a conversion"""
+
+    if frm == 'tenx':
+        logger.info('Converting from 10X. Using *01 as allele for all genes.')
+    elif (frm == 'adaptive' or frm == 'adaptivev2') and to == 'imgt':
+        logger.info(
+            'Converting from Adaptive to IMGT. Using *01 for genes lacking alleles.'
+        )
+
+
+def read_lookup(lookup_f):
+    """Read a lookup table
+
+    ``build_lookup_from_fastas()`` replaces a species' lookup directory in one
+    step while holding its lock file. If the table is briefly missing because
+    a swap is in progress, wait for the lock and read the new generation.
+
+    :param lookup_f: Path to lookup table, as returned by ``choose_lookup()``
+    :type lookup_f: str
+    :return: Lookup table
+    :rtype: DataFrame
+
+    :Example:
+
+    >>> import tcrconvert
+    >>> lookup_f = tcrconvert.convert.choose_lookup('imgt', 'tenx', verbose=False)
+    >>> tcrconvert.convert.read_lookup(lookup_f).columns.tolist()
+    ['imgt', 'tenx', 'adaptive', 'adaptivev2']
+    """
+
+    try:
+        return pd.read_csv(lookup_f)
+    except FileNotFoundError:
+        lock_f = lookup_lock_path(os.path.dirname(lookup_f))
+        if not os.path.exists(lock_f):
+            raise
+        with file_lock(lock_f):
+            return pd.read_csv(lookup_f)
 
 
 def which_frm_cols(df, frm, frm_cols=[], verbose=True):
@@ -128,7 +185,21 @@ def which_frm_cols(df, frm, frm_cols=[], verbose=True):
     return cols_from
 
 
-def convert_gene(df, frm, to, species='human', frm_cols=[], verbose=True):
+def convert_gene(
+    df,
+    frm,
+    to,
+    species='human',
+    frm_cols=[],
+    verbose=True,
+    metrics=None,
+    n_jobs=None,
+    multi_sep=None,
+    join_sep=None,
+    partial='na',
+    resolve=False,
+    mapping=None,
+):
     """Convert gene names
 
     Convert T-cell receptor (TCR) gene names between the IMGT, 10X, and Adaptive
@@ -143,7 +214,11 @@ def convert_gene(df, frm, to, species='human', frm_cols=[], verbose=True):
     - If ``frm`` is ``'imgt'`` and ``frm_cols`` is not provided, 10X column names are assumed.
     - Constant (C) genes are set to ``NaN`` when converting to Adaptive formats, as Adaptive does not capture constant regions.
     - The input does not need to include all gene types; partial inputs (e.g., only V genes) are supported.
+    - Converted columns keep their dtype family: ``string[pyarrow]`` and ``ArrowDtype`` columns stay Arrow-backed, other ``string`` and ``category`` columns keep their dtype, and object columns stay object.
     - If no values in a custom column can be mapped (e.g., a CDR3 column) it is skipped and a warning is raised.
+    - If ``species`` names a column, each row is converted with the lookup table of its species and unmapped genes are reported per species (see ``convert_by_species()``). ``n_jobs`` is not used then.
+    - Cells holding several calls, such as ``'TCRBV12-03/12-04'`` or ``'TRBV6-2*01,TRBV6-3*01'``, map to ``NaN`` unless ``multi_sep`` is given. Each call is then converted on its own and the results are joined with ``join_sep`` (see ``multi_mapping()``).
+    - With ``resolve=True``, genes missing from the lookup tables (such as alleles named after the tables were built) are converted with the rules the tables are built from (see ``resolve.Resolver``), and a warning lists them.
 
     Standard Column Names:
 
@@ -160,12 +235,26 @@ def convert_gene(df, frm, to, species='human', frm_cols=[], verbose=True):
     :type frm: str
     :param to: Output format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
     :type to: str
-    :param species: Species name. Defaults to ``'human'``.
+    :param species: Species name, or a column of the input holding each row's species. Defaults to ``'human'``.
     :type species: str, optional
     :param frm_cols: Custom gene column names.
     :type frm_cols: list of str, optional
     :param verbose: Whether to show all messages. Defaults to ``True``.
     :type verbose: bool, optional
+    :param metrics: Metrics to record rows, unmapped genes, skipped columns and timings to
+    :type metrics: tcrconvert.metrics.Metrics, optional
+    :param n_jobs: Number of processes to convert object columns with; ``-1`` uses every CPU. Inputs under ``parallel.MIN_PARALLEL_ROWS`` rows are always converted in this process. Defaults to ``None`` (no parallelism).
+    :type n_jobs: int, optional
+    :param multi_sep: Characters that separate calls within a cell, such as ``',/'``. Defaults to ``None`` (cells hold one gene).
+    :type multi_sep: str, optional
+    :param join_sep: Separator between converted calls. Defaults to the first character of ``multi_sep``.
+    :type join_sep: str, optional
+    :param partial: For cells where only some calls can be converted, ``'na'`` gives ``NaN`` and ``'drop'`` keeps the converted calls. Defaults to ``'na'``.
+    :type partial: str, optional
+    :param resolve: Convert genes missing from the lookup tables with the naming rules. Defaults to ``False``.
+    :type resolve: bool, optional
+    :param mapping: Mapping to use instead of reading the lookup table, as from ``lookup_mapping()``. With a species column, a mapping per species keyed by species name. Defaults to ``None``.
+    :type mapping: dict, optional
     :return: Converted TCR data
     :rtype: DataFrame
 
@@ -194,6 +283,100 @@ def convert_gene(df, frm, to, species='human', frm_cols=[], verbose=True):
     else:
         logger.setLevel(logging.WARNING)
 
+    check_convert_args(df, frm, to)
+
+    # Load lookup table and determine input columns
+    by_species = isinstance(species, str) and species in df.columns
+    shared = (
+        mapping is None
+        and not by_species
+        and not resolve
+        and not multi_sep
+        and parallel.use_parallel(len(df), n_jobs) > 1
+    )
+    if mapping is not None:
+        if by_species:
+            # Copied so that resolving does not change the caller's dict
+            mappings = dict(mapping)
+        log_lookup_notes(frm, to)
+    else:
+        start = time.perf_counter()
+        if by_species:
+            mappings = {}
+            for sp in df[species].dropna().unique().tolist():
+                lookup_f = choose_lookup(frm, to, sp, verbose=False)
+                mappings[sp] = lookup_mapping(read_lookup(lookup_f), frm, to)
+            if verbose:
+                logger.setLevel(logging.INFO)
+            log_lookup_notes(frm, to)
+        else:
+            lookup_f = choose_lookup(frm, to, species, verbose)
+            mapping = lookup_mapping(read_lookup(lookup_f), frm, to)
+        if metrics is not None:
+            metrics.inc('tcrconvert_lookup_load_seconds', time.perf_counter() - start)
+    cols_from = which_frm_cols(df, frm, frm_cols, verbose)
+
+    if resolve:
+        from .resolve import add_rule_derived, warn_rule_derived
+
+        with stage(metrics, 'resolve'):
+            if by_species:
+                for sp in mappings:
+                    mappings[sp], derived = add_rule_derived(
+                        df[df[species] == sp],
+                        cols_from,
+                        mappings[sp],
+                        frm,
+                        to,
+                        sp,
+                        metrics,
+                        multi_sep,
+                    )
+                    warn_rule_derived(derived, sp)
+            else:
+                mapping, derived = add_rule_derived(
+                    df, cols_from, mapping, frm, to, species, metrics, multi_sep
+                )
+                warn_rule_derived(derived)
+
+    with stage(metrics, 'convert'):
+        if by_species:
+            return convert_by_species(
+                df, cols_from, mappings, species, metrics, multi_sep, join_sep, partial
+            )
+        if shared:
+            # Workers attach to the tables in shared memory instead of each
+            # receiving a copy of the mapping
+            from .converter import Converter
+
+            with Converter(species).share() as conv:
+                return convert_columns(
+                    df,
+                    cols_from,
+                    conv.mapping(frm, to, species),
+                    metrics,
+                    n_jobs,
+                    multi_sep,
+                    join_sep,
+                    partial,
+                )
+        return convert_columns(
+            df, cols_from, mapping, metrics, n_jobs, multi_sep, join_sep, partial
+        )
+
+
+def check_convert_args(df, frm, to):
+    """Validate the arguments shared by the conversion functions
+
+    :param df: Dataframe containing TCR gene names
+    :type df: DataFrame
+    :param frm: Input format of TCR data
+    :type frm: str
+    :param to: Output format of TCR data
+    :type to: str
+    :return: None
+    """
+
     if frm == to:
         logger.error('"frm" and "to" formats should be different.')
         raise (ValueError)
@@ -206,51 +389,993 @@ def convert_gene(df, frm, to, species='human', frm_cols=[], verbose=True):
     if to == 'adaptive' or to == 'adaptivev2':
         logger.warning('Adaptive only captures VDJ genes; C genes will be NA.')
 
-    # Load lookup table and determine input columns
-    lookup_f = choose_lookup(frm, to, species, verbose)
-    lookup = pd.read_csv(lookup_f)
-    cols_from = which_frm_cols(df, frm, frm_cols, verbose)
 
-    # Loop over gene columns, doing a merge to get converted gene names
+def lookup_mapping(lookup, frm, to):
+    """Turn a lookup table into a gene name mapping
+
+    :param lookup: Lookup table, as returned by ``read_lookup()``
+    :type lookup: DataFrame
+    :param frm: Input format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type frm: str
+    :param to: Output format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type to: str
+    :return: Output gene names keyed by input gene name. Genes with no
+        equivalent map to ``'NoData'``.
+    :rtype: dict
+
+    :Example:
+
+    >>> import tcrconvert
+    >>> lookup_f = tcrconvert.convert.choose_lookup('tenx', 'imgt', verbose=False)
+    >>> lookup = tcrconvert.convert.read_lookup(lookup_f)
+    >>> tcrconvert.convert.lookup_mapping(lookup, 'tenx', 'imgt')['TRAV1-2']
+    'TRAV1-2*01'
+    """
+
+    return dict(zip(lookup[frm], lookup[to]))
+
+
+def split_calls(cell, multi_sep, mapping):
+    """Split a multi-valued cell into gene calls
+
+    Splits on any character of ``multi_sep``, except that a run of pieces
+    which is itself a gene name in ``mapping`` (such as ``TRAV29/DV5``) is
+    kept whole. A call starting with a digit takes the letters of the call
+    before it, so Adaptive's ``TCRBV12-03/12-04`` gives ``TCRBV12-03`` and
+    ``TCRBV12-04``.
+
+    :param cell: Cell holding one or more gene calls
+    :type cell: str
+    :param multi_sep: Characters that separate calls
+    :type multi_sep: str
+    :param mapping: Output gene names keyed by input gene name
+    :type mapping: dict
+    :return: Gene calls, without surrounding whitespace
+    :rtype: list of str
+
+    :Example:
+
+    >>> import tcrconvert
+    >>> tcrconvert.convert.split_calls('TCRBV12-03/12-04', ',/', {})
+    ['TCRBV12-03', 'TCRBV12-04']
+    >>> tcrconvert.convert.split_calls('TRAV29/DV5*01, TRAV30*01', ',/', {'TRAV29/DV5*01': ''})
+    ['TRAV29/DV5*01', 'TRAV30*01']
+    """
+
+    tokens = re.split(f'([{re.escape(multi_sep)}])', cell)
+    pieces, seps = tokens[0::2], tokens[1::2]
+
+    calls = []
+    prefix = ''
+    i = 0
+    while i < len(pieces):
+        # Longest run of pieces that is a gene name on its own
+        for j in range(len(pieces), i + 1, -1):
+            call = pieces[i] + ''.join(
+                s + p for s, p in zip(seps[i:], pieces[i + 1 : j])
+            )
+            if call.strip() in mapping:
+                call = call.strip()
+                break
+        else:
+            j = i + 1
+            call = pieces[i].strip()
+            if call[:1].isdigit() and prefix:
+                call = prefix + call
+        if call:
+            calls.append(call)
+            prefix = re.match(r'\D*', call).group()
+        i = j
+
+    return calls
+
+
+def multi_mapping(values, mapping, multi_sep, join_sep=None, partial='na'):
+    """Extend a gene name mapping to multi-valued cells
+
+    Every distinct cell in ``values`` that is not a gene name but holds a
+    separator is split with ``split_calls()``. Each call is mapped on its
+    own and the distinct results are joined with ``join_sep``. Calls whose
+    output is ``'NoData'`` are left out. A cell with some calls that cannot
+    be mapped is left unmapped if ``partial='na'``, or keeps only the mapped
+    calls if ``partial='drop'``. Cells with no mapped call stay unmapped.
+
+    The work scales with the number of distinct cells, not rows.
+
+    :param values: Gene columns to scan for multi-valued cells
+    :type values: list of Series
+    :param mapping: Output gene names keyed by input gene name, as returned by ``lookup_mapping()``
+    :type mapping: dict
+    :param multi_sep: Characters that separate calls within a cell, such as ``',/'``
+    :type multi_sep: str
+    :param join_sep: Separator between converted calls. Defaults to the first character of ``multi_sep``.
+    :type join_sep: str, optional
+    :param partial: ``'na'`` or ``'drop'``, what to do with partly mapped cells. Defaults to ``'na'``.
+    :type partial: str, optional
+    :return: ``mapping`` with entries added for the multi-valued cells
+    :rtype: dict
+
+    :Example:
+
+    >>> import pandas as pd
+    >>> import tcrconvert
+    >>> mapping = {'TRBV6-2*01': 'TRBV6-2', 'TRBV6-3*01': 'TRBV6-3'}
+    >>> cells = pd.Series(['TRBV6-2*01,TRBV6-3*01', 'TRBV6-2*01,BAD'])
+    >>> extended = tcrconvert.convert.multi_mapping([cells], mapping, ',', partial='drop')
+    >>> extended['TRBV6-2*01,TRBV6-3*01'], extended['TRBV6-2*01,BAD']
+    ('TRBV6-2,TRBV6-3', 'TRBV6-2')
+    """
+
+    if partial not in ('na', 'drop'):
+        logger.error('"partial" should be "na" or "drop".')
+        raise (ValueError)
+    if join_sep is None:
+        join_sep = multi_sep[0]
+
+    cells = set()
+    for genes in values:
+        if isinstance(genes.dtype, pd.CategoricalDtype):
+            genes = genes.cat.categories
+        cells.update(genes.dropna().unique().tolist())
+
+    extra = {}
+    for cell in cells:
+        if (
+            not isinstance(cell, str)
+            or cell in mapping
+            or not any(c in cell for c in multi_sep)
+        ):
+            continue
+        outs = [mapping.get(call) for call in split_calls(cell, multi_sep, mapping)]
+        mapped = [out for out in outs if isinstance(out, str)]
+        if not mapped or (partial == 'na' and len(mapped) < len(outs)):
+            continue
+        names = list(dict.fromkeys(out for out in mapped if out != 'NoData'))
+        extra[cell] = join_sep.join(names) if names else 'NoData'
+
+    return {**mapping, **extra} if extra else mapping
+
+
+def map_genes(genes, mapping):
+    """Map one column of gene names
+
+    Each distinct gene name is looked up once and the results are spread
+    back over the rows, so the cost scales with the number of distinct genes
+    rather than the number of rows.
+
+    :param genes: Gene names
+    :type genes: Series
+    :param mapping: Output gene names keyed by input gene name
+    :type mapping: dict
+    :return: Converted gene names (``NaN`` where missing or not in ``mapping``),
+        the number of non-missing rows that could not be mapped, and those
+        unmapped gene names
+    :rtype: tuple of (ndarray, int, list of str)
+    """
+
+    codes, uniques = pd.factorize(genes)
+    mapped = np.array(
+        [mapping.get(g, np.nan) for g in uniques] + [np.nan], dtype=object
+    )
+    # Missing input (code -1) picks up the trailing NaN
+    converted = mapped[codes]
+
+    unmapped = np.flatnonzero(pd.isna(mapped[:-1]))
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    bad_genes = [uniques[i] for i in unmapped]
+
+    return converted, int(counts[unmapped].sum()), bad_genes
+
+
+def is_arrow_string(dtype):
+    """Check whether a pandas dtype holds strings in Arrow memory
+
+    :param dtype: Column dtype
+    :type dtype: dtype
+    :return: ``True`` for ``string[pyarrow]`` columns and ``ArrowDtype`` string or dictionary-of-string columns
+    :rtype: bool
+    """
+
+    if isinstance(dtype, pd.StringDtype):
+        return dtype.storage != 'python'
+    if isinstance(dtype, pd.ArrowDtype):
+        import pyarrow as pa
+
+        value_type = dtype.pyarrow_dtype
+        if pa.types.is_dictionary(value_type):
+            value_type = value_type.value_type
+        return pa.types.is_string(value_type) or pa.types.is_large_string(value_type)
+    return False
+
+
+def map_column(genes, mapping):
+    """Map one column of gene names, keeping its dtype family
+
+    Object columns come back as object arrays, as from ``map_genes()``.
+    Arrow-backed string columns are mapped through an Arrow dictionary (see
+    ``arrow.map_chunks()``) without creating a Python string per row, and
+    come back with the same dtype. Other string and categorical columns are
+    mapped with ``map_genes()`` and cast back to their dtype.
+
+    :param genes: Gene names
+    :type genes: Series
+    :param mapping: Output gene names keyed by input gene name
+    :type mapping: dict
+    :return: Converted gene names (missing where missing or not in ``mapping``),
+        the number of non-missing rows that could not be mapped, and those
+        unmapped gene names
+    :rtype: tuple of (array-like, int, list of str)
+    """
+
+    dtype = genes.dtype
+    if is_arrow_string(dtype):
+        from .arrow import import_pyarrow, map_chunks
+
+        pa = import_pyarrow()
+        values = pa.chunked_array([pa.array(genes)])
+        converted, n_bad, bad_genes = map_chunks(values, mapping)
+        if not pa.types.is_dictionary(values.type):
+            converted = converted.cast(values.type)
+        return dtype.__from_arrow__(converted), n_bad, bad_genes
+
+    converted, n_bad, bad_genes = map_genes(genes, mapping)
+    if isinstance(dtype, (pd.StringDtype, pd.CategoricalDtype)):
+        converted = pd.Series(converted, index=genes.index)
+        converted = converted.mask(converted == 'NoData').astype(
+            'category' if isinstance(dtype, pd.CategoricalDtype) else dtype
+        )
+    return converted, n_bad, bad_genes
+
+
+def warn_skipped(col):
+    """Warn that a column had no valid genes and was left as is"""
+
+    logger.warning(
+        f"The input column '{col}' doesn't contain any valid genes and was skipped."
+    )
+
+
+def warn_unmapped(bad_genes, species=None):
+    """Warn about genes that could not be converted"""
+
+    if bad_genes:
+        sorted_list = sorted(list(set(bad_genes)))
+        which = 'this species' if species is None else species
+        logger.warning(
+            f'These genes are not in IMGT for {which} and will be replaced with NA:\n {str(sorted_list)}'
+        )
+
+
+def convert_columns(
+    df,
+    cols_from,
+    mapping,
+    metrics=None,
+    n_jobs=None,
+    multi_sep=None,
+    join_sep=None,
+    partial='na',
+):
+    """Convert gene columns with a gene name mapping
+
+    Does the work of ``convert_gene()`` once the lookup table and input
+    columns have been chosen, including the warnings about unmapped genes
+    and skipped columns.
+
+    :param df: Dataframe containing TCR gene names
+    :type df: DataFrame
+    :param cols_from: Columns to convert. Names not in ``df`` are ignored.
+    :type cols_from: list of str
+    :param mapping: Output gene names keyed by input gene name, as returned by ``lookup_mapping()``
+    :type mapping: dict
+    :param metrics: Metrics to record rows, unmapped genes and skipped columns to
+    :type metrics: tcrconvert.metrics.Metrics, optional
+    :param n_jobs: Number of processes to map object columns with, see ``parallel.use_parallel()``
+    :type n_jobs: int, optional
+    :param multi_sep: Characters that separate calls in multi-valued cells, see ``multi_mapping()``
+    :type multi_sep: str, optional
+    :param join_sep: Separator between converted calls
+    :type join_sep: str, optional
+    :param partial: ``'na'`` or ``'drop'``, what to do with partly mapped cells
+    :type partial: str, optional
+    :return: Converted TCR data
+    :rtype: DataFrame
+    """
+
     new_genes = {}
     bad_genes = []
 
+    if multi_sep:
+        values = [df[col] for col in cols_from if col in df.columns]
+        mapping = multi_mapping(values, mapping, multi_sep, join_sep, partial)
+
+    # Object columns of large inputs are mapped in worker processes
+    mapped = {}
+    jobs = parallel.use_parallel(len(df), n_jobs)
+    if jobs > 1:
+        object_cols = [
+            col for col in cols_from if col in df.columns and df[col].dtype == object
+        ]
+        if object_cols:
+            mapped = parallel.map_columns_parallel(df, object_cols, mapping, jobs)
+
     for col in cols_from:
         if col in df.columns:
-            good_genes = (
-                df[[col]]
-                .merge(lookup[[frm, to]], how='left', left_on=col, right_on=frm)
-                .drop(columns=frm)
-            )
-            # Note genes where the merge produced an NA on the 'to' format side
-            new_bad_genes = good_genes[good_genes[to].isna()][col].dropna().tolist()
+            if col in mapped:
+                converted, n_bad, new_bad_genes = mapped.pop(col)
+            else:
+                converted, n_bad, new_bad_genes = map_column(df[col], mapping)
             # We don't expect the entire column of genes to be empty.
-            if len(new_bad_genes) < len(good_genes):
-                new_genes[col] = good_genes
+            if n_bad < len(df):
+                new_genes[col] = converted
                 bad_genes += new_bad_genes
+                if metrics is not None:
+                    metrics.inc('tcrconvert_unmapped_rows', n_bad, column=col)
             else:
-                logger.warning(
-                    f"The input column '{col}' doesn't contain any valid genes and was skipped."
-                )
+                warn_skipped(col)
+                if metrics is not None:
+                    metrics.set('tcrconvert_skipped_columns', 1, column=col)
                 continue
 
     # Display genes we couldn't convert
-    if bad_genes:
-        sorted_list = sorted(list(set(bad_genes)))
-        logger.warning(
-            f'These genes are not in IMGT for this species and will be replaced with NA:\n {str(sorted_list)}'
+    warn_unmapped(bad_genes)
+    if metrics is not None:
+        metrics.inc('tcrconvert_rows', len(df))
+        metrics.add_unmapped(bad_genes)
+
+    # Swap out data in original dataframe
+    out_df = df.copy()
+    for col in new_genes:
+        out_df[col] = new_genes[col]
+        if out_df[col].dtype == object:
+            # Replace NoData and np.nan with pd.NA
+            out_df[col] = out_df[col].replace('NoData', pd.NA)
+
+    return out_df
+
+
+def convert_by_species(
+    df,
+    cols_from,
+    mappings,
+    species_col,
+    metrics=None,
+    multi_sep=None,
+    join_sep=None,
+    partial='na',
+):
+    """Convert gene columns of a table that holds several species
+
+    Rows are grouped by the species in ``species_col``. For each gene column,
+    every distinct pair of species and gene is looked up once in that
+    species' mapping and the results are spread back over the rows in their
+    original order. Genes in rows with no species cannot be converted.
+    Unmapped genes are reported for each species; a column is skipped, as in
+    ``convert_columns()``, only if none of its values can be converted for
+    any species.
+
+    :param df: Dataframe containing TCR gene names
+    :type df: DataFrame
+    :param cols_from: Columns to convert. Names not in ``df`` are ignored.
+    :type cols_from: list of str
+    :param mappings: Gene name mapping of each species in ``species_col``, as returned by ``lookup_mapping()``
+    :type mappings: dict of dict
+    :param species_col: Column holding each row's species
+    :type species_col: str
+    :param metrics: Metrics to record rows, unmapped genes and skipped columns to
+    :type metrics: tcrconvert.metrics.Metrics, optional
+    :param multi_sep: Characters that separate calls in multi-valued cells, see ``multi_mapping()``
+    :type multi_sep: str, optional
+    :param join_sep: Separator between converted calls
+    :type join_sep: str, optional
+    :param partial: ``'na'`` or ``'drop'``, what to do with partly mapped cells
+    :type partial: str, optional
+    :return: Converted TCR data
+    :rtype: DataFrame
+    """
+
+    sp_codes, sp_names = pd.factorize(df[species_col])
+    sp_names = list(sp_names)
+    cols = [col for col in cols_from if col in df.columns]
+
+    if multi_sep:
+        mappings = dict(mappings)
+        for i, sp in enumerate(sp_names):
+            rows = df.loc[sp_codes == i, cols]
+            values = [rows[col] for col in cols]
+            mappings[sp] = multi_mapping(
+                values, mappings[sp], multi_sep, join_sep, partial
+            )
+
+    new_genes = {}
+    bad_genes = {}
+    for col in cols:
+        genes = df[col]
+        codes, uniques = pd.factorize(genes)
+        n_genes = max(len(uniques), 1)
+
+        # One code per (species, gene) pair; rows with no species get -1
+        pairs = np.where(
+            codes < 0, -2, np.where(sp_codes < 0, -1, sp_codes * n_genes + codes)
         )
+        pair_codes, pair_uniques = pd.factorize(pairs)
+        mapped = np.empty(len(pair_uniques), dtype=object)
+        col_bad = {}
+        counts = np.bincount(pair_codes, minlength=len(pair_uniques))
+        for i, pair in enumerate(pair_uniques):
+            if pair == -2:
+                mapped[i] = np.nan
+                continue
+            if pair == -1:
+                sp, gene, out = None, None, np.nan
+            else:
+                sp = sp_names[pair // n_genes]
+                gene = uniques[pair % n_genes]
+                out = mappings[sp].get(gene, np.nan)
+            mapped[i] = out
+            if pd.isna(out):
+                n_bad, names = col_bad.get(sp, (0, []))
+                col_bad[sp] = (n_bad + counts[i], names + [gene])
+        converted = mapped[pair_codes]
+
+        n_bad = sum(n for n, _ in col_bad.values())
+        # We don't expect the entire column of genes to be empty.
+        if n_bad < len(df):
+            if isinstance(genes.dtype, pd.CategoricalDtype) or genes.dtype != object:
+                converted = pd.Series(converted, index=genes.index)
+                converted = converted.mask(converted == 'NoData').astype(
+                    'category'
+                    if isinstance(genes.dtype, pd.CategoricalDtype)
+                    else genes.dtype
+                )
+            new_genes[col] = converted
+            for sp, (sp_bad, names) in col_bad.items():
+                bad_genes.setdefault(sp, []).extend(g for g in names if g is not None)
+                if metrics is not None:
+                    label = 'NA' if sp is None else sp
+                    metrics.inc(
+                        'tcrconvert_unmapped_rows', sp_bad, column=col, species=label
+                    )
+        else:
+            warn_skipped(col)
+            if metrics is not None:
+                metrics.set('tcrconvert_skipped_columns', 1, column=col)
+
+    # Display genes we couldn't convert, for each species
+    for sp, names in bad_genes.items():
+        if sp is None:
+            logger.warning(
+                f"Genes in rows with no species in column '{species_col}' will be replaced with NA."
+            )
+        else:
+            warn_unmapped(names, sp)
+    if metrics is not None:
+        metrics.inc('tcrconvert_rows', len(df))
+        metrics.add_unmapped(g for names in bad_genes.values() for g in names)
 
     # Swap out data in original dataframe
     out_df = df.copy()
     for col in new_genes:
-        out_df[col] = new_genes[col][to].values
-        # Replace NoData and np.nan with pd.NA
-        out_df[col] = out_df[col].replace('NoData', pd.NA)
+        out_df[col] = new_genes[col]
+        if out_df[col].dtype == object:
+            # Replace NoData and np.nan with pd.NA
+            out_df[col] = out_df[col].replace('NoData', pd.NA)
 
     return out_df
 
 
+def delimiter(path):
+    """Get the field delimiter for a CSV or TSV file
+
+    :param path: File path ending in ``csv`` or ``tsv``
+    :type path: str
+    :return: ``','`` or ``'\\t'``
+    :rtype: str
+    """
+
+    return ',' if path.endswith('csv') else '\t'
+
+
+def convert_file(
+    input,
+    output,
+    frm,
+    to,
+    species='human',
+    frm_cols=[],
+    verbose=True,
+    passthrough=False,
+    dtype_backend=None,
+    metrics=None,
+    n_jobs=None,
+    multi_sep=None,
+    join_sep=None,
+    partial='na',
+    cache=None,
+    checkpoint=False,
+    resume=False,
+    resolve=False,
+    mapping=None,
+):
+    """Convert gene names in a CSV or TSV file
+
+    Reads ``input``, converts it with ``convert_gene()`` and writes ``output``.
+    Every column is read as a string so that values such as booleans are
+    written back unchanged. With ``dtype_backend='pyarrow'`` the strings are
+    held in Arrow memory instead of as Python objects, which takes several
+    times less memory for large files.
+
+    With ``passthrough=True`` the file is never loaded into pandas. Each
+    record is streamed through and only the gene fields are parsed and
+    replaced; every other byte is copied as is. The result is the same as
+    the default path except where pandas would rewrite a non-gene field,
+    for example a missing-value marker like ``NA`` (written as an empty
+    field by pandas) or needlessly quoted text. Input and output must use
+    the same delimiter.
+
+    :param input: Input file (CSV or TSV)
+    :type input: str
+    :param output: Output file (CSV or TSV)
+    :type output: str
+    :param frm: Input format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``, or ``'auto'`` to detect it with ``detect_format()``
+    :type frm: str
+    :param to: Output format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type to: str
+    :param species: Species name, or a column of the input holding each row's species. Defaults to ``'human'``.
+    :type species: str, optional
+    :param frm_cols: Custom gene column names. With ``frm='auto'`` defaults to the detected columns.
+    :type frm_cols: list of str, optional
+    :param verbose: Whether to show all messages. Defaults to ``True``.
+    :type verbose: bool, optional
+    :param passthrough: Splice converted genes into the raw records instead of going through pandas. Defaults to ``False``.
+    :type passthrough: bool, optional
+    :param dtype_backend: ``'pyarrow'`` to read columns as ``ArrowDtype`` strings. Defaults to ``None`` (object strings). Needs pandas 2.0 or later. Not used with ``passthrough``.
+    :type dtype_backend: str, optional
+    :param metrics: Metrics to record rows, unmapped genes, skipped columns, bytes and stage timings to
+    :type metrics: tcrconvert.metrics.Metrics, optional
+    :param n_jobs: Number of processes for ``convert_gene()``, or with ``passthrough`` for ``splice_file()``
+    :type n_jobs: int, optional
+    :param multi_sep: Characters that separate calls within a cell, see ``convert_gene()``. Not used with ``passthrough``.
+    :type multi_sep: str, optional
+    :param join_sep: Separator between converted calls
+    :type join_sep: str, optional
+    :param partial: ``'na'`` or ``'drop'``, what to do with partly converted cells
+    :type partial: str, optional
+    :param cache: Cache to reuse the output of an identical earlier run from, and to store this one in
+    :type cache: tcrconvert.cache.ResultCache, optional
+    :param checkpoint: Save progress so that an interrupted run can be resumed, see ``splice_file()``. Only with ``passthrough``.
+    :type checkpoint: bool, optional
+    :param resume: Continue an interrupted run from its last checkpoint. Only with ``passthrough``.
+    :type resume: bool, optional
+    :param resolve: Convert genes missing from the lookup tables with the naming rules, see ``convert_gene()``. Not used with ``passthrough``.
+    :type resolve: bool, optional
+    :param mapping: Mapping to use instead of reading the lookup table, see ``convert_gene()``
+    :type mapping: dict, optional
+    :return: Path to the output file
+    :rtype: str
+
+    :Example:
+
+    >>> import tempfile
+    >>> import tcrconvert
+    >>> tcr_file = tcrconvert.get_example_path('tenx.csv')
+    >>> out_file = os.path.join(tempfile.gettempdir(), 'tenx2imgt.csv')
+    >>> tcrconvert.convert_file(tcr_file, out_file, 'tenx', 'imgt', passthrough=True, verbose=False) # doctest: +ELLIPSIS
+    '...tenx2imgt.csv'
+    """
+
+    sep_in = delimiter(input)
+    sep_out = delimiter(output)
+
+    if (checkpoint or resume) and not passthrough:
+        logger.error('Checkpoints are only saved in passthrough mode.')
+        raise (ValueError)
+
+    if cache is not None:
+        from .cache import cached_output, record_notes, replay_notes
+
+        key, notes = cached_output(
+            cache,
+            input,
+            output,
+            frm=frm,
+            to=to,
+            species=species,
+            frm_cols=list(frm_cols),
+            passthrough=passthrough,
+            dtype_backend=dtype_backend,
+            multi_sep=multi_sep,
+            join_sep=join_sep,
+            partial=partial,
+            resolve=resolve,
+            sep=sep_out,
+        )
+        hit = notes is not None
+        if metrics is not None:
+            metrics.inc('tcrconvert_cache_lookups', result='hit' if hit else 'miss')
+        if hit:
+            replay_notes(notes, metrics)
+            if metrics is not None:
+                metrics.inc('tcrconvert_read_bytes', os.path.getsize(input))
+                metrics.inc('tcrconvert_written_bytes', os.path.getsize(output))
+            return output
+
+    # A miss records the warnings and metrics of the run to replay on hits
+    recording = (
+        contextlib.nullcontext((metrics, None))
+        if cache is None
+        else record_notes(metrics)
+    )
+    with recording as (job_metrics, notes):
+        _write_output(
+            input,
+            output,
+            sep_in,
+            sep_out,
+            frm,
+            to,
+            species,
+            frm_cols,
+            verbose,
+            passthrough,
+            dtype_backend,
+            job_metrics,
+            n_jobs,
+            multi_sep,
+            join_sep,
+            partial,
+            checkpoint,
+            resume,
+            resolve,
+            mapping,
+        )
+
+    if cache is not None:
+        cache.put(key, output, notes)
+
+    if metrics is not None:
+        metrics.inc('tcrconvert_read_bytes', os.path.getsize(input))
+        metrics.inc('tcrconvert_written_bytes', os.path.getsize(output))
+
+    return output
+
+
+def _write_output(
+    input,
+    output,
+    sep_in,
+    sep_out,
+    frm,
+    to,
+    species,
+    frm_cols,
+    verbose,
+    passthrough,
+    dtype_backend,
+    metrics,
+    n_jobs,
+    multi_sep,
+    join_sep,
+    partial,
+    checkpoint,
+    resume,
+    resolve,
+    mapping,
+):
+    """Convert ``input`` to ``output`` for ``convert_file()``"""
+
+    if not resume:
+        _unlink_shared(output)
+
+    if frm == 'auto':
+        from .detect import detect_format
+
+        with stage(metrics, 'detect'):
+            known = registry.get_species(species) is not None
+            found = detect_format(input, species if known else None, verbose=verbose)
+        frm = found['frm']
+        if not frm_cols:
+            frm_cols = found['columns']
+
+    if passthrough:
+        if sep_in != sep_out:
+            logger.error(
+                'Passthrough mode needs input and output to be both CSV or both TSV.'
+            )
+            raise (ValueError)
+        if multi_sep:
+            logger.error('Passthrough mode does not split multi-valued cells.')
+            raise (ValueError)
+        if resolve:
+            logger.error(
+                'Passthrough mode does not resolve genes with the naming rules.'
+            )
+            raise (ValueError)
+        splice_file(
+            input,
+            output,
+            frm,
+            to,
+            species,
+            frm_cols,
+            verbose,
+            metrics,
+            n_jobs,
+            checkpoint,
+            resume,
+            mapping,
+        )
+    else:
+        with stage(metrics, 'read'):
+            if dtype_backend == 'pyarrow':
+                from .arrow import check_pandas_arrow, import_pyarrow
+
+                pa = import_pyarrow()
+                check_pandas_arrow()
+                df = pd.read_csv(
+                    input,
+                    sep=sep_in,
+                    dtype=pd.ArrowDtype(pa.string()),
+                    dtype_backend='pyarrow',
+                )
+            else:
+                df = pd.read_csv(input, sep=sep_in, dtype=str)
+        out_df = convert_gene(
+            df,
+            frm,
+            to,
+            species,
+            frm_cols,
+            verbose,
+            metrics,
+            n_jobs,
+            multi_sep,
+            join_sep,
+            partial,
+            resolve,
+            mapping,
+        )
+        with stage(metrics, 'write'):
+            out_df.to_csv(output, sep=sep_out, index=False)
+
+
+def splice_file(
+    input,
+    output,
+    frm,
+    to,
+    species='human',
+    frm_cols=[],
+    verbose=True,
+    metrics=None,
+    n_jobs=None,
+    checkpoint=False,
+    resume=False,
+    mapping=None,
+):
+    """Convert gene names in a file without loading it into pandas
+
+    Implements ``convert_file(..., passthrough=True)``. The whole file is
+    rewritten in one pass. If a gene column turns out to hold no valid genes
+    it must be left as is, so the file is rewritten once more without it.
+
+    With ``n_jobs``, files of at least ``shard.MIN_SHARD_BYTES`` are split
+    into row-aligned byte ranges that are rewritten in parallel processes
+    and concatenated in order (see ``shard.plan_shards()``). The output is
+    the same as with one process.
+
+    With ``checkpoint=True`` progress is saved next to ``output`` as the
+    file is rewritten (see ``checkpoint.Checkpoint``). After a crash,
+    ``resume=True`` truncates ``output`` to the last checkpoint and carries
+    on from there, giving the same output and warnings as an uninterrupted
+    run. Checkpoints need one process.
+
+    :param input: Input file (CSV or TSV)
+    :type input: str
+    :param output: Output file, using the same delimiter as ``input``
+    :type output: str
+    :param frm: Input format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type frm: str
+    :param to: Output format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type to: str
+    :param species: Species name. Defaults to ``'human'``.
+    :type species: str, optional
+    :param frm_cols: Custom gene column names.
+    :type frm_cols: list of str, optional
+    :param verbose: Whether to show all messages. Defaults to ``True``.
+    :type verbose: bool, optional
+    :param metrics: Metrics to record rows, unmapped genes, skipped columns and timings to
+    :type metrics: tcrconvert.metrics.Metrics, optional
+    :param n_jobs: Number of processes; ``-1`` uses every CPU. Defaults to ``None`` (one process).
+    :type n_jobs: int, optional
+    :param checkpoint: Save progress so that an interrupted run can be resumed. Defaults to ``False``.
+    :type checkpoint: bool, optional
+    :param resume: Continue from the last checkpoint if there is one; implies ``checkpoint``. Defaults to ``False``.
+    :type resume: bool, optional
+    :param mapping: Mapping to use instead of reading the lookup table, as from ``lookup_mapping()``. Defaults to ``None``.
+    :type mapping: dict, optional
+    :return: None
+    """
+
+    if verbose:
+        logger.setLevel(logging.INFO)
+    else:
+        logger.setLevel(logging.WARNING)
+
+    if frm == to:
+        logger.error('"frm" and "to" formats should be different.')
+        raise (ValueError)
+    if to == 'adaptive' or to == 'adaptivev2':
+        logger.warning('Adaptive only captures VDJ genes; C genes will be NA.')
+
+    if mapping is None:
+        start = time.perf_counter()
+        lookup_f = choose_lookup(frm, to, species, verbose)
+        mapping = lookup_mapping(read_lookup(lookup_f), frm, to)
+        if metrics is not None:
+            metrics.inc('tcrconvert_lookup_load_seconds', time.perf_counter() - start)
+    else:
+        log_lookup_notes(frm, to)
+
+    sep = delimiter(input)
+    with _open_text(input) as f:
+        header_rec = next(stream.iter_records(f), '')
+    header = stream.parse_header(header_rec, sep)
+    cols_from = which_frm_cols(pd.DataFrame(columns=header), frm, frm_cols, verbose)
+    positions = {c: header.index(c) for c in cols_from if c in header}
+
+    data_start = len(header_rec.encode('utf-8', 'surrogateescape'))
+    jobs = shard.use_shards(os.path.getsize(input), n_jobs)
+
+    ckpt = state = None
+    if checkpoint or resume:
+        if jobs > 1:
+            logger.error('Checkpoints need a conversion in one process.')
+            raise (ValueError)
+        from .checkpoint import Checkpoint
+
+        st = os.stat(input)
+        ckpt = Checkpoint(
+            output,
+            {
+                'input_bytes': st.st_size,
+                'input_mtime_ns': st.st_mtime_ns,
+                'frm': frm,
+                'to': to,
+                'species': species,
+                'frm_cols': list(frm_cols),
+            },
+        )
+        if resume:
+            state = ckpt.load()
+            if state is None:
+                logger.info('No checkpoint found, starting from the beginning.')
+                _unlink_shared(output)
+            else:
+                logger.info(f'Resuming from byte {state["offset"]} of {input}')
+
+    with shard.new_pool(jobs) if jobs > 1 else contextlib.nullcontext() as pool:
+        if jobs > 1:
+            with stage(metrics, 'plan'):
+                ranges = shard.plan_shards(input, data_start, jobs, pool)
+
+        skip = state['skip'] if state else set()
+        while True:
+            mappings = {pos: mapping for c, pos in positions.items() if c not in skip}
+            with stage(metrics, 'splice'):
+                if jobs > 1:
+                    stats = shard.splice_shards(
+                        input, output, header_rec, sep, mappings, ranges, pool
+                    )
+                else:
+                    stats = _splice_serial(
+                        input,
+                        output,
+                        header_rec,
+                        data_start,
+                        sep,
+                        mappings,
+                        ckpt,
+                        skip,
+                        state,
+                    )
+                    state = None
+
+            if any(st['rows'] == 0 for st in stats.values()):
+                os.remove(output)
+                if ckpt is not None:
+                    ckpt.remove()
+                logger.error('Input data is empty.')
+                raise (ValueError)
+
+            # We don't expect the entire column of genes to be empty.
+            new_skip = {
+                c
+                for c, pos in positions.items()
+                if pos in stats and stats[pos]['bad'] >= stats[pos]['rows']
+            }
+            if not new_skip:
+                break
+            skip |= new_skip
+
+    bad_genes = []
+    for c in cols_from:
+        if c in skip:
+            warn_skipped(c)
+            if metrics is not None:
+                metrics.set('tcrconvert_skipped_columns', 1, column=c)
+        elif c in positions:
+            bad_genes += stats[positions[c]]['bad_genes']
+            if metrics is not None:
+                metrics.inc(
+                    'tcrconvert_unmapped_rows', stats[positions[c]]['bad'], column=c
+                )
+    warn_unmapped(bad_genes)
+
+    if ckpt is not None:
+        ckpt.remove()
+
+    if metrics is not None:
+        if stats:
+            metrics.inc('tcrconvert_rows', next(iter(stats.values()))['rows'])
+        metrics.add_unmapped(bad_genes)
+
+
+def _splice_serial(
+    input, output, header_rec, data_start, sep, mappings, ckpt, skip, state
+):
+    """Rewrite a file in this process, from the start or from a checkpoint"""
+
+    if state is None:
+        stats = {pos: stream.new_stats() for pos in mappings}
+        offset = data_start
+        f = _open_text(input)
+        records = stream.iter_records(f)
+        next(records, None)
+        out = _open_text(output, 'w')
+        out.write(
+            header_rec if header_rec.endswith(('\n', '\r')) else header_rec + '\n'
+        )
+    else:
+        stats = state['stats']
+        offset = state['offset']
+        os.truncate(output, state['output_bytes'])
+        f = shard.open_range(input, offset, os.path.getsize(input))
+        records = stream.iter_records(f)
+        out = _open_text(output, 'a')
+
+    with f, out:
+        if ckpt is None:
+            out.writelines(stream.splice_records(records, sep, mappings, stats))
+        else:
+            from .checkpoint import splice_with_checkpoints
+
+            splice_with_checkpoints(
+                records, out, sep, mappings, stats, ckpt, skip, offset
+            )
+
+    return stats
+
+
+def _unlink_shared(path):
+    """Remove ``path`` if it is hardlinked, such as to a result cache entry
+
+    Outputs are rewritten in place, which would change every link to them.
+    """
+
+    try:
+        if os.stat(path).st_nlink > 1:
+            os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _open_text(path, mode='r'):
+    """Open a delimited file so that every byte round-trips unchanged"""
+
+    return open(path, mode, newline='', encoding='utf-8', errors='surrogateescape')
+
+
 # Command-line version of convert_gene()
 @click.command(name='convert', no_args_is_help=True)
 @click.option(
@@ -264,9 +1389,11 @@ def convert_gene(df, frm, to, species='human', frm_cols=[], verbose=True):
 @click.option(
     '-f',
     '--frm',
-    help='Input TCR gene format',
+    help='Input TCR gene format, or "auto" to detect it from the first rows',
     required=True,
-    type=click.Choice(['tenx', 'adaptive', 'adaptivev2', 'imgt'], case_sensitive=False),
+    type=click.Choice(
+        ['auto', 'tenx', 'adaptive', 'adaptivev2', 'imgt'], case_sensitive=False
+    ),
 )
 @click.option(
     '-t',
@@ -276,7 +1403,11 @@ def convert_gene(df, frm, to, species='human', frm_cols=[], verbose=True):
     type=click.Choice(['tenx', 'adaptive', 'adaptivev2', 'imgt'], case_sensitive=False),
 )
 @click.option(
-    '-s', '--species', default='human', help='Species name', show_default=True
+    '-s',
+    '--species',
+    default='human',
+    help="Species name, or a column holding each row's species",
+    show_default=True,
 )
 @click.option(
     '-c',
@@ -293,7 +1424,112 @@ def convert_gene(df, frm, to, species='human', frm_cols=[], verbose=True):
     help='Show INFO-level messages',
     show_default=True,
 )
-def convert_gene_cli(input, output, frm, to, species, column, verbose):
+@click.option(
+    '--passthrough',
+    is_flag=True,
+    default=False,
+    help='Rewrite only the gene fields of each record, copying everything else as is',
+)
+@click.option(
+    '--dtype-backend',
+    type=click.Choice(['pyarrow']),
+    default=None,
+    help='Hold columns as Arrow-backed strings instead of Python objects (needs pandas>=2.0)',
+)
+@click.option(
+    '--metrics-file',
+    default=None,
+    help='Write job metrics to this file in OpenMetrics text format',
+)
+@click.option(
+    '-j',
+    '--jobs',
+    default=None,
+    type=int,
+    help='Processes to convert large inputs with (-1 for one per CPU). With --passthrough a large file is split into byte ranges.',
+)
+@click.option(
+    '--multi-sep',
+    default=None,
+    help='Characters that separate several gene calls in one cell, e.g. ",/"',
+)
+@click.option(
+    '--join-sep',
+    default=None,
+    help='Separator between converted calls [default: first --multi-sep character]',
+)
+@click.option(
+    '--partial',
+    type=click.Choice(['na', 'drop']),
+    default='na',
+    help='For cells with some unconvertible calls: NA, or keep the converted calls',
+    show_default=True,
+)
+@click.option(
+    '--cache',
+    'use_cache',
+    is_flag=True,
+    default=False,
+    help='Reuse the output of an identical earlier run from the result cache',
+)
+@click.option(
+    '--cache-dir',
+    default=None,
+    help='Result cache folder (implies --cache) [default: user cache directory]',
+)
+@click.option(
+    '--cache-size',
+    default=1024,
+    help='Result cache size limit in MB',
+    show_default=True,
+)
+@click.option(
+    '--cache-link',
+    is_flag=True,
+    default=False,
+    help='Hardlink cached results instead of copying them',
+)
+@click.option(
+    '--checkpoint',
+    is_flag=True,
+    default=False,
+    help='With --passthrough, save progress next to the output so an interrupted run can be resumed',
+)
+@click.option(
+    '--resume',
+    is_flag=True,
+    default=False,
+    help='With --passthrough, continue an interrupted run from its last checkpoint',
+)
+@click.option(
+    '--resolve',
+    is_flag=True,
+    default=False,
+    help='Convert genes missing from the lookup tables with the naming rules',
+)
+def convert_gene_cli(
+    input,
+    output,
+    frm,
+    to,
+    species,
+    column,
+    verbose,
+    passthrough,
+    dtype_backend,
+    metrics_file,
+    jobs,
+    multi_sep,
+    join_sep,
+    partial,
+    use_cache,
+    cache_dir,
+    cache_size,
+    cache_link,
+    checkpoint,
+    resume,
+    resolve,
+):
     """Convert T-cell receptor V/D/J/C gene names.
 
     :Example:
@@ -320,24 +1556,50 @@ def convert_gene_cli(input, output, frm, to, species, column, verbose):
     if not output.endswith(('csv', 'tsv')):
         raise click.BadParameter('"output" must be a .csv or .tsv file')
 
-    # Load data
-    # For our purposes, read in every column as string so that boolean values
-    # don't get converted from uppercase to capitalized, etc.
-    if verbose:
-        click.echo(f'Reading input TCR data from: {os.path.abspath(input)}')
-    sep_in = ',' if input.endswith('csv') else '\t'
-    df = pd.read_csv(input, sep=sep_in, dtype=str)
+    if (checkpoint or resume) and not passthrough:
+        raise click.BadParameter('--checkpoint and --resume need --passthrough')
+
+    if passthrough and delimiter(input) != delimiter(output):
+        raise click.BadParameter(
+            '"input" and "output" must both be CSV or both be TSV with --passthrough'
+        )
+
+    cache = None
+    if use_cache or cache_dir:
+        from .cache import ResultCache
+
+        cache = ResultCache(cache_dir, cache_size * 1024**2, cache_link)
 
     # Convert gene names
     # Cast frm_cols as list because will be read in from command line as tuple
     if verbose:
+        click.echo(f'Reading input TCR data from: {os.path.abspath(input)}')
         click.echo(f'Converting gene nomenclature from "{frm}" to "{to}"')
-    out_df = convert_gene(df, frm, to, species, list(column), verbose)
+    with record_metrics(
+        metrics_file, command='convert', frm=frm, to=to, species=species
+    ) as metrics:
+        convert_file(
+            input,
+            output,
+            frm,
+            to,
+            species,
+            list(column),
+            verbose,
+            passthrough,
+            dtype_backend,
+            metrics,
+            jobs,
+            multi_sep,
+            join_sep,
+            partial,
+            cache,
+            checkpoint,
+            resume,
+            resolve,
+        )
 
-    # Save output
     if verbose:
         click.echo(
-            f'Writing TCR data with converted gene names to: {os.path.abspath(output)}'
+            f'Wrote TCR data with converted gene names to: {os.path.abspath(output)}'
         )
-    sep_out = ',' if output.endswith('csv') else '\t'
-    out_df.to_csv(output, sep=sep_out, index=False)
@@ -0,0 +1,355 @@
+import sys
+import logging
+import numpy as np
+from multiprocessing import shared_memory
+
+from . import registry
+from .metrics import stage
+from .convert import (
+    check_convert_args,
+    choose_lookup,
+    convert_by_species,
+    convert_columns,
+    log_lookup_notes,
+    logger,
+    read_lookup,
+    which_frm_cols,
+)
+
+# Column order of every table's code array
+FORMATS = ['imgt', 'tenx', 'adaptive', 'adaptivev2']
+
+# Lookup table used for each input format
+TABLES = {
+    'imgt': 'imgt',
+    'tenx': 'tenx',
+    'adaptive': 'adaptive',
+    'adaptivev2': 'adaptive',
+}
+
+
+class Converter:
+    """Compact, shareable lookup tables for repeated conversions
+
+    Holds every lookup table of the chosen species as integer code arrays
+    into one list of interned gene names, instead of as DataFrames. Loading
+    happens once; afterwards ``convert()`` gives the same result as
+    ``convert_gene()`` without touching the filesystem.
+
+    A ``Converter`` pickles to a few kilobytes, so it is cheap to send to
+    ``multiprocessing`` or ``concurrent.futures`` workers. After ``share()``
+    its arrays live in ``multiprocessing.shared_memory`` and a pickled copy
+    only carries the block names: every worker on the node attaches to the
+    same read-only memory. The process that called ``share()`` should call
+    ``unlink()`` (or use the converter as a context manager) once the workers
+    are done.
+
+    :param species: Species to load. Defaults to every species from ``list_species()``.
+    :type species: str or list of str, optional
+
+    :Example:
+
+    >>> import pandas as pd
+    >>> import tcrconvert
+    >>> from concurrent.futures import ProcessPoolExecutor
+    >>> df = pd.read_csv(tcrconvert.get_example_path('tenx.csv'))
+    >>> with tcrconvert.Converter(['human']).share() as conv:
+    ...     with ProcessPoolExecutor(2) as pool:
+    ...         futures = [pool.submit(conv.convert, df, 'tenx', 'imgt') for _ in range(2)]
+    ...         results = [f.result() for f in futures]
+    """
+
+    def __init__(self, species=None):
+        if species is None:
+            species = list(registry.get_registry())
+        elif isinstance(species, str):
+            species = [species]
+
+        names = {}
+        codes = {}
+        for sp in species:
+            for table in ['imgt', 'tenx', 'adaptive']:
+                lookup_f = choose_lookup(table, 'imgt', sp, verbose=False)
+                lookup = read_lookup(lookup_f)[FORMATS]
+                arr = np.full(lookup.shape, -1, dtype=np.int32)
+                for j, fmt in enumerate(FORMATS):
+                    for i, gene in enumerate(lookup[fmt]):
+                        if isinstance(gene, str):
+                            arr[i, j] = names.setdefault(sys.intern(gene), len(names))
+                codes[(sp, table)] = arr
+
+        self._names = list(names)
+        self._codes = codes
+        self._mappings = {}
+        self._shm = None
+        self._owner = False
+
+    @property
+    def species(self):
+        """Species held by this converter
+
+        :rtype: list of str
+        """
+
+        return sorted({sp for sp, _ in self._codes})
+
+    @property
+    def nbytes(self):
+        """Size of the code arrays in bytes
+
+        :rtype: int
+        """
+
+        return sum(arr.nbytes for arr in self._codes.values())
+
+    def mapping(self, frm, to, species='human'):
+        """Get the gene name mapping for a conversion
+
+        Mappings are built from the code arrays on first use and cached. A
+        mapping pickles as its converter, so after ``share()`` worker
+        processes rebuild it from the shared memory instead of receiving
+        every gene name.
+
+        :param frm: Input format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+        :type frm: str
+        :param to: Output format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+        :type to: str
+        :param species: Species name, defaults to ``'human'``
+        :type species: str, optional
+        :return: Output gene names keyed by input gene name, as from ``convert.lookup_mapping()``
+        :rtype: dict
+        """
+
+        key = (species, frm, to)
+        if key not in self._mappings:
+            if (species, TABLES[frm]) not in self._codes:
+                logger.error(f'Species not loaded in this Converter: {species}')
+                raise (ValueError)
+            arr = self._codes[(species, TABLES[frm])]
+            src = arr[:, FORMATS.index(frm)]
+            dst = arr[:, FORMATS.index(to)]
+            names = self._names
+            self._mappings[key] = _ConverterMapping(
+                {
+                    names[s]: names[d] if d >= 0 else np.nan
+                    for s, d in zip(src.tolist(), dst.tolist())
+                    if s >= 0
+                },
+                self,
+                key,
+            )
+
+        return self._mappings[key]
+
+    def convert(
+        self,
+        df,
+        frm,
+        to,
+        species='human',
+        frm_cols=[],
+        verbose=True,
+        metrics=None,
+        n_jobs=None,
+        multi_sep=None,
+        join_sep=None,
+        partial='na',
+    ):
+        """Convert gene names
+
+        Same as ``convert_gene()``, using the tables held in this converter.
+
+        :param df: Dataframe containing TCR gene names
+        :type df: DataFrame
+        :param frm: Input format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+        :type frm: str
+        :param to: Output format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+        :type to: str
+        :param species: Species name, or a column of ``df`` holding each row's species. Defaults to ``'human'``.
+        :type species: str, optional
+        :param frm_cols: Custom gene column names.
+        :type frm_cols: list of str, optional
+        :param verbose: Whether to show all messages. Defaults to ``True``.
+        :type verbose: bool, optional
+        :param metrics: Metrics to record rows, unmapped genes, skipped columns and timings to
+        :type metrics: tcrconvert.metrics.Metrics, optional
+        :param n_jobs: Number of processes to convert large inputs with. Defaults to ``None`` (no parallelism).
+        :type n_jobs: int, optional
+        :param multi_sep: Characters that separate calls within a cell. Defaults to ``None`` (cells hold one gene).
+        :type multi_sep: str, optional
+        :param join_sep: Separator between converted calls. Defaults to the first character of ``multi_sep``.
+        :type join_sep: str, optional
+        :param partial: ``'na'`` or ``'drop'``, what to do with partly converted cells. Defaults to ``'na'``.
+        :type partial: str, optional
+        :return: Converted TCR data
+        :rtype: DataFrame
+        """
+
+        if verbose:
+            logger.setLevel(logging.INFO)
+        else:
+            logger.setLevel(logging.WARNING)
+
+        check_convert_args(df, frm, to)
+        if isinstance(species, str) and species in df.columns:
+            mappings = {
+                sp: self.mapping(frm, to, sp)
+                for sp in df[species].dropna().unique().tolist()
+            }
+            log_lookup_notes(frm, to)
+            cols_from = which_frm_cols(df, frm, frm_cols, verbose)
+            with stage(metrics, 'convert'):
+                return convert_by_species(
+                    df,
+                    cols_from,
+                    mappings,
+                    species,
+                    metrics,
+                    multi_sep,
+                    join_sep,
+                    partial,
+                )
+
+        mapping = self.mapping(frm, to, species)
+        log_lookup_notes(frm, to)
+        cols_from = which_frm_cols(df, frm, frm_cols, verbose)
+
+        with stage(metrics, 'convert'):
+            return convert_columns(
+                df, cols_from, mapping, metrics, n_jobs, multi_sep, join_sep, partial
+            )
+
+    def share(self):
+        """Move the tables into shared memory
+
+        :return: This converter, now backed by shared memory
+        :rtype: Converter
+        """
+
+        if self._shm is not None:
+            return self
+
+        blob = '\0'.join(self._names).encode()
+        layout = []
+        offset = 0
+        for key, arr in self._codes.items():
+            layout.append((key, offset, arr.shape[0]))
+            offset += arr.size
+
+        names_shm = shared_memory.SharedMemory(create=True, size=max(len(blob), 1))
+        codes_shm = shared_memory.SharedMemory(
+            create=True, size=max(offset * np.dtype(np.int32).itemsize, 1)
+        )
+        names_shm.buf[: len(blob)] = blob
+        flat = np.ndarray((offset,), dtype=np.int32, buffer=codes_shm.buf)
+        for key, start, nrows in layout:
+            flat[start : start + nrows * len(FORMATS)] = self._codes[key].ravel()
+
+        self._shm = (names_shm, len(blob), codes_shm, layout)
+        self._owner = True
+        self._codes = _view_codes(codes_shm, layout)
+
+        return self
+
+    def close(self):
+        """Detach from shared memory
+
+        The converter can no longer be used afterwards.
+
+        :return: None
+        """
+
+        if self._shm is not None:
+            names_shm, _, codes_shm, _ = self._shm
+            self._codes = {}
+            names_shm.close()
+            codes_shm.close()
+
+    def unlink(self):
+        """Detach from and free the shared memory
+
+        Only has an effect in the process that called ``share()``.
+
+        :return: None
+        """
+
+        self.close()
+        if self._shm is not None and self._owner:
+            names_shm, _, codes_shm, _ = self._shm
+            names_shm.unlink()
+            codes_shm.unlink()
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.unlink()
+
+    def __getstate__(self):
+        if self._shm is not None:
+            names_shm, n_blob, codes_shm, layout = self._shm
+            return {'shm': (names_shm.name, n_blob, codes_shm.name, layout)}
+        return {'names': '\0'.join(self._names).encode(), 'codes': self._codes}
+
+    def __setstate__(self, state):
+        self._mappings = {}
+        self._owner = False
+        if 'shm' in state:
+            names_name, n_blob, codes_name, layout = state['shm']
+            names_shm = _attach(names_name)
+            codes_shm = _attach(codes_name)
+            blob = bytes(names_shm.buf[:n_blob])
+            self._shm = (names_shm, n_blob, codes_shm, layout)
+            self._codes = _view_codes(codes_shm, layout)
+        else:
+            blob = state['names']
+            self._shm = None
+            self._codes = state['codes']
+        self._names = [sys.intern(n) for n in blob.decode().split('\0')] if blob else []
+
+
+class _ConverterMapping(dict):
+    """Gene name mapping built by ``Converter.mapping()``
+
+    A plain ``dict`` that pickles as the converter it came from and its
+    (species, ``frm``, ``to``) key.
+    """
+
+    def __init__(self, items, converter, key):
+        super().__init__(items)
+        self.converter = converter
+        self.key = key
+
+    def __reduce__(self):
+        return _rebuild_mapping, (self.converter, self.key)
+
+
+def _rebuild_mapping(converter, key):
+    species, frm, to = key
+    return converter.mapping(frm, to, species)
+
+
+def _attach(name):
+    """Attach to an existing shared memory block without taking ownership"""
+
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+def _view_codes(codes_shm, layout):
+    """Read-only code arrays over a shared memory block"""
+
+    flat = np.ndarray(
+        (codes_shm.size // np.dtype(np.int32).itemsize,),
+        dtype=np.int32,
+        buffer=codes_shm.buf,
+    )
+    codes = {}
+    for key, start, nrows in layout:
+        arr = flat[start : start + nrows * len(FORMATS)].reshape(nrows, len(FORMATS))
+        arr.flags.writeable = False
+        codes[tuple(key)] = arr
+
+    return codes
@@ -0,0 +1,465 @@
+import os
+import re
+import uuid
+import logging
+import click
+import pandas as pd
+
+from . import parallel, shard
+from .arrow import import_pyarrow, map_chunks
+from .convert import (
+    choose_lookup,
+    logger,
+    lookup_mapping,
+    read_lookup,
+    warn_unmapped,
+    which_frm_cols,
+)
+
+# COLUMN OP VALUE, see parse_filter()
+FILTER_RE = re.compile(r'\s*([^\s=!<>]+)\s*(==|=|!=|<=|>=|<|>|\s+in\s+)\s*(.*?)\s*')
+
+
+def open_dataset(path):
+    """Open a hive-partitioned Parquet dataset
+
+    :param path: Dataset folder, laid out as ``<path>/<key>=<value>/.../*.parquet``
+    :type path: str
+    :return: Dataset
+    :rtype: pyarrow.dataset.FileSystemDataset
+    """
+
+    import_pyarrow()
+    import pyarrow.dataset as ds
+
+    if not os.path.isdir(path):
+        logger.error(f'Dataset folder not found: {path}')
+        raise (FileNotFoundError)
+    return ds.dataset(os.path.abspath(path), format='parquet', partitioning='hive')
+
+
+def parse_filter(text, schema):
+    """Turn a ``COLUMN OP VALUE`` condition into a dataset filter
+
+    ``OP`` is one of ``=``, ``==``, ``!=``, ``<``, ``<=``, ``>``, ``>=`` or
+    ``in``, which takes comma-separated values. Values are cast to the type of
+    the column in ``schema``, so ``productive = true`` compares booleans and
+    ``reads >= 10`` integers. Values may be quoted.
+
+    :param text: Condition, such as ``'study = S1'`` or ``'sample in A,B'``
+    :type text: str
+    :param schema: Dataset schema, including partition keys
+    :type schema: pyarrow.Schema
+    :return: Filter expression
+    :rtype: pyarrow.dataset.Expression
+
+    :Example:
+
+    >>> import pyarrow as pa
+    >>> from tcrconvert.dataset import parse_filter
+    >>> schema = pa.schema([('sample', pa.string()), ('productive', pa.bool_())])
+    >>> parse_filter('productive = true', schema)
+    <pyarrow.compute.Expression (productive == true)>
+    >>> parse_filter('sample in A,B', schema)
+    <pyarrow.compute.Expression is_in(sample, {value_set=string:[
+      "A",
+      "B"
+    ], null_matching_behavior=MATCH})>
+    """
+
+    pa = import_pyarrow()
+    import pyarrow.dataset as ds
+
+    m = FILTER_RE.fullmatch(text)
+    if m is None:
+        logger.error(f'Filter is not of the form "COLUMN OP VALUE": {text}')
+        raise (ValueError)
+    name, op, value = m.group(1), m.group(2).strip(), m.group(3)
+    if name not in schema.names:
+        logger.error(f'Filter column is not in the dataset: {name}')
+        raise (ValueError)
+
+    field_type = schema.field(name).type
+    values = [v.strip() for v in value.split(',')] if op == 'in' else [value]
+    try:
+        values = [
+            pa.scalar(
+                v[1:-1] if v[:1] == v[-1:] and v[:1] in '\'"' and len(v) > 1 else v
+            )
+            .cast(field_type)
+            .as_py()
+            for v in values
+        ]
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        logger.error(
+            f'Filter value does not match the type of {name} ({field_type}): {text}'
+        )
+        raise (ValueError)
+
+    field = ds.field(name)
+    if op == 'in':
+        return field.isin(values)
+    value = values[0]
+    return {
+        '=': field == value,
+        '==': field == value,
+        '!=': field != value,
+        '<': field < value,
+        '<=': field <= value,
+        '>': field > value,
+        '>=': field >= value,
+    }[op]
+
+
+def make_filter(where, schema):
+    """Combine conditions into one dataset filter
+
+    :param where: Filter expression, or conditions for ``parse_filter()`` that must all hold
+    :type where: pyarrow.dataset.Expression, str or list of str
+    :param schema: Dataset schema, including partition keys
+    :type schema: pyarrow.Schema
+    :return: Filter expression, or ``None`` for no filter
+    :rtype: pyarrow.dataset.Expression or None
+    """
+
+    if where is None or isinstance(where, (str, list, tuple)):
+        conditions = [where] if isinstance(where, str) else list(where or [])
+        expr = None
+        for text in conditions:
+            cond = parse_filter(text, schema)
+            expr = cond if expr is None else expr & cond
+        return expr
+    return where
+
+
+def convert_fragment(
+    path, partition, schema, filesystem, output, columns, gene_cols, where, mapping
+):
+    """Convert the rows of one dataset file that pass a filter
+
+    The file is scanned with only ``columns`` projected and ``where``
+    pushed down, so Parquet row groups whose statistics rule the filter out
+    are skipped. Gene columns keep their type, so every output file has the
+    same schema. Nothing is written if no row passes the filter.
+
+    :param path: Parquet file
+    :type path: str
+    :param partition: Partition expression of the file, giving its partition keys for ``where``
+    :type partition: pyarrow.dataset.Expression
+    :param schema: Dataset schema, including partition keys
+    :type schema: pyarrow.Schema
+    :param filesystem: Filesystem of the dataset
+    :type filesystem: pyarrow.fs.FileSystem
+    :param output: Output Parquet file
+    :type output: str
+    :param columns: Columns to read and write
+    :type columns: list of str
+    :param gene_cols: Columns of ``columns`` to convert
+    :type gene_cols: list of str
+    :param where: Row filter, or ``None``
+    :type where: pyarrow.dataset.Expression or None
+    :param mapping: Output gene names keyed by input gene name, as returned by ``convert.lookup_mapping()``
+    :type mapping: dict
+    :return: Number of rows written and the genes that could not be converted
+    :rtype: tuple of (int, list of str)
+    """
+
+    pa = import_pyarrow()
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    fragment = ds.FileSystemDataset.from_paths(
+        [path],
+        schema=schema,
+        format=ds.ParquetFileFormat(),
+        filesystem=filesystem,
+        partitions=[partition],
+    )
+    table = fragment.to_table(columns=columns, filter=where)
+    if len(table) == 0:
+        return 0, []
+
+    arrays = list(table.columns)
+    bad_genes = set()
+    for col in gene_cols:
+        i = columns.index(col)
+        converted, _, new_bad_genes = map_chunks(arrays[i], mapping)
+        if not pa.types.is_dictionary(table.schema.field(i).type):
+            converted = converted.cast(table.schema.field(i).type)
+        arrays[i] = converted
+        bad_genes.update(new_bad_genes)
+    table = pa.Table.from_arrays(arrays, schema=table.schema)
+
+    folder, name = os.path.split(output)
+    os.makedirs(folder, exist_ok=True)
+    tmp = os.path.join(folder, f'.{name}.tmp-{uuid.uuid4().hex}')
+    try:
+        pq.write_table(table, tmp)
+        os.replace(tmp, output)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    return len(table), sorted(bad_genes)
+
+
+def _init_worker(*shared):
+    global _shared
+    _shared = shared
+
+
+def _convert_shared(path, partition, output):
+    """Run ``convert_fragment()`` in a worker with the arguments shared by every file"""
+
+    schema, filesystem, columns, gene_cols, where, mapping = _shared
+    return convert_fragment(
+        path, partition, schema, filesystem, output, columns, gene_cols, where, mapping
+    )
+
+
+def convert_dataset(
+    input,
+    output,
+    frm,
+    to,
+    species='human',
+    columns=[],
+    where=None,
+    select=None,
+    n_jobs=None,
+    verbose=True,
+):
+    """Convert gene names in a hive-partitioned Parquet dataset
+
+    Only the files whose partition keys can match ``where`` are read, and
+    within them only the columns written to the output (plus those
+    ``where`` needs). Each file is converted by ``convert_fragment()``, in
+    ``n_jobs`` worker processes that each receive the mapping once, and
+    written to the same relative path under ``output``, so the output has
+    the input's partition layout but only the selected data. Partition keys stay in the folder names and are
+    not stored in the files. Files with no matching rows are left out.
+
+    As in ``convert_stream()``, gene columns keep their type and every gene
+    column is converted, even one with no valid genes.
+
+    :param input: Dataset folder, laid out as ``<input>/<key>=<value>/.../*.parquet``
+    :type input: str
+    :param output: Output folder, outside ``input``. It should not exist or be empty, so that no file of an earlier run is left in it.
+    :type output: str
+    :param frm: Input format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type frm: str
+    :param to: Output format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type to: str
+    :param species: Species name. Defaults to ``'human'``.
+    :type species: str, optional
+    :param columns: Custom gene column names.
+    :type columns: list of str, optional
+    :param where: Partition and row filter: an expression, or conditions for ``parse_filter()`` that must all hold, such as ``['study = S1', 'productive = true']``. Defaults to ``None`` (every row).
+    :type where: pyarrow.dataset.Expression, str or list of str, optional
+    :param select: Columns to write. Defaults to ``None`` (every column).
+    :type select: list of str, optional
+    :param n_jobs: Number of worker processes. ``None`` or ``1`` converts in this process; ``-1`` uses one per CPU.
+    :type n_jobs: int, optional
+    :param verbose: Whether to show all messages. Defaults to ``True``.
+    :type verbose: bool, optional
+    :return: One row per file converted with its path relative to ``input`` (``fragment``) and the number of ``rows`` written
+    :rtype: DataFrame
+
+    :Example:
+
+    >>> import tempfile
+    >>> import pyarrow as pa
+    >>> import pyarrow.dataset as ds
+    >>> from tcrconvert.dataset import convert_dataset
+    >>> lake = tempfile.mkdtemp()
+    >>> table = pa.table({
+    ...     'study': ['S1', 'S1', 'S2'],
+    ...     'v_gene': ['TRAV1-2', 'TRBV15', 'TRBV15'],
+    ...     'productive': [True, False, True],
+    ... })
+    >>> ds.write_dataset(table, lake, format='parquet', partitioning=['study'], partitioning_flavor='hive')
+    >>> out = os.path.join(tempfile.mkdtemp(), 'imgt')
+    >>> convert_dataset(lake, out, 'tenx', 'imgt', where=['study = S1', 'productive = true'], verbose=False)
+                      fragment  rows
+    0  study=S1/part-0.parquet     1
+    """
+
+    if verbose:
+        logger.setLevel(logging.INFO)
+    else:
+        logger.setLevel(logging.WARNING)
+
+    if frm == to:
+        logger.error('"frm" and "to" formats should be different.')
+        raise (ValueError)
+
+    input = os.path.abspath(input)
+    output = os.path.abspath(output)
+    if os.path.commonpath([input, output]) in (input, output):
+        logger.error('Output folder should not contain or be inside the input folder.')
+        raise (ValueError)
+    if os.path.isdir(output) and os.listdir(output):
+        logger.error(f'Output folder is not empty: {output}')
+        raise (ValueError)
+
+    dataset = open_dataset(input)
+    schema = dataset.schema
+    keys = dataset.partitioning.schema.names if dataset.partitioning else []
+    if select is None:
+        select = schema.names
+    missing = set(select) - set(schema.names)
+    if missing:
+        logger.error(f'These columns are not in the dataset: {str(missing)}')
+        raise (ValueError)
+    read_cols = [col for col in select if col not in keys]
+
+    cols_from = which_frm_cols(pd.DataFrame(columns=read_cols), frm, columns, verbose)
+    gene_cols = [col for col in cols_from if col in read_cols]
+    where = make_filter(where, schema)
+
+    lookup_f = choose_lookup(frm, to, species, verbose)
+    mapping = lookup_mapping(read_lookup(lookup_f), frm, to)
+
+    # Partition pruning: files whose keys rule out the filter are never opened
+    fragments = list(dataset.get_fragments(filter=where))
+    names = [os.path.relpath(f.path, input) for f in fragments]
+    args = [
+        (f.path, f.partition_expression, os.path.join(output, name))
+        for f, name in zip(fragments, names)
+    ]
+
+    jobs = min(parallel.resolve_jobs(n_jobs), max(len(args), 1))
+    if jobs == 1:
+        results = [
+            convert_fragment(
+                path,
+                partition,
+                schema,
+                dataset.filesystem,
+                dest,
+                read_cols,
+                gene_cols,
+                where,
+                mapping,
+            )
+            for path, partition, dest in args
+        ]
+    else:
+        shared = (schema, dataset.filesystem, read_cols, gene_cols, where, mapping)
+        with shard.new_pool(jobs, _init_worker, shared) as pool:
+            results = list(pool.map(_convert_shared, *zip(*args)))
+
+    bad_genes = set()
+    for _, genes in results:
+        bad_genes.update(genes)
+    # Display genes we couldn't convert
+    warn_unmapped(sorted(bad_genes))
+
+    summary = pd.DataFrame(
+        [(name, rows) for name, (rows, _) in zip(names, results) if rows],
+        columns=['fragment', 'rows'],
+    )
+    logger.info(
+        f'Converted {summary["rows"].sum()} rows from {len(summary)} of {len(dataset.files)} files.'
+    )
+
+    return summary
+
+
+# Command-line version of convert_dataset()
+@click.command(name='dataset', no_args_is_help=True)
+@click.option(
+    '-i',
+    '--input',
+    help='Hive-partitioned Parquet dataset folder',
+    required=True,
+    type=click.Path(exists=True, file_okay=False),
+)
+@click.option(
+    '-o',
+    '--output',
+    help='Output dataset folder',
+    required=True,
+    type=click.Path(file_okay=False),
+)
+@click.option(
+    '-f',
+    '--frm',
+    help='Input TCR gene format',
+    required=True,
+    type=click.Choice(['tenx', 'adaptive', 'adaptivev2', 'imgt'], case_sensitive=False),
+)
+@click.option(
+    '-t',
+    '--to',
+    help='Output TCR gene format',
+    required=True,
+    type=click.Choice(['tenx', 'adaptive', 'adaptivev2', 'imgt'], case_sensitive=False),
+)
+@click.option(
+    '-s', '--species', default='human', help='Species name', show_default=True
+)
+@click.option(
+    '-c',
+    '--column',
+    default=[],
+    help='Custom gene column name',
+    show_default=True,
+    multiple=True,
+)
+@click.option(
+    '-w',
+    '--where',
+    default=[],
+    multiple=True,
+    help='Partition or row filter "COLUMN OP VALUE", e.g. "study = S1" or "sample in A,B"; repeat to require several',
+)
+@click.option(
+    '--select',
+    default=[],
+    multiple=True,
+    help='Column to write; repeat for several [default: all columns]',
+)
+@click.option(
+    '-j',
+    '--jobs',
+    default=None,
+    type=int,
+    help='Number of processes, -1 for one per CPU [default: 1]',
+)
+@click.option(
+    '-v',
+    '--verbose',
+    default=True,
+    help='Show INFO-level messages',
+    show_default=True,
+)
+def convert_dataset_cli(
+    input, output, frm, to, species, column, where, select, jobs, verbose
+):
+    """Convert gene names in a hive-partitioned Parquet dataset.
+
+    :Example:
+
+    .. code-block:: bash
+
+       \b
+       $ tcrconvert dataset \\
+           --input lake/ --output lake_imgt/ \\
+           --frm tenx --to imgt \\
+           --where "study = S1" --where "productive = true" \\
+           --jobs -1
+    """
+
+    convert_dataset(
+        input,
+        output,
+        frm,
+        to,
+        species,
+        list(column),
+        list(where),
+        list(select) or None,
+        jobs,
+        verbose,
+    )
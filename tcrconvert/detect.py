@@ -0,0 +1,190 @@
+import logging
+import pandas as pd
+
+from . import registry
+from .convert import choose_lookup, col_ref, delimiter, logger, read_lookup
+
+# Input formats with their own gene names. Adaptive and Adaptive v2 share
+# gene names and are told apart by their column names.
+NAME_FORMATS = ['imgt', 'tenx', 'adaptive']
+
+# Gene name sets keyed by (species folder, build time)
+_indexes = {}
+
+
+def gene_index(species):
+    """Get the gene names of each input format for one species
+
+    Built from the species' lookup tables on first use and cached until the
+    tables are rebuilt.
+
+    :param species: Species name
+    :type species: str
+    :return: Gene names keyed by format (``'imgt'``, ``'tenx'``, ``'adaptive'``)
+    :rtype: dict of frozenset
+    """
+
+    info = registry.get_species(species)
+    key = (info['path'], info['built']) if info else (species, None)
+    if key not in _indexes:
+        index = {}
+        for fmt in NAME_FORMATS:
+            lookup = read_lookup(choose_lookup(fmt, 'imgt', species, verbose=False))
+            genes = lookup[fmt].dropna()
+            index[fmt] = frozenset(genes[genes != 'NoData'])
+        _indexes[key] = index
+
+    return _indexes[key]
+
+
+def sample_rows(data, n_rows=1000):
+    """Get the first rows of a data frame or CSV/TSV file as strings
+
+    :param data: Data frame, or path to a CSV or TSV file
+    :type data: DataFrame or str
+    :param n_rows: Maximum number of rows, defaults to ``1000``
+    :type n_rows: int, optional
+    :return: Sampled rows
+    :rtype: DataFrame
+    """
+
+    if isinstance(data, pd.DataFrame):
+        return data.head(n_rows)
+    return pd.read_csv(data, sep=delimiter(str(data)), dtype=str, nrows=n_rows)
+
+
+def score_columns(sample, species):
+    """Score every column of a sample against every format and species
+
+    :param sample: Sampled rows, as from ``sample_rows()``
+    :type sample: DataFrame
+    :param species: Species names
+    :type species: list of str
+    :return: One row per column, format and species with the number of
+        non-missing sampled ``values`` and the number of ``hits`` among them
+    :rtype: DataFrame
+    """
+
+    rows = []
+    for col in sample.columns:
+        values = sample[col].dropna()
+        values = values[values.map(lambda x: isinstance(x, str))]
+        if values.empty:
+            continue
+        counts = values.value_counts()
+        for sp in species:
+            index = gene_index(sp)
+            for fmt in NAME_FORMATS:
+                hits = int(counts[counts.index.isin(index[fmt])].sum())
+                rows.append(
+                    {
+                        'column': col,
+                        'species': sp,
+                        'format': fmt,
+                        'values': len(values),
+                        'hits': hits,
+                    }
+                )
+
+    return pd.DataFrame(rows, columns=['column', 'species', 'format', 'values', 'hits'])
+
+
+def detect_format(
+    data, species=None, n_rows=1000, min_hit_rate=0.5, min_confidence=0.9, verbose=True
+):
+    """Detect the input format and gene columns of TCR data
+
+    Samples the first ``n_rows`` rows and matches every column against the
+    gene names in the lookup tables. A column is a gene column for a format if
+    at least ``min_hit_rate`` of its non-missing values are gene names of that
+    format. Each format is scored by the number of sampled values it matches
+    in its gene columns, for its best species, and the confidence is the
+    winner's share of all formats' scores.
+
+    If the standard columns of the detected format (see ``which_frm_cols()``)
+    are gene columns, those are used; otherwise the detected gene columns are.
+    Adaptive and Adaptive v2 share gene names, so ``'adaptivev2'`` is chosen
+    when its column names are found.
+
+    :param data: Data frame, or path to a CSV or TSV file
+    :type data: DataFrame or str
+    :param species: Species to consider. Defaults to every species from ``list_species()``.
+    :type species: str or list of str, optional
+    :param n_rows: Number of rows to sample, defaults to ``1000``
+    :type n_rows: int, optional
+    :param min_hit_rate: Share of a column's values that must be gene names, defaults to ``0.5``
+    :type min_hit_rate: float, optional
+    :param min_confidence: Lowest confidence to accept, defaults to ``0.9``
+    :type min_confidence: float, optional
+    :param verbose: Whether to show all messages, defaults to ``True``
+    :type verbose: bool, optional
+    :return: Detected ``frm``, gene ``columns``, best-matching ``species``,
+        ``confidence`` and the ``scores`` of every format
+    :rtype: dict
+
+    :Example:
+
+    >>> import tcrconvert
+    >>> tcr_file = tcrconvert.get_example_path('tenx.csv')
+    >>> found = tcrconvert.detect_format(tcr_file, 'human', verbose=False)
+    >>> found['frm'], found['columns'], found['confidence']
+    ('tenx', ['v_gene', 'd_gene', 'j_gene', 'c_gene'], 1.0)
+    """
+
+    if verbose:
+        logger.setLevel(logging.INFO)
+    else:
+        logger.setLevel(logging.WARNING)
+
+    if species is None:
+        species = list(registry.get_registry())
+    elif isinstance(species, str):
+        species = [species]
+
+    sample = sample_rows(data, n_rows)
+    if sample.empty:
+        logger.error('Input data is empty.')
+        raise (ValueError)
+
+    scores = score_columns(sample, species)
+    scores = scores[scores['hits'] >= min_hit_rate * scores['values']]
+    if scores.empty:
+        logger.error('Could not find any gene columns in the input data.')
+        raise (ValueError)
+
+    # Best species for each format, then best format
+    totals = scores.groupby(['format', 'species'], sort=False)['hits'].sum()
+    best = totals.groupby(level='format').idxmax()
+    fmt_scores = totals[best.tolist()].droplevel('species').sort_values(ascending=False)
+    frm = fmt_scores.index[0]
+    sp = best[frm][1]
+    confidence = round(float(fmt_scores.iloc[0] / fmt_scores.sum()), 4)
+
+    if confidence < min_confidence:
+        logger.error(
+            f'Input format is ambiguous: {fmt_scores.to_dict()} matched genes per format.'
+        )
+        raise (ValueError)
+
+    found = scores[(scores['format'] == frm) & (scores['species'] == sp)]
+    gene_cols = [c for c in sample.columns if c in set(found['column'])]
+
+    columns = gene_cols
+    candidates = ['adaptivev2', 'adaptive'] if frm == 'adaptive' else [frm]
+    for cand in candidates:
+        standard = [c for c in col_ref[cand] if c in sample.columns]
+        if set(standard) & set(gene_cols):
+            frm, columns = cand, standard
+            break
+
+    logger.info(
+        f"Detected '{frm}' gene names for {sp} (confidence {confidence:.2f}) in columns: {str(columns)}"
+    )
+
+    return {
+        'frm': frm,
+        'columns': columns,
+        'species': sp,
+        'confidence': confidence,
+        'scores': fmt_scores.to_dict(),
+    }
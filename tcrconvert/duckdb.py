@@ -0,0 +1,254 @@
+import logging
+import pandas as pd
+
+from . import registry
+from .convert import (
+    choose_lookup,
+    log_lookup_notes,
+    logger,
+    lookup_mapping,
+    read_lookup,
+    warn_skipped,
+    warn_unmapped,
+    which_frm_cols,
+)
+
+FORMATS = ['imgt', 'tenx', 'adaptive', 'adaptivev2']
+
+
+def import_duckdb():
+    """Import duckdb, with a helpful message if it is missing"""
+
+    try:
+        import duckdb
+    except ImportError:
+        logger.error(
+            'duckdb is needed for DuckDB integration. Install it with: pip install "tcrconvert[duckdb]"'
+        )
+        raise
+    return duckdb
+
+
+def quote_name(name):
+    """Quote a SQL identifier"""
+
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def quote_value(value):
+    """Quote a SQL string literal"""
+
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def lookup_relation(species='human'):
+    """Collect every gene name mapping of some species into one table
+
+    Holds one row per species, input format, output format and input gene,
+    with the same mappings as ``convert.lookup_mapping()``. Genes with no
+    equivalent (``'NoData'``) have a missing ``to_gene``; genes whose output is
+    missing from the lookup table are left out, so they count as unmapped.
+
+    :param species: Species to include, defaults to ``'human'``
+    :type species: str or list of str, optional
+    :return: Columns ``lookup_species``, ``from_format``, ``to_format``, ``from_gene`` and ``to_gene``
+    :rtype: DataFrame
+    """
+
+    if isinstance(species, str):
+        species = [species]
+
+    frames = []
+    for sp in species:
+        for frm in FORMATS:
+            lookup = read_lookup(choose_lookup(frm, 'imgt', sp, verbose=False))
+            for to in FORMATS:
+                if to == frm:
+                    continue
+                mapping = lookup_mapping(lookup, frm, to)
+                pairs = [
+                    (g, None if out == 'NoData' else out)
+                    for g, out in mapping.items()
+                    if not pd.isna(g) and not pd.isna(out)
+                ]
+                frame = pd.DataFrame(pairs, columns=['from_gene', 'to_gene'])
+                frame.insert(0, 'to_format', to)
+                frame.insert(0, 'from_format', frm)
+                frame.insert(0, 'lookup_species', sp)
+                frames.append(frame)
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def register_lookups(con, species=None, name='tcr_lookup'):
+    """Make gene conversion available in a DuckDB connection
+
+    Creates a temporary table ``name`` from ``lookup_relation()`` and a
+    macro ``tcr_convert(gene, frm, to, species := 'human')`` that looks a
+    gene up in it, giving ``NULL`` for missing or unmapped genes like
+    ``convert_gene()``. DuckDB plans the lookup as a hash join, so
+    conversions run vectorised inside queries, for example over Parquet
+    files, without loading the data into pandas. Calling it again replaces
+    the table and macro.
+
+    :param con: DuckDB connection
+    :type con: duckdb.DuckDBPyConnection
+    :param species: Species to load. Defaults to every species from ``list_species()``.
+    :type species: str or list of str, optional
+    :param name: Name of the lookup table, defaults to ``'tcr_lookup'``
+    :type name: str, optional
+    :return: ``con``
+    :rtype: duckdb.DuckDBPyConnection
+
+    :Example:
+
+    >>> import duckdb
+    >>> from tcrconvert.duckdb import register_lookups
+    >>> con = register_lookups(duckdb.connect(), 'human')
+    >>> con.sql("SELECT tcr_convert('TRAV1-2', 'tenx', 'imgt') AS gene").fetchall()
+    [('TRAV1-2*01',)]
+    """
+
+    import_duckdb()
+
+    if species is None:
+        species = list(registry.get_registry())
+
+    relation = lookup_relation(species)
+    table = quote_name(name)
+    con.register('_tcrconvert_lookup', relation)
+    try:
+        con.execute(
+            f'CREATE OR REPLACE TEMP TABLE {table} AS SELECT * FROM _tcrconvert_lookup'
+        )
+    finally:
+        con.unregister('_tcrconvert_lookup')
+    con.execute(
+        f"""
+        CREATE OR REPLACE TEMP MACRO tcr_convert(gene, frm, "to", species := 'human') AS (
+            SELECT l.to_gene FROM {table} AS l
+            WHERE l.lookup_species = species
+              AND l.from_format = frm
+              AND l.to_format = "to"
+              AND l.from_gene = gene
+        )
+        """
+    )
+
+    return con
+
+
+def convert_relation(
+    con,
+    relation,
+    frm,
+    to,
+    species='human',
+    frm_cols=[],
+    verbose=True,
+    check=True,
+    name='tcr_lookup',
+):
+    """Convert gene names in a DuckDB relation
+
+    Works like ``convert_gene()`` on a table, view or query in a connection
+    set up with ``register_lookups()``, returning a lazy relation in which
+    each gene column is replaced by ``tcr_convert()``. Column order and
+    every other column are kept.
+
+    With ``check=True`` the input is scanned once per gene column to warn
+    about unmapped genes and to leave as is any column in which no value can
+    be converted, as ``convert_gene()`` does. With ``check=False`` nothing is
+    read until the result is used, and every gene column is converted.
+
+    :param con: DuckDB connection with the lookups registered
+    :type con: duckdb.DuckDBPyConnection
+    :param relation: Relation, or SQL table expression such as a table name or ``"read_parquet('tcrs/*.parquet')"``
+    :type relation: duckdb.DuckDBPyRelation or str
+    :param frm: Input format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type frm: str
+    :param to: Output format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type to: str
+    :param species: Species name. Defaults to ``'human'``.
+    :type species: str, optional
+    :param frm_cols: Custom gene column names.
+    :type frm_cols: list of str, optional
+    :param verbose: Whether to show all messages. Defaults to ``True``.
+    :type verbose: bool, optional
+    :param check: Check for unmapped genes and unconvertible columns. Defaults to ``True``.
+    :type check: bool, optional
+    :param name: Name of the lookup table given to ``register_lookups()``, defaults to ``'tcr_lookup'``
+    :type name: str, optional
+    :return: Converted TCR data
+    :rtype: duckdb.DuckDBPyRelation
+
+    :Example:
+
+    >>> import duckdb
+    >>> import tcrconvert
+    >>> from tcrconvert.duckdb import convert_relation, register_lookups
+    >>> con = register_lookups(duckdb.connect(), 'human')
+    >>> tcr_file = tcrconvert.get_example_path('tenx.csv')
+    >>> rel = convert_relation(con, f"read_csv('{tcr_file}')", 'tenx', 'imgt', verbose=False)
+    >>> rel.select('v_gene').limit(2).fetchall()
+    [('TRAV29/DV5*01',), ('TRBV20/OR9-2*01',)]
+    """
+
+    if verbose:
+        logger.setLevel(logging.INFO)
+    else:
+        logger.setLevel(logging.WARNING)
+
+    if frm == to:
+        logger.error('"frm" and "to" formats should be different.')
+        raise (ValueError)
+    if to == 'adaptive' or to == 'adaptivev2':
+        logger.warning('Adaptive only captures VDJ genes; C genes will be NA.')
+    log_lookup_notes(frm, to)
+
+    if isinstance(relation, str):
+        relation = con.sql(f'SELECT * FROM {relation}')
+
+    names = relation.columns
+    cols_from = which_frm_cols(pd.DataFrame(columns=names), frm, frm_cols, verbose)
+    cols_from = [c for c in cols_from if c in names]
+    args = f'{quote_value(frm)}, {quote_value(to)}, species := {quote_value(species)}'
+
+    skip = set()
+    if check:
+        n_rows = relation.aggregate('count(*)').fetchone()[0]
+        if n_rows == 0:
+            logger.error('Input data is empty.')
+            raise (ValueError)
+        lookup = (
+            f'SELECT from_gene FROM {quote_name(name)} WHERE lookup_species = {quote_value(species)}'
+            f' AND from_format = {quote_value(frm)} AND to_format = {quote_value(to)}'
+        )
+        bad_genes = []
+        for col in cols_from:
+            gene = f'CAST({quote_name(col)} AS VARCHAR)'
+            bad = relation.query(
+                '_tcrconvert_input',
+                f'SELECT {gene} AS gene, count(*) AS n FROM _tcrconvert_input'
+                f' WHERE {gene} IS NOT NULL AND {gene} NOT IN ({lookup}) GROUP BY 1',
+            ).fetchall()
+            # We don't expect the entire column of genes to be empty.
+            if sum(n for _, n in bad) < n_rows:
+                bad_genes += [str(g) for g, _ in bad]
+            else:
+                warn_skipped(col)
+                skip.add(col)
+
+        # Display genes we couldn't convert
+        warn_unmapped(bad_genes)
+
+    exprs = []
+    for col in names:
+        if col in cols_from and col not in skip:
+            exprs.append(
+                f'tcr_convert(CAST({quote_name(col)} AS VARCHAR), {args}) AS {quote_name(col)}'
+            )
+        else:
+            exprs.append(quote_name(col))
+
+    return relation.project(', '.join(exprs))
@@ -0,0 +1,296 @@
+import os
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+
+# Type, unit and help text of every metric family
+FAMILIES = {
+    'tcrconvert_rows': ('counter', None, 'Input rows processed.'),
+    'tcrconvert_unmapped_rows': (
+        'counter',
+        None,
+        'Non-missing gene values that could not be converted, per column.',
+    ),
+    'tcrconvert_unmapped_genes': (
+        'gauge',
+        None,
+        'Distinct gene names that could not be converted.',
+    ),
+    'tcrconvert_rule_derived_genes': (
+        'counter',
+        None,
+        'Distinct gene names converted with the naming rules instead of the lookup tables.',
+    ),
+    'tcrconvert_skipped_columns': (
+        'gauge',
+        None,
+        'Gene columns left as is because none of their values could be converted.',
+    ),
+    'tcrconvert_read_bytes': ('counter', 'bytes', 'Bytes read from input files.'),
+    'tcrconvert_written_bytes': ('counter', 'bytes', 'Bytes written to output files.'),
+    'tcrconvert_stage_seconds': ('gauge', 'seconds', 'Wall time spent in each stage.'),
+    'tcrconvert_lookup_load_seconds': (
+        'gauge',
+        'seconds',
+        'Wall time spent loading lookup tables.',
+    ),
+    'tcrconvert_cache_lookups': (
+        'counter',
+        None,
+        'Result cache lookups, by result (hit or miss).',
+    ),
+    'tcrconvert_lookup_genes': ('gauge', None, 'Rows in each lookup table built.'),
+    'tcrconvert_lookup_built': (
+        'gauge',
+        None,
+        'Whether the lookup tables were rewritten (0 if already up to date).',
+    ),
+    'tcrconvert_run_seconds': ('gauge', 'seconds', 'Wall time of the whole run.'),
+    'tcrconvert_last_run_success': (
+        'gauge',
+        None,
+        'Whether the run finished without an error.',
+    ),
+    'tcrconvert_last_run_timestamp_seconds': (
+        'gauge',
+        'seconds',
+        'Unix time at which the run finished.',
+    ),
+}
+
+
+class Metrics:
+    """Counters and gauges for one conversion or build job
+
+    Pass an instance as ``metrics`` to ``convert_file()``, ``convert_gene()``
+    or ``build_lookup_from_fastas()`` to have it filled in, then call
+    ``write()`` to export it in OpenMetrics text format, for example for the
+    Prometheus node-exporter textfile collector.
+
+    :param labels: Labels added to every sample, such as ``species='human'``
+    :type labels: str
+
+    :Example:
+
+    >>> import pandas as pd
+    >>> import tcrconvert
+    >>> from tcrconvert.metrics import Metrics
+    >>> metrics = Metrics(species='human')
+    >>> df = pd.read_csv(tcrconvert.get_example_path('tenx.csv'))
+    >>> out = tcrconvert.convert_gene(df, 'tenx', 'imgt', verbose=False, metrics=metrics)
+    >>> metrics.value('tcrconvert_rows')
+    4
+    """
+
+    def __init__(self, **labels):
+        self.labels = labels
+        self.samples = {}
+        self.unmapped = set()
+
+    def _key(self, name, labels):
+        if name not in FAMILIES:
+            raise KeyError(f'Unknown metric: {name}')
+        return name, tuple(sorted({**self.labels, **labels}.items()))
+
+    def inc(self, name, value=1, **labels):
+        """Add to a metric
+
+        :param name: Metric family name, from ``FAMILIES``
+        :type name: str
+        :param value: Amount to add, defaults to ``1``
+        :type value: int or float, optional
+        :param labels: Sample labels
+        :type labels: str
+        :return: None
+        """
+
+        key = self._key(name, labels)
+        self.samples[key] = self.samples.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Set a metric
+
+        :param name: Metric family name, from ``FAMILIES``
+        :type name: str
+        :param value: New value
+        :type value: int or float
+        :param labels: Sample labels
+        :type labels: str
+        :return: None
+        """
+
+        self.samples[self._key(name, labels)] = value
+
+    def value(self, name, **labels):
+        """Get the current value of a metric
+
+        :param name: Metric family name, from ``FAMILIES``
+        :type name: str
+        :param labels: Sample labels
+        :type labels: str
+        :return: Current value, or ``None`` if it was never recorded
+        :rtype: int or float or None
+        """
+
+        return self.samples.get(self._key(name, labels))
+
+    def add_unmapped(self, genes):
+        """Record gene names that could not be converted
+
+        :param genes: Unmapped gene names
+        :type genes: iterable of str
+        :return: None
+        """
+
+        self.unmapped.update(genes)
+        self.set('tcrconvert_unmapped_genes', len(self.unmapped))
+
+    def merge(self, other):
+        """Add the samples of another job's metrics to these
+
+        Samples are added up, except ``tcrconvert_skipped_columns``, which is
+        set, and ``tcrconvert_unmapped_genes``, which counts the unmapped
+        genes of both.
+
+        :param other: Metrics to add
+        :type other: Metrics
+        :return: None
+        """
+
+        for (name, labels), value in other.samples.items():
+            if name == 'tcrconvert_skipped_columns':
+                self.set(name, value, **dict(labels))
+            elif name != 'tcrconvert_unmapped_genes':
+                self.inc(name, value, **dict(labels))
+            else:
+                self.add_unmapped(other.unmapped)
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage of the job, adding to ``tcrconvert_stage_seconds``
+
+        :param name: Stage name, such as ``'read'``
+        :type name: str
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.inc(
+                'tcrconvert_stage_seconds', time.perf_counter() - start, stage=name
+            )
+
+    def render(self):
+        """Format every metric as OpenMetrics text
+
+        :return: Exposition text, ending with ``# EOF``
+        :rtype: str
+        """
+
+        lines = []
+        for name, (kind, unit, help_text) in FAMILIES.items():
+            samples = [(k[1], v) for k, v in self.samples.items() if k[0] == name]
+            if not samples:
+                continue
+            lines.append(f'# TYPE {name} {kind}')
+            if unit:
+                lines.append(f'# UNIT {name} {unit}')
+            lines.append(f'# HELP {name} {help_text}')
+            suffix = '_total' if kind == 'counter' else ''
+            for labels, value in sorted(samples):
+                lines.append(
+                    f'{name}{suffix}{_format_labels(labels)} {_format_value(value)}'
+                )
+        lines.append('# EOF')
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Write the metrics to a file atomically
+
+        The text is written to a temporary file in the same folder and then
+        renamed over ``path``, so a collector never reads a partial file.
+
+        :param path: Output file, usually ending in ``.prom``
+        :type path: str
+        :return: None
+        """
+
+        folder = os.path.dirname(os.path.abspath(path))
+        tmp = os.path.join(folder, f'.{os.path.basename(path)}.tmp-{uuid.uuid4().hex}')
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(self.render())
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+def stage(metrics, name):
+    """Time a stage if ``metrics`` is given
+
+    :param metrics: Metrics to record to, or ``None``
+    :type metrics: Metrics or None
+    :param name: Stage name
+    :type name: str
+    :return: Context manager
+    """
+
+    if metrics is None:
+        return nullcontext()
+    return metrics.stage(name)
+
+
+@contextmanager
+def record_metrics(path, **labels):
+    """Collect metrics for a job and write them when it ends
+
+    Yields ``None`` if ``path`` is ``None``. Otherwise yields a new
+    ``Metrics`` and writes it to ``path`` when the block exits, including
+    ``tcrconvert_last_run_success``, which is ``0`` if the block raised.
+
+    :param path: Metrics file, or ``None``
+    :type path: str or None
+    :param labels: Labels added to every sample
+    :type labels: str
+    """
+
+    if path is None:
+        yield None
+        return
+
+    metrics = Metrics(**labels)
+    start = time.perf_counter()
+    success = False
+    try:
+        yield metrics
+        success = True
+    finally:
+        metrics.set('tcrconvert_run_seconds', time.perf_counter() - start)
+        metrics.set('tcrconvert_last_run_success', int(success))
+        metrics.set('tcrconvert_last_run_timestamp_seconds', round(time.time(), 3))
+        metrics.write(path)
+
+
+def _format_labels(labels):
+    """Format sample labels, escaping their values"""
+
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in labels:
+        value = (
+            str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        )
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value):
+    """Format a sample value"""
+
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(int(value))
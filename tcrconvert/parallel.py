@@ -0,0 +1,128 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Below this many rows a process pool costs more than it saves
+MIN_PARALLEL_ROWS = 200_000
+
+# Gene name mapping held by each worker process
+_mapping = None
+
+
+def resolve_jobs(n_jobs):
+    """Turn an ``n_jobs`` argument into a number of processes
+
+    :param n_jobs: Number of processes. ``None`` or ``1`` means no parallelism; ``-1`` means one per CPU.
+    :type n_jobs: int or None
+    :return: Number of processes, at least 1
+    :rtype: int
+    """
+
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return max(1, n_jobs)
+
+
+def use_parallel(n_rows, n_jobs, min_rows=None):
+    """Decide whether a conversion should run in parallel
+
+    :param n_rows: Number of input rows
+    :type n_rows: int
+    :param n_jobs: Requested number of processes
+    :type n_jobs: int or None
+    :param min_rows: Smallest input worth parallelising, defaults to ``MIN_PARALLEL_ROWS``
+    :type min_rows: int, optional
+    :return: Number of processes to use, at most one per CPU; 1 means convert in this process
+    :rtype: int
+    """
+
+    if min_rows is None:
+        min_rows = MIN_PARALLEL_ROWS
+    # More processes than CPUs only add start-up and transfer costs
+    jobs = min(resolve_jobs(n_jobs), os.cpu_count() or 1)
+    if jobs == 1 or n_rows < min_rows:
+        return 1
+    return jobs
+
+
+def _init_worker(mapping):
+    global _mapping
+    _mapping = mapping
+
+
+def _map_partition(columns):
+    """Map one row partition of every column in a worker process
+
+    Returns integer codes into a small array of converted names rather than
+    the converted names themselves, so little has to be sent back.
+    """
+
+    out = {}
+    for col, values in columns.items():
+        codes, uniques = pd.factorize(values)
+        mapped = [_mapping.get(g, np.nan) for g in uniques] + [np.nan]
+        unmapped = [i for i, g in enumerate(mapped[:-1]) if pd.isna(g)]
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        out[col] = (
+            codes.astype(np.int32),
+            mapped,
+            int(counts[unmapped].sum()),
+            [uniques[i] for i in unmapped],
+        )
+    return out
+
+
+def map_columns_parallel(df, cols, mapping, n_jobs):
+    """Map object gene columns over row partitions in worker processes
+
+    The rows are split into one contiguous partition per process. Every
+    worker receives the mapping once, converts its partitions, and the
+    results are put back together in the original row order. The counts and
+    names of unmapped genes are merged exactly. A mapping from a shared
+    ``Converter`` reaches the workers as the names of its shared memory
+    blocks (see ``Converter.mapping()``).
+
+    :param df: Dataframe containing TCR gene names
+    :type df: DataFrame
+    :param cols: Object dtype columns of ``df`` to map
+    :type cols: list of str
+    :param mapping: Output gene names keyed by input gene name, as returned by ``convert.lookup_mapping()`` or ``Converter.mapping()``
+    :type mapping: dict
+    :param n_jobs: Number of processes
+    :type n_jobs: int
+    :return: For each column, the converted gene names, the number of
+        non-missing rows that could not be mapped and those unmapped gene
+        names, as from ``convert.map_genes()``
+    :rtype: dict of tuple
+    """
+
+    bounds = np.linspace(0, len(df), n_jobs + 1).astype(int)
+    values = {col: df[col].to_numpy(dtype=object) for col in cols}
+    partitions = [
+        {col: arr[start:stop] for col, arr in values.items()}
+        for start, stop in zip(bounds[:-1], bounds[1:])
+    ]
+
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(
+        n_jobs, mp_context=ctx, initializer=_init_worker, initargs=(mapping,)
+    ) as pool:
+        parts = list(pool.map(_map_partition, partitions))
+
+    results = {}
+    for col in cols:
+        pieces = []
+        n_bad = 0
+        bad_genes = set()
+        for part in parts:
+            codes, mapped, part_bad, part_genes = part[col]
+            pieces.append(np.array(mapped, dtype=object)[codes])
+            n_bad += part_bad
+            bad_genes.update(part_genes)
+        results[col] = (np.concatenate(pieces), n_bad, sorted(bad_genes))
+
+    return results
@@ -0,0 +1,221 @@
+import os
+import time
+from importlib.resources import files
+import pandas as pd
+import click
+import platformdirs
+
+from .build_lookup import LOOKUP_NAMES, read_manifest
+from .utils import file_lock, lookup_lock_path
+
+# Input formats each lookup table can convert from
+TABLE_FORMATS = {
+    'lookup.csv': ['imgt'],
+    'lookup_from_tenx.csv': ['tenx'],
+    'lookup_from_adaptive.csv': ['adaptive', 'adaptivev2'],
+}
+
+# Scanned registries keyed by (bundled folder, user folder)
+_registries = {}
+
+
+def lookup_dirs():
+    """Get the folders that hold lookup tables
+
+    :return: The bundled data folder and the user data folder used by ``build_lookup_from_fastas()``
+    :rtype: tuple of (str, str)
+    """
+
+    bundled = os.path.join(files('tcrconvert'), 'data')
+    user = platformdirs.user_data_dir('tcrconvert', 'Emmma Bishop')
+    return bundled, user
+
+
+def _count_rows(path):
+    """Count the data rows of a CSV file"""
+
+    with open(path, 'rb') as f:
+        return sum(1 for _ in f) - 1
+
+
+def _describe(species, source, path):
+    """Collect metadata for one species folder, or ``None`` if it has no tables"""
+
+    tables = [name for name in LOOKUP_NAMES if os.path.isfile(os.path.join(path, name))]
+    if not tables:
+        return None
+
+    manifest = read_manifest(path) or {}
+    counts = manifest.get('gene_counts', {})
+    built = manifest.get('built')
+    if built is None:
+        mtime = max(os.path.getmtime(os.path.join(path, name)) for name in tables)
+        built = time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime(mtime))
+
+    info = {'species': species, 'source': source, 'path': path, 'built': built}
+    for name, col in zip(LOOKUP_NAMES, ['imgt', 'tenx', 'adaptive']):
+        if name not in tables:
+            info[col] = None
+        elif name in counts:
+            info[col] = counts[name]
+        else:
+            info[col] = _count_rows(os.path.join(path, name))
+    info['formats'] = [fmt for name in tables for fmt in TABLE_FORMATS[name]]
+    info['tables'] = tables
+
+    return info
+
+
+def scan():
+    """Scan the bundled and user data folders for lookup tables
+
+    Every subfolder containing at least one lookup table is a species. A
+    bundled species takes precedence over a user-built one of the same name.
+
+    :return: Species metadata keyed by species name
+    :rtype: dict of dict
+    """
+
+    bundled, user = lookup_dirs()
+    registry = {}
+    for source, root in [('user', user), ('bundled', bundled)]:
+        if not os.path.isdir(root):
+            continue
+        for name in sorted(os.listdir(root)):
+            path = os.path.join(root, name)
+            if name.startswith('.') or not os.path.isdir(path):
+                continue
+            info = _describe(name, source, path)
+            if info:
+                registry[name] = info
+
+    return dict(sorted(registry.items()))
+
+
+def get_registry():
+    """Get the cached species registry, scanning on first use
+
+    :return: Species metadata keyed by species name
+    :rtype: dict of dict
+    """
+
+    key = lookup_dirs()
+    # refresh() may clear the cache from another thread at any point
+    registry = _registries.get(key)
+    if registry is None:
+        registry = scan()
+        _registries[key] = registry
+    return registry
+
+
+def refresh():
+    """Forget cached species metadata
+
+    The next lookup rescans the data folders. Called automatically after
+    ``build_lookup_from_fastas()`` finishes in this process.
+
+    :return: None
+    """
+
+    _registries.clear()
+
+
+def get_species(species):
+    """Get metadata for one species
+
+    If the species is not in the cached registry (for example because it was
+    built by another process), the registry is rescanned once. If it is
+    still missing while its lookup folder is locked, as it is during a
+    rebuild's folder swap, the lock is waited for and the registry is
+    rescanned again.
+
+    :param species: Species name
+    :type species: str
+    :return: Species metadata, or ``None`` if the species has no lookup tables
+    :rtype: dict or None
+    """
+
+    info = get_registry().get(species)
+    if info is None:
+        refresh()
+        info = get_registry().get(species)
+    if info is None:
+        info = _wait_for_swap(species)
+    return info
+
+
+def _wait_for_swap(species):
+    """Wait out a swap of a species' lookup folder and rescan for it"""
+
+    for root in lookup_dirs():
+        lock_f = lookup_lock_path(os.path.join(root, species))
+        if not os.path.exists(lock_f):
+            continue
+        with file_lock(lock_f):
+            refresh()
+            info = get_registry().get(species)
+        if info is not None:
+            return info
+    return None
+
+
+def list_species(refresh_cache=False):
+    """List the species with lookup tables
+
+    :param refresh_cache: Rescan the data folders first, defaults to ``False``
+    :type refresh_cache: bool, optional
+    :return: One row per species with its ``source`` (``'bundled'`` or
+        ``'user'``), ``path``, ``built`` time, row counts of each lookup table
+        (``imgt``, ``tenx``, ``adaptive``) and the input ``formats`` it supports
+    :rtype: DataFrame
+
+    :Example:
+
+    >>> import tcrconvert
+    >>> tcrconvert.list_species()[['species', 'source', 'imgt', 'tenx', 'adaptive']] # doctest: +SKIP
+      species   source  imgt  tenx  adaptive
+    0   human  bundled   457   250      1068
+    1   mouse  bundled   556   273      1156
+    2  rhesus  bundled   376   256       914
+    """
+
+    if refresh_cache:
+        refresh()
+
+    rows = [
+        {k: v for k, v in info.items() if k != 'tables'}
+        for info in get_registry().values()
+    ]
+    out = pd.DataFrame(
+        rows,
+        columns=[
+            'species',
+            'source',
+            'path',
+            'built',
+            'imgt',
+            'tenx',
+            'adaptive',
+            'formats',
+        ],
+    )
+    for col in ['imgt', 'tenx', 'adaptive']:
+        out[col] = out[col].astype('Int64')
+
+    return out
+
+
+# Command-line version of list_species()
+@click.command(name='species')
+def list_species_cli():
+    """List species with lookup tables
+    :Example:
+
+    .. code-block:: bash
+
+       $ tcrconvert species
+    """
+
+    out = list_species(refresh_cache=True)
+    out['formats'] = out['formats'].str.join(',')
+    click.echo(out.drop(columns='path').to_string(index=False))
@@ -0,0 +1,262 @@
+import os
+import re
+import pandas as pd
+
+from . import registry
+from .build_lookup import TENX_RENAMES, imgt_to_adaptive, imgt_to_tenx
+from .convert import logger, read_lookup
+
+# Well-formed gene names in each format
+IMGT_RE = re.compile(r'TR[ABDG][VDJC][0-9A-Z/-]*\*\d{2}')
+TENX_RE = re.compile(r'TR[ABDG][VDJC][0-9A-Z/-]*')
+ADAPTIVE_RE = re.compile(
+    r'TCR([ABDG][VDJC])(\d+)([A-Z]?)(?:-(\d+)([A-Z]?))?(-or09_02)?(\*\d{2})?'
+)
+
+# Resolvers keyed by (species folder, build time)
+_resolvers = {}
+
+
+class Resolver:
+    """Convert genes missing from the lookup tables with the naming rules
+
+    The lookup tables are built by applying ``build_lookup.imgt_to_tenx()``
+    and ``build_lookup.imgt_to_adaptive()`` to every gene in the IMGT
+    reference, so a gene named after the tables were built (a new allele or
+    gene) is unmapped. A ``Resolver`` applies the same rules at conversion
+    time: 10X and Adaptive names are first turned back into an IMGT name,
+    then the rules give the output name.
+
+    A derived IMGT name is only used if the rules turn it back into exactly
+    the input name. When that leaves more than one candidate, the genes
+    already in the species' lookup table decide (for example whether
+    ``TCRBV02-01`` is ``TRBV2-1`` or ``TRBV2``), and otherwise the gene
+    stays unmapped. Like the tables, ``*01`` is used where the input has no
+    allele. Results are memoized.
+
+    :param lookup: The species' IMGT lookup table (``lookup.csv``), as returned by ``convert.read_lookup()``
+    :type lookup: DataFrame
+    :param from_adaptive: The species' Adaptive lookup table (``lookup_from_adaptive.csv``), to
+        find the IMGT gene of a new allele of a known Adaptive gene the same way the table does
+    :type from_adaptive: DataFrame, optional
+
+    :Example:
+
+    >>> from tcrconvert.resolve import get_resolver
+    >>> resolver = get_resolver('human')
+    >>> resolver.resolve('TRBV30*07', 'imgt', 'adaptive')
+    'TCRBV30-01*07'
+    >>> resolver.resolve('TCRBV30-01*07', 'adaptive', 'imgt')
+    'TRBV30*07'
+    """
+
+    def __init__(self, lookup, from_adaptive=None):
+        self.numbered = set()
+        self.unnumbered = set()
+        for gene in lookup['imgt'].dropna():
+            subgroup, dash, _ = gene[:-3].split('/')[0].partition('-')
+            (self.numbered if dash else self.unnumbered).add(subgroup)
+
+        # Adaptive gene names without allele and their IMGT genes
+        if from_adaptive is None:
+            pairs = [(imgt_to_adaptive(g), g) for g in lookup['imgt'].dropna()]
+        else:
+            pairs = list(zip(from_adaptive['adaptive'], from_adaptive['imgt']))
+        self.adaptive_genes = {
+            name: imgt[:-3] for name, imgt in pairs if '*' not in name
+        }
+        for name, imgt in pairs:
+            if '*' in name:
+                self.adaptive_genes.setdefault(name[:-3], imgt[:-3])
+        self._memo = {}
+
+    def resolve(self, gene, frm, to):
+        """Convert one gene name with the naming rules
+
+        :param gene: Gene name
+        :type gene: str
+        :param frm: Input format ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+        :type frm: str
+        :param to: Output format ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+        :type to: str
+        :return: Converted gene name, ``'NoData'`` for C genes converted to
+            Adaptive, or ``None`` if the rules do not give one name
+        :rtype: str or None
+        """
+
+        key = (gene, frm, to)
+        if key not in self._memo:
+            self._memo[key] = self._resolve(gene, frm, to)
+        return self._memo[key]
+
+    def _resolve(self, gene, frm, to):
+        if frm == 'imgt':
+            imgt = gene if IMGT_RE.fullmatch(gene) else None
+        elif frm == 'tenx':
+            imgt = self._tenx_to_imgt(gene)
+        else:
+            imgt = self._adaptive_to_imgt(gene)
+
+        if imgt is None:
+            return None
+        if to == 'imgt':
+            return imgt
+        if to == 'tenx':
+            return imgt_to_tenx(imgt)
+        if frm == 'adaptive' or frm == 'adaptivev2':
+            # Both Adaptive formats use the same names
+            return gene
+        return imgt_to_adaptive(imgt)
+
+    def _tenx_to_imgt(self, gene):
+        if not TENX_RE.fullmatch(gene):
+            return None
+        imgt = gene
+        for old, tenx in reversed(TENX_RENAMES):
+            imgt = imgt.replace(tenx, old)
+        imgt += '*01'
+        return imgt if imgt_to_tenx(imgt) == gene else None
+
+    def _adaptive_to_imgt(self, gene):
+        m = ADAPTIVE_RE.fullmatch(gene)
+        if m is None:
+            return None
+        chain, subgroup, sub_letter, number, letter, orphon, allele = m.groups()
+        name = gene[:-3] if allele else gene
+        allele = allele or '*01'
+        if name in self.adaptive_genes:
+            return self.adaptive_genes[name] + allele
+
+        subgroup = f'TR{chain}{int(subgroup)}{sub_letter}'
+        if orphon:
+            candidates = [] if number else [f'{subgroup}/OR9-2']
+        elif number is None:
+            # A subgroup alone does not say which gene
+            candidates = []
+        else:
+            candidates = [f'{subgroup}-{int(number)}{letter}']
+            if int(number) == 1 and not letter:
+                # Gene-level "01" may have been added by add_dash_one()
+                candidates.append(subgroup)
+        candidates = [c for c in candidates if imgt_to_adaptive(c + '*01')[:-3] == name]
+        if len(candidates) == 2:
+            if subgroup in self.numbered and subgroup not in self.unnumbered:
+                candidates = candidates[:1]
+            elif subgroup in self.unnumbered and subgroup not in self.numbered:
+                candidates = candidates[1:]
+        if len(candidates) != 1:
+            return None
+        return candidates[0] + allele
+
+
+def get_resolver(species='human'):
+    """Get the resolver of a species, loading it once per process
+
+    :param species: Species name, defaults to ``'human'``
+    :type species: str, optional
+    :return: Resolver, or ``None`` if the species has no IMGT lookup table
+    :rtype: Resolver or None
+    """
+
+    info = registry.get_species(species)
+    if info is None or 'lookup.csv' not in info['tables']:
+        return None
+    key = (info['path'], info['built'])
+    if key not in _resolvers:
+        lookup = read_lookup(os.path.join(info['path'], 'lookup.csv'))
+        from_adaptive = None
+        if 'lookup_from_adaptive.csv' in info['tables']:
+            from_adaptive = read_lookup(
+                os.path.join(info['path'], 'lookup_from_adaptive.csv')
+            )
+        _resolvers[key] = Resolver(lookup, from_adaptive)
+    return _resolvers[key]
+
+
+def resolve_misses(values, mapping, frm, to, species='human', multi_sep=None):
+    """Convert the genes of some columns that are missing from a mapping
+
+    Each distinct value not in ``mapping`` is passed to the species'
+    ``Resolver`` once. With ``multi_sep`` the calls within multi-valued
+    cells are resolved too.
+
+    :param values: Gene columns
+    :type values: list of Series
+    :param mapping: Output gene names keyed by input gene name, as returned by ``convert.lookup_mapping()``
+    :type mapping: dict
+    :param frm: Input format ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type frm: str
+    :param to: Output format ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type to: str
+    :param species: Species name. Defaults to ``'human'``.
+    :type species: str, optional
+    :param multi_sep: Characters that separate calls within a cell, see ``convert.convert_gene()``
+    :type multi_sep: str, optional
+    :return: Rule-derived output gene names keyed by input gene name
+    :rtype: dict
+    """
+
+    resolver = get_resolver(species)
+    if resolver is None:
+        return {}
+
+    misses = set()
+    for genes in values:
+        for gene in pd.unique(genes.dropna()):
+            if not isinstance(gene, str) or gene in mapping:
+                continue
+            misses.add(gene)
+            if multi_sep:
+                calls = re.split(f'[{re.escape(multi_sep)}]', gene)
+                misses.update(c for c in calls if c and c not in mapping)
+
+    derived = {}
+    for gene in misses:
+        out = resolver.resolve(gene, frm, to)
+        if out is not None:
+            derived[gene] = out
+    return derived
+
+
+def warn_rule_derived(genes, species=None):
+    """Warn about genes converted with the naming rules rather than the lookup tables"""
+
+    if genes:
+        where = f' for {species}' if species else ''
+        logger.warning(
+            f'These genes are not in the lookup tables{where} and were converted with the naming rules: {sorted(genes)}'
+        )
+
+
+def add_rule_derived(
+    df, cols, mapping, frm, to, species='human', metrics=None, multi_sep=None
+):
+    """Extend a mapping with rule-derived conversions of a data frame's unmapped genes
+
+    :param df: Dataframe containing TCR gene names
+    :type df: DataFrame
+    :param cols: Gene columns
+    :type cols: list of str
+    :param mapping: Output gene names keyed by input gene name
+    :type mapping: dict
+    :param frm: Input format ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type frm: str
+    :param to: Output format ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type to: str
+    :param species: Species name. Defaults to ``'human'``.
+    :type species: str, optional
+    :param metrics: Metrics to record the number of rule-derived genes to
+    :type metrics: tcrconvert.metrics.Metrics, optional
+    :param multi_sep: Characters that separate calls within a cell
+    :type multi_sep: str, optional
+    :return: ``mapping`` with the rule-derived genes added, and those genes
+    :rtype: tuple of (dict, list of str)
+    """
+
+    values = [df[col] for col in cols if col in df.columns]
+    derived = resolve_misses(values, mapping, frm, to, species, multi_sep)
+    if metrics is not None:
+        metrics.inc('tcrconvert_rule_derived_genes', len(derived))
+    if not derived:
+        return mapping, []
+    return {**mapping, **derived}, sorted(derived)
@@ -0,0 +1,315 @@
+import io
+import os
+import uuid
+import shutil
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from itertools import pairwise
+except ImportError:  # Python 3.9
+
+    def pairwise(iterable):
+        a, b = itertools.tee(iterable)
+        next(b, None)
+        return zip(a, b)
+
+
+from . import parallel, stream
+
+# Below this many bytes a process pool costs more than it saves
+MIN_SHARD_BYTES = 64 * 1024**2
+
+# Bytes read at a time
+CHUNK_SIZE = 1 << 20
+
+
+def use_shards(size, n_jobs, min_bytes=None):
+    """Decide whether a file should be split across processes
+
+    :param size: File size in bytes
+    :type size: int
+    :param n_jobs: Requested number of processes, see ``parallel.resolve_jobs()``
+    :type n_jobs: int or None
+    :param min_bytes: Smallest file worth splitting, defaults to ``MIN_SHARD_BYTES``
+    :type min_bytes: int, optional
+    :return: Number of processes to use; 1 means convert in this process
+    :rtype: int
+    """
+
+    if min_bytes is None:
+        min_bytes = MIN_SHARD_BYTES
+    jobs = parallel.resolve_jobs(n_jobs)
+    if jobs == 1 or size < min_bytes:
+        return 1
+    return jobs
+
+
+def new_pool(n_jobs, initializer=None, initargs=()):
+    """Start a pool of ``n_jobs`` worker processes, each first running ``initializer(*initargs)``"""
+
+    return ProcessPoolExecutor(
+        n_jobs,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=initializer,
+        initargs=initargs,
+    )
+
+
+def count_quotes(path, start, end):
+    """Count the ``"`` bytes in a byte range of a file
+
+    :param path: Path to a file
+    :type path: str
+    :param start: First byte
+    :type start: int
+    :param end: End of the range (exclusive)
+    :type end: int
+    :return: Number of quote characters
+    :rtype: int
+    """
+
+    n = 0
+    with open(path, 'rb') as f:
+        f.seek(start)
+        left = end - start
+        while left > 0:
+            chunk = f.read(min(CHUNK_SIZE, left))
+            if not chunk:
+                break
+            n += chunk.count(b'"')
+            left -= len(chunk)
+    return n
+
+
+def record_start(path, offset, odd):
+    """Find the first record boundary at or after a byte offset
+
+    A line break ends a record if the number of quotes before it is even,
+    the same rule ``stream.iter_records()`` uses to join lines.
+
+    :param path: Path to a file
+    :type path: str
+    :param offset: Byte offset, at least 1
+    :type offset: int
+    :param odd: Whether the number of quotes before ``offset`` is odd
+    :type odd: bool
+    :return: Offset of the first byte of the next record, or the file size if there is none
+    :rtype: int
+    """
+
+    with open(path, 'rb') as f:
+        f.seek(offset - 1)
+        if f.read(1) == b'\n' and not odd:
+            return offset
+        pos = offset
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return pos
+            i = 0
+            while True:
+                j = chunk.find(b'\n', i)
+                if j == -1:
+                    odd ^= chunk.count(b'"', i) % 2 == 1
+                    break
+                odd ^= chunk.count(b'"', i, j) % 2 == 1
+                if not odd:
+                    return pos + j + 1
+                i = j + 1
+            pos += len(chunk)
+
+
+def plan_shards(path, start, n_shards, pool=None):
+    """Split the records of a file into byte ranges
+
+    The data is cut into ``n_shards`` ranges of about the same size, each
+    moved forward to the next record boundary. Quotes are counted from the
+    start of the file (in parallel with ``pool``), so a line break inside a
+    quoted field is never taken for the end of a record: every range holds
+    exactly the records ``stream.iter_records()`` would read from it.
+
+    :param path: Path to a delimited text file
+    :type path: str
+    :param start: Offset of the first data record, just past the header
+    :type start: int
+    :param n_shards: Number of ranges to aim for
+    :type n_shards: int
+    :param pool: Process pool to count quotes with
+    :type pool: concurrent.futures.Executor, optional
+    :return: ``(start, end)`` offsets of each non-empty range, in file order
+    :rtype: list of tuple
+    """
+
+    size = os.path.getsize(path)
+    cuts = [start + (size - start) * k // n_shards for k in range(1, n_shards)]
+    cuts = [c for c in cuts if c > start]
+    edges = [0] + cuts + [size]
+    pieces = list(pairwise(edges))
+    if pool is None:
+        counts = [count_quotes(path, a, b) for a, b in pieces]
+    else:
+        counts = list(pool.map(count_quotes, [path] * len(pieces), *zip(*pieces)))
+
+    bounds = [start]
+    quotes = 0
+    for cut, n in zip(cuts, counts):
+        quotes += n
+        bound = record_start(path, cut, quotes % 2 == 1)
+        if bound > bounds[-1]:
+            bounds.append(bound)
+    if size > bounds[-1]:
+        bounds.append(size)
+
+    return list(pairwise(bounds))
+
+
+class _ByteRange(io.RawIOBase):
+    """Read-only view of a byte range of a file"""
+
+    def __init__(self, path, start, end):
+        self._f = open(path, 'rb')  # noqa: SIM115 - closed by close()
+        try:
+            self._f.seek(start)
+        except BaseException:
+            self._f.close()
+            raise
+        self._left = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = min(len(b), self._left)
+        if n <= 0:
+            return 0
+        data = self._f.read(n)
+        b[: len(data)] = data
+        self._left -= len(data)
+        return len(data)
+
+    def close(self):
+        self._f.close()
+        super().close()
+
+
+def open_range(path, start, end):
+    """Open a byte range of a file as text, like ``convert._open_text()``
+
+    :param path: Path to a file
+    :type path: str
+    :param start: First byte
+    :type start: int
+    :param end: End of the range (exclusive)
+    :type end: int
+    :return: Text file object
+    :rtype: io.TextIOWrapper
+    """
+
+    raw = _ByteRange(path, start, end)
+    try:
+        return io.TextIOWrapper(
+            io.BufferedReader(raw, CHUNK_SIZE),
+            encoding='utf-8',
+            errors='surrogateescape',
+            newline='',
+        )
+    except BaseException:
+        raw.close()
+        raise
+
+
+def _open_output(path):
+    """Open a file for writing text, like ``convert._open_text(path, 'w')``"""
+
+    return open(path, 'w', encoding='utf-8', errors='surrogateescape', newline='')
+
+
+def splice_range(path, start, end, sep, mappings, output):
+    """Rewrite the gene fields of the records in a byte range
+
+    Runs ``stream.splice_records()`` on one range from ``plan_shards()`` in
+    a worker process.
+
+    :param path: Input file
+    :type path: str
+    :param start: First byte of the range
+    :type start: int
+    :param end: End of the range (exclusive)
+    :type end: int
+    :param sep: Field delimiter
+    :type sep: str
+    :param mappings: Output gene names keyed by input gene name, for each field position to rewrite
+    :type mappings: dict of dict
+    :param output: File to write the rewritten records to
+    :type output: str
+    :return: Per-position counts, as from ``stream.new_stats()``
+    :rtype: dict of dict
+    """
+
+    stats = {pos: stream.new_stats() for pos in mappings}
+    with open_range(path, start, end) as f, _open_output(output) as out:
+        out.writelines(
+            stream.splice_records(stream.iter_records(f), sep, mappings, stats)
+        )
+    return stats
+
+
+def splice_shards(path, output, header, sep, mappings, ranges, pool):
+    """Rewrite a file one byte range per task and put the pieces back together
+
+    Every range from ``plan_shards()`` is written to its own temporary file
+    next to ``output``, then ``header`` and the pieces are copied into
+    ``output`` in file order, so the result is the same as rewriting the
+    file in one pass. The counts of every range are merged.
+
+    :param path: Input file
+    :type path: str
+    :param output: Output file
+    :type output: str
+    :param header: Raw header record to write first
+    :type header: str
+    :param sep: Field delimiter
+    :type sep: str
+    :param mappings: Output gene names keyed by input gene name, for each field position to rewrite
+    :type mappings: dict of dict
+    :param ranges: Byte ranges of the data records
+    :type ranges: list of tuple
+    :param pool: Process pool
+    :type pool: concurrent.futures.Executor
+    :return: Per-position counts, as from ``stream.new_stats()``
+    :rtype: dict of dict
+    """
+
+    folder, name = os.path.split(os.path.abspath(output))
+    tag = uuid.uuid4().hex
+    parts = [
+        os.path.join(folder, f'.{name}.shard-{i}-{tag}') for i in range(len(ranges))
+    ]
+
+    try:
+        futures = [
+            pool.submit(splice_range, path, a, b, sep, mappings, part)
+            for (a, b), part in zip(ranges, parts)
+        ]
+        results = [future.result() for future in futures]
+
+        with _open_output(output) as out:
+            out.write(header if header.endswith(('\n', '\r')) else header + '\n')
+            out.flush()
+            for part in parts:
+                with open(part, 'rb') as f:
+                    shutil.copyfileobj(f, out.buffer, CHUNK_SIZE)
+    finally:
+        for part in parts:
+            if os.path.exists(part):
+                os.remove(part)
+
+    stats = {pos: stream.new_stats() for pos in mappings}
+    for result in results:
+        for pos, st in result.items():
+            stats[pos]['rows'] += st['rows']
+            stats[pos]['bad'] += st['bad']
+            stats[pos]['bad_genes'] |= st['bad_genes']
+    return stats
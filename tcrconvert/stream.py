@@ -0,0 +1,266 @@
+import math
+
+# Strings pandas.read_csv() reads as missing by default
+NA_VALUES = frozenset(
+    [
+        '',
+        '#N/A',
+        '#N/A N/A',
+        '#NA',
+        '-1.#IND',
+        '-1.#QNAN',
+        '-NaN',
+        '-nan',
+        '1.#IND',
+        '1.#QNAN',
+        '<NA>',
+        'N/A',
+        'NA',
+        'NULL',
+        'NaN',
+        'None',
+        'n/a',
+        'nan',
+        'null',
+    ]
+)
+
+
+def iter_records(f):
+    """Iterate over the raw records of a delimited text file
+
+    A record is usually one line, but a quoted field may contain line breaks,
+    in which case lines are joined until the quotes balance. Records are
+    returned exactly as read, including their line terminator.
+
+    :param f: File opened in text mode with ``newline=''``
+    :type f: file object
+    :return: Raw records
+    :rtype: iterator of str
+
+    :Example:
+
+    >>> import io
+    >>> import tcrconvert
+    >>> f = io.StringIO('a,b\\n"x\\ny",z\\n')
+    >>> list(tcrconvert.stream.iter_records(f))
+    ['a,b\\n', '"x\\ny",z\\n']
+    """
+
+    pending = None
+    for line in f:
+        if pending is not None:
+            pending += line
+            if pending.count('"') % 2 == 0:
+                yield pending
+                pending = None
+        elif line.count('"') % 2:
+            pending = line
+        else:
+            yield line
+    if pending is not None:
+        yield pending
+
+
+def split_terminator(record):
+    """Split a record into its body and line terminator
+
+    :param record: Raw record
+    :type record: str
+    :return: Record without its terminator, and the terminator (may be empty)
+    :rtype: tuple of (str, str)
+    """
+
+    if record.endswith('\r\n'):
+        return record[:-2], '\r\n'
+    if record.endswith(('\n', '\r')):
+        return record[:-1], record[-1]
+    return record, ''
+
+
+def field_spans(body, sep):
+    """Find where each field of a record starts and ends
+
+    Follows RFC 4180 quoting: a field starting with ``"`` runs to the next
+    unpaired ``"``, and ``""`` inside it stands for one quote. Spans include
+    any surrounding quotes.
+
+    :param body: Record without its line terminator
+    :type body: str
+    :param sep: Field delimiter
+    :type sep: str
+    :return: ``(start, end)`` offsets of each field
+    :rtype: list of tuple
+
+    :Example:
+
+    >>> import tcrconvert
+    >>> tcrconvert.stream.field_spans('a,"b,""c",d', ',')
+    [(0, 1), (2, 9), (10, 11)]
+    """
+
+    if '"' not in body:
+        spans = []
+        start = 0
+        for field in body.split(sep):
+            spans.append((start, start + len(field)))
+            start += len(field) + 1
+        return spans
+
+    spans = []
+    start = 0
+    n = len(body)
+    while True:
+        if start < n and body[start] == '"':
+            i = start + 1
+            while i < n:
+                if body[i] == '"':
+                    if i + 1 < n and body[i + 1] == '"':
+                        i += 2
+                        continue
+                    break
+                i += 1
+            end = body.find(sep, i)
+        else:
+            end = body.find(sep, start)
+        if end == -1:
+            spans.append((start, n))
+            return spans
+        spans.append((start, end))
+        start = end + 1
+
+
+def unquote(raw):
+    """Get the value of a raw field
+
+    :param raw: Field as written in the file
+    :type raw: str
+    :return: Field value
+    :rtype: str
+    """
+
+    if raw.startswith('"'):
+        close = raw.rfind('"')
+        if close == 0:
+            close = len(raw)
+        return raw[1:close].replace('""', '"') + raw[close + 1 :]
+    return raw
+
+
+def quote(value, sep):
+    """Quote a value for writing if needed, like ``csv.QUOTE_MINIMAL``
+
+    :param value: Field value
+    :type value: str
+    :param sep: Field delimiter
+    :type sep: str
+    :return: Field as it should be written
+    :rtype: str
+    """
+
+    if sep in value or '"' in value or '\n' in value or '\r' in value:
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def parse_header(record, sep):
+    """Get the column names from a header record
+
+    :param record: Raw header record
+    :type record: str
+    :param sep: Field delimiter
+    :type sep: str
+    :return: Column names
+    :rtype: list of str
+    """
+
+    body, _ = split_terminator(record)
+    return [unquote(body[a:b]) for a, b in field_spans(body, sep)]
+
+
+def splice_records(records, sep, mappings, stats):
+    """Rewrite gene fields in raw records
+
+    Only the fields at the positions in ``mappings`` are parsed and replaced;
+    every other byte of each record is kept as is. Missing values (see
+    ``NA_VALUES``), genes not in the mapping and genes mapping to
+    ``'NoData'`` are written as empty fields. Blank lines are dropped and a
+    line terminator is added to a final record that lacks one, as
+    ``pandas.DataFrame.to_csv()`` would.
+
+    :param records: Raw data records, as from ``iter_records()``
+    :type records: iterable of str
+    :param sep: Field delimiter
+    :type sep: str
+    :param mappings: Output gene names keyed by input gene name, for each field position to rewrite
+    :type mappings: dict of dict
+    :param stats: Per-position counts from ``new_stats()``, updated as records are rewritten
+    :type stats: dict of dict
+    :return: Rewritten records
+    :rtype: iterator of str
+    """
+
+    memo = {pos: {} for pos in mappings}
+
+    for record in records:
+        body, eol = split_terminator(record)
+        if not body:
+            continue
+        if not eol:
+            eol = '\n'
+        for st in stats.values():
+            st['rows'] += 1
+
+        if '"' not in body:
+            fields = body.split(sep)
+            for pos, mapping in mappings.items():
+                if pos < len(fields):
+                    fields[pos] = _convert_field(
+                        fields[pos], mapping, memo[pos], stats[pos]
+                    )
+            yield sep.join(fields) + eol
+        else:
+            spans = field_spans(body, sep)
+            pieces = []
+            last = 0
+            for pos in sorted(mappings):
+                if pos >= len(spans):
+                    break
+                a, b = spans[pos]
+                value = _convert_field(
+                    unquote(body[a:b]), mappings[pos], memo[pos], stats[pos]
+                )
+                pieces += [body[last:a], quote(value, sep)]
+                last = b
+            pieces.append(body[last:])
+            yield ''.join(pieces) + eol
+
+
+def new_stats():
+    """Start per-column conversion counts
+
+    :return: Counts of ``rows``, unmapped non-missing rows (``bad``) and the set of unmapped genes (``bad_genes``)
+    :rtype: dict
+    """
+
+    return {'rows': 0, 'bad': 0, 'bad_genes': set()}
+
+
+def _convert_field(value, mapping, memo, stats):
+    """Convert one gene field, counting unmapped genes"""
+
+    if value in NA_VALUES:
+        return ''
+    out = memo.get(value)
+    if out is None:
+        out = mapping.get(value)
+        if out is None or (isinstance(out, float) and math.isnan(out)):
+            out = False
+        elif out == 'NoData':
+            out = ''
+        memo[value] = out
+    if out is False:
+        stats['bad'] += 1
+        stats['bad_genes'].add(value)
+        return ''
+    return out
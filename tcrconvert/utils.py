@@ -1,3 +1,8 @@
+import os
+import time
+import uuid
+import shutil
+from contextlib import contextmanager
 from importlib.resources import files
 
 
@@ -18,3 +23,113 @@ def get_example_path(file_name):
 
     out = files('tcrconvert').joinpath('examples', file_name)
     return str(out)
+
+
+def lookup_lock_path(species_dir):
+    """Get the lock file guarding a species' lookup table directory
+
+    The lock lives next to (not inside) the species directory so that it
+    survives the directory being swapped out by ``build_lookup_from_fastas()``.
+
+    :param species_dir: Path to a species' lookup table directory
+    :type species_dir: str
+    :return: Path to the lock file
+    :rtype: str
+
+    :Example:
+
+    >>> import tcrconvert
+    >>> tcrconvert.utils.lookup_lock_path('/data/tcrconvert/rabbit')
+    '/data/tcrconvert/.rabbit.lock'
+    """
+
+    parent, name = os.path.split(os.path.normpath(species_dir))
+    return os.path.join(parent, f'.{name}.lock')
+
+
+@contextmanager
+def file_lock(path, poll=0.05):
+    """Hold an exclusive lock on a file
+
+    Uses ``fcntl.flock()`` on POSIX systems and ``msvcrt.locking()`` on
+    Windows, so the lock is respected by other threads and processes,
+    including those on other hosts of a shared filesystem that supports
+    advisory locking. The lock file is created if needed and left in place.
+
+    :param path: Path to the lock file
+    :type path: str
+    :param poll: Seconds between attempts while waiting on Windows, defaults to ``0.05``
+    :type poll: float, optional
+
+    :Example:
+
+    >>> import tempfile
+    >>> import tcrconvert
+    >>> lock_f = os.path.join(tempfile.gettempdir(), '.tcrconvert.lock')
+    >>> with tcrconvert.utils.file_lock(lock_f):
+    ...     pass
+    """
+
+    with open(path, 'a+') as f:
+        if os.name == 'nt':
+            import msvcrt
+
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(poll)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def swap_directory(src, dst, retries=20, poll=0.05):
+    """Replace a directory with another one
+
+    Moves ``dst`` aside, renames ``src`` to ``dst`` and removes the old copy.
+    Both renames happen within one filesystem, so each is atomic; callers
+    should hold the ``lookup_lock_path()`` lock so that readers who find
+    ``dst`` missing can wait for the swap to finish.
+
+    :param src: Fully written directory to move into place
+    :type src: str
+    :param dst: Directory to replace (need not exist)
+    :type dst: str
+    :param retries: Attempts per rename when a file is briefly held open (Windows), defaults to ``20``
+    :type retries: int, optional
+    :param poll: Seconds between attempts, defaults to ``0.05``
+    :type poll: float, optional
+    :return: None
+    """
+
+    def rename(a, b):
+        for attempt in range(retries):
+            try:
+                os.rename(a, b)
+                return
+            except PermissionError:
+                if attempt == retries - 1:
+                    raise
+                time.sleep(poll)
+
+    parent, name = os.path.split(os.path.normpath(dst))
+    old = None
+    if os.path.exists(dst):
+        old = os.path.join(parent, f'.{name}.old-{uuid.uuid4().hex}')
+        rename(dst, old)
+    rename(src, dst)
+    if old:
+        shutil.rmtree(old, ignore_errors=True)
@@ -0,0 +1,536 @@
+import os
+import json
+import time
+import uuid
+import queue
+import signal
+import logging
+import threading
+import click
+import pandas as pd
+
+from .converter import Converter
+from .convert import delimiter, logger
+
+# Ledger file kept in the output folder unless another path is given
+LEDGER_NAME = '.tcrconvert-ledger.jsonl'
+
+
+def file_key(path):
+    """Identify one version of a file
+
+    :param path: Path to a file
+    :type path: str
+    :return: File name, size in bytes and modification time in nanoseconds
+    :rtype: tuple of (str, int, int)
+    """
+
+    st = os.stat(path)
+    return os.path.basename(path), st.st_size, st.st_mtime_ns
+
+
+class Ledger:
+    """Record of the input files a watcher has processed
+
+    An append-only JSON Lines file with one entry per processed file
+    version (see ``file_key()``). An entry is added only after the output
+    has been moved into place, so a file is never marked as done without
+    its output, and a file that changes is processed again.
+
+    :param path: Ledger file, created if needed
+    :type path: str
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Partly written last line of an interrupted run
+                        continue
+                    self._entries[self._key(entry)] = entry
+
+    @staticmethod
+    def _key(entry):
+        return entry['file'], entry['size'], entry['mtime_ns']
+
+    def __contains__(self, key):
+        return tuple(key) in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Get the entry for one file version
+
+        :param key: File version, as from ``file_key()``
+        :type key: tuple
+        :return: Ledger entry, or ``None`` if the file version was never processed
+        :rtype: dict or None
+        """
+
+        return self._entries.get(tuple(key))
+
+    def record(self, key, status, output=None, error=None):
+        """Add an entry and flush it to disk
+
+        :param key: File version, as from ``file_key()``
+        :type key: tuple
+        :param status: ``'done'`` or ``'failed'``
+        :type status: str
+        :param output: Output file name
+        :type output: str, optional
+        :param error: Error message of a failed file
+        :type error: str, optional
+        :return: None
+        """
+
+        name, size, mtime_ns = key
+        entry = {
+            'file': name,
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'status': status,
+            'output': output,
+            'error': error,
+            'time': round(time.time(), 3),
+        }
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._entries[tuple(key)] = entry
+
+
+class Watcher:
+    """Convert files as they appear in a folder
+
+    Loads the lookup tables once into a ``Converter`` and polls
+    ``input_dir`` for CSV and TSV files. A file is ready once its size and
+    modification time are unchanged between two polls and it is at least
+    ``settle`` seconds old, so files still being copied in are left alone.
+    Hidden files (starting with ``.``) are ignored, so writers that copy to a
+    hidden name and rename it into place are picked up only when complete.
+
+    Ready files go onto a queue of at most ``queue_size`` files, which
+    ``workers`` threads take them from. When the queue is full, polling
+    waits. Each output is written to a hidden temporary file in
+    ``output_dir`` and renamed into place, then recorded in the ``Ledger``.
+    Files already in the ledger are skipped, so a restarted watcher picks up
+    where it left off; a file that fails is recorded too and only retried
+    once it changes.
+
+    :param input_dir: Folder to watch
+    :type input_dir: str
+    :param output_dir: Folder to write converted files to, with the same names
+    :type output_dir: str
+    :param frm: Input format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type frm: str
+    :param to: Output format of TCR data ``['tenx', 'adaptive', 'adaptivev2', 'imgt']``
+    :type to: str
+    :param species: Species name. Defaults to ``'human'``.
+    :type species: str, optional
+    :param frm_cols: Custom gene column names.
+    :type frm_cols: list of str, optional
+    :param workers: Number of conversion threads, defaults to ``2``
+    :type workers: int, optional
+    :param queue_size: Most files waiting for a worker, defaults to ``8``
+    :type queue_size: int, optional
+    :param interval: Seconds between polls, defaults to ``1.0``
+    :type interval: float, optional
+    :param settle: Seconds since a file was last modified before it is converted, defaults to ``2.0``
+    :type settle: float, optional
+    :param ledger: Ledger file. Defaults to ``.tcrconvert-ledger.jsonl`` in ``output_dir``.
+    :type ledger: str, optional
+    :param converter: Converter to use, defaults to a new one for ``species``
+    :type converter: Converter, optional
+    :param verbose: Whether to show all messages. Defaults to ``True``.
+    :type verbose: bool, optional
+
+    :Example:
+
+    >>> import shutil
+    >>> import tempfile
+    >>> import tcrconvert
+    >>> from tcrconvert.watch import Watcher
+    >>> in_dir, out_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+    >>> _ = shutil.copy(tcrconvert.get_example_path('tenx.csv'), in_dir)
+    >>> Watcher(in_dir, out_dir, 'tenx', 'imgt', interval=0, settle=0, verbose=False).run(once=True)
+    1
+    >>> sorted(os.listdir(out_dir))
+    ['.tcrconvert-ledger.jsonl', 'tenx.csv']
+    """
+
+    def __init__(
+        self,
+        input_dir,
+        output_dir,
+        frm,
+        to,
+        species='human',
+        frm_cols=[],
+        workers=2,
+        queue_size=8,
+        interval=1.0,
+        settle=2.0,
+        ledger=None,
+        converter=None,
+        verbose=True,
+    ):
+        if verbose:
+            logger.setLevel(logging.INFO)
+        else:
+            logger.setLevel(logging.WARNING)
+
+        if not os.path.isdir(input_dir):
+            logger.error(f'Input folder does not exist: {input_dir}')
+            raise (ValueError)
+        if os.path.abspath(input_dir) == os.path.abspath(output_dir):
+            logger.error('Input and output folders should be different.')
+            raise (ValueError)
+        if workers < 1 or queue_size < 1:
+            logger.error('"workers" and "queue_size" should be at least 1.')
+            raise (ValueError)
+        os.makedirs(output_dir, exist_ok=True)
+
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.frm = frm
+        self.to = to
+        self.species = species
+        self.frm_cols = list(frm_cols)
+        self.workers = workers
+        self.interval = interval
+        self.settle = settle
+        self.verbose = verbose
+        self.ledger = Ledger(ledger or os.path.join(output_dir, LEDGER_NAME))
+        self.converter = converter or Converter(species)
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._seen = {}
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._error = None
+        self.processed = 0
+
+    def scan(self):
+        """Find input files that are ready to convert
+
+        :return: Paths of fully written files that are neither in the ledger nor queued
+        :rtype: list of str
+        """
+
+        now = time.time()
+        seen = {}
+        ready = []
+        with os.scandir(self.input_dir) as entries:
+            names = sorted(
+                e.name
+                for e in entries
+                if e.is_file()
+                and not e.name.startswith('.')
+                and e.name.endswith(('.csv', '.tsv'))
+            )
+        for name in names:
+            path = os.path.join(self.input_dir, name)
+            try:
+                key = file_key(path)
+            except FileNotFoundError:
+                continue
+            seen[name] = key
+            if key in self.ledger:
+                continue
+            with self._pending_lock:
+                if key in self._pending:
+                    continue
+            stable = self._seen.get(name) == key
+            if stable and now - key[2] / 1e9 >= self.settle:
+                ready.append(path)
+        self._seen = seen
+
+        return ready
+
+    def poll(self):
+        """Queue every ready input file, waiting while the queue is full
+
+        :return: Number of files queued
+        :rtype: int
+        """
+
+        ready = self.scan()
+        for path in ready:
+            key = file_key(path)
+            with self._pending_lock:
+                self._pending.add(key)
+            while not self._stop.is_set():
+                try:
+                    self._queue.put((path, key), timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+        return len(ready)
+
+    def convert(self, path, key):
+        """Convert one input file into the output folder and record it in the ledger
+
+        :param path: Input file
+        :type path: str
+        :param key: File version, as from ``file_key()``
+        :type key: tuple
+        :return: Whether the file was converted
+        :rtype: bool
+        """
+
+        name = os.path.basename(path)
+        output = os.path.join(self.output_dir, name)
+        tmp = os.path.join(self.output_dir, f'.{name}.tmp-{uuid.uuid4().hex}')
+        try:
+            sep = delimiter(path)
+            df = pd.read_csv(path, sep=sep, dtype=str)
+            out_df = self.converter.convert(
+                df, self.frm, self.to, self.species, self.frm_cols, self.verbose
+            )
+            out_df.to_csv(tmp, sep=sep, index=False)
+            os.replace(tmp, output)
+        except (ValueError, OSError, pd.errors.ParserError) as e:
+            logger.error(f'Could not convert {path}: {e!r}')
+            self.ledger.record(key, 'failed', error=repr(e))
+            return False
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        self.ledger.record(key, 'done', output=name)
+        logger.info(f'Converted {path} to {output}')
+        return True
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                try:
+                    converted = self.convert(*item)
+                except Exception as e:  # noqa: BLE001 - raised again from run()
+                    # Not a problem with the file, so it is not in the ledger
+                    logger.exception(f'Stopping: unexpected error converting {item[0]}')
+                    self._error = e
+                    self._stop.set()
+                    converted = False
+                if converted:
+                    with self._pending_lock:
+                        self.processed += 1
+            finally:
+                if item is not None:
+                    with self._pending_lock:
+                        self._pending.discard(item[1])
+                self._queue.task_done()
+
+    def stop(self):
+        """Ask ``run()`` to return after the files being converted are done
+
+        Queued files that were not started are left for the next run.
+
+        :return: None
+        """
+
+        self._stop.set()
+
+    def run(self, once=False):
+        """Poll and convert until ``stop()`` is called or on ``KeyboardInterrupt``
+
+        :param once: Return once every file present has been converted, instead of watching for more. Defaults to ``False``.
+        :type once: bool, optional
+        :return: Number of files converted
+        :rtype: int
+        :raises Exception: An unexpected error of a conversion, after the other workers stopped
+        """
+
+        self._stop.clear()
+        threads = [
+            threading.Thread(target=self._work, daemon=True)
+            for _ in range(self.workers)
+        ]
+        for t in threads:
+            t.start()
+
+        logger.info(f'Watching {os.path.abspath(self.input_dir)} for new files')
+        try:
+            while not self._stop.is_set():
+                self.poll()
+                if once and self._settled():
+                    break
+                self._stop.wait(self.interval)
+        except KeyboardInterrupt:
+            self._stop.set()
+        finally:
+            if self._stop.is_set():
+                # Drop files not yet started; they are not in the ledger
+                while True:
+                    try:
+                        self._queue.get_nowait()
+                        self._queue.task_done()
+                    except queue.Empty:
+                        break
+            for _ in threads:
+                self._queue.put(None)
+            for t in threads:
+                t.join()
+            with self._pending_lock:
+                self._pending.clear()
+
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+        return self.processed
+
+    def _settled(self):
+        """Whether every file seen is in the ledger or queued"""
+
+        with self._pending_lock:
+            return all(
+                key in self.ledger or key in self._pending
+                for key in self._seen.values()
+            )
+
+
+# Command-line version of Watcher
+@click.command(name='watch', no_args_is_help=True)
+@click.option(
+    '-i',
+    '--input-dir',
+    help='Folder to watch for CSV and TSV files',
+    required=True,
+    type=click.Path(exists=True, file_okay=False),
+)
+@click.option(
+    '-o', '--output-dir', help='Folder to write converted files to', required=True
+)
+@click.option(
+    '-f',
+    '--frm',
+    help='Input TCR gene format',
+    required=True,
+    type=click.Choice(['tenx', 'adaptive', 'adaptivev2', 'imgt'], case_sensitive=False),
+)
+@click.option(
+    '-t',
+    '--to',
+    help='Output TCR gene format',
+    required=True,
+    type=click.Choice(['tenx', 'adaptive', 'adaptivev2', 'imgt'], case_sensitive=False),
+)
+@click.option(
+    '-s', '--species', default='human', help='Species name', show_default=True
+)
+@click.option(
+    '-c',
+    '--column',
+    default=[],
+    help='Custom gene column name',
+    show_default=True,
+    multiple=True,
+)
+@click.option(
+    '-w', '--workers', default=2, help='Conversion threads', show_default=True
+)
+@click.option(
+    '--queue-size',
+    default=8,
+    help='Most files waiting for a worker',
+    show_default=True,
+)
+@click.option(
+    '--interval', default=1.0, help='Seconds between polls', show_default=True
+)
+@click.option(
+    '--settle',
+    default=2.0,
+    help='Seconds since a file was last modified before it is converted',
+    show_default=True,
+)
+@click.option(
+    '--ledger',
+    default=None,
+    help=f'Ledger of processed files [default: OUTPUT_DIR/{LEDGER_NAME}]',
+)
+@click.option(
+    '--once',
+    is_flag=True,
+    default=False,
+    help='Convert the files present and exit instead of watching',
+)
+@click.option(
+    '-v',
+    '--verbose',
+    default=True,
+    help='Show INFO-level messages',
+    show_default=True,
+)
+def watch_cli(
+    input_dir,
+    output_dir,
+    frm,
+    to,
+    species,
+    column,
+    workers,
+    queue_size,
+    interval,
+    settle,
+    ledger,
+    once,
+    verbose,
+):
+    """Convert TCR files as they land in a folder.
+
+    Stops on Ctrl+C or SIGTERM after finishing the files being converted.
+
+    :Example:
+
+    .. code-block:: bash
+
+       \b
+       $ tcrconvert watch \\
+           --input-dir spool/ \\
+           --output-dir converted/ \\
+           --frm tenx \\
+           --to imgt
+    """
+
+    watcher = Watcher(
+        input_dir,
+        output_dir,
+        frm,
+        to,
+        species,
+        list(column),
+        workers,
+        queue_size,
+        interval,
+        settle,
+        ledger,
+        verbose=verbose,
+    )
+
+    def handle_signal(signum, frame):
+        watcher.stop()
+
+    previous = signal.signal(signal.SIGTERM, handle_signal)
+    try:
+        n = watcher.run(once=once)
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+
+    if verbose:
+        click.echo(f'Converted {n} files into: {os.path.abspath(output_dir)}')
@@ -0,0 +1,201 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pytest
+from tcrconvert import convert, registry, utils
+from tcrconvert.aio import AsyncConverter, convert_file_async, convert_gene_async
+
+tenx_file = utils.get_example_path('tenx.csv')
+tenx_df = pd.read_csv(tenx_file)
+
+
+def test_convert_gene_matches_sync():
+    async def main():
+        async with AsyncConverter(2) as conv:
+            return await conv.convert_gene(tenx_df, 'tenx', 'adaptive', verbose=False)
+
+    out = asyncio.run(main())
+    expected = convert.convert_gene(tenx_df, 'tenx', 'adaptive', verbose=False)
+    pd.testing.assert_frame_equal(out, expected)
+
+
+def test_concurrent_requests_share_one_load():
+    async def main():
+        async with AsyncConverter(2) as conv:
+            outs = await asyncio.gather(
+                *(
+                    conv.convert_gene(tenx_df, 'tenx', 'imgt', verbose=False)
+                    for _ in range(8)
+                ),
+                conv.convert_gene(tenx_df, 'tenx', 'adaptive', verbose=False),
+            )
+            await conv.convert_gene(tenx_df, 'tenx', 'imgt', verbose=False)
+            return conv.loads, outs
+
+    loads, outs = asyncio.run(main())
+    assert loads == 2
+    for out in outs[1:8]:
+        assert out.equals(outs[0])
+
+
+def test_cancelled_waiter_does_not_cancel_the_load():
+    async def main():
+        conv = AsyncConverter(1)
+        first = asyncio.ensure_future(conv.mapping('tenx', 'imgt'))
+        second = asyncio.ensure_future(conv.mapping('tenx', 'imgt'))
+        await asyncio.sleep(0)
+        first.cancel()
+        mapping = await second
+        conv.close()
+        return first.cancelled(), conv.loads, mapping
+
+    cancelled, loads, mapping = asyncio.run(main())
+    assert cancelled
+    assert loads == 1
+    assert mapping['TRAV1-2'] == 'TRAV1-2*01'
+
+
+def test_species_column():
+    df = tenx_df.assign(species='human')
+
+    async def main():
+        async with AsyncConverter(2) as conv:
+            return await conv.convert_gene(
+                df, 'tenx', 'imgt', species='species', verbose=False
+            )
+
+    out = asyncio.run(main())
+    expected = convert.convert_gene(
+        df, 'tenx', 'imgt', species='species', verbose=False
+    )
+    pd.testing.assert_frame_equal(out, expected)
+
+
+@pytest.mark.parametrize('passthrough', [False, True])
+def test_convert_file_matches_sync(passthrough, tmp_path):
+    out_file = str(tmp_path / 'async.tsv')
+    sync_file = str(tmp_path / 'sync.tsv')
+    in_file = str(tmp_path / 'in.tsv')
+    tenx_df.to_csv(in_file, sep='\t', index=False)
+
+    result = asyncio.run(
+        convert_file_async(
+            in_file, out_file, 'tenx', 'imgt', passthrough=passthrough, verbose=False
+        )
+    )
+    convert.convert_file(
+        in_file, sync_file, 'tenx', 'imgt', passthrough=passthrough, verbose=False
+    )
+
+    assert result == out_file
+    with open(out_file) as a, open(sync_file) as b:
+        assert a.read() == b.read()
+    assert sorted(os.listdir(tmp_path)) == ['async.tsv', 'in.tsv', 'sync.tsv']
+
+
+def test_resolve_does_not_change_cached_mapping(tmp_path):
+    df = pd.DataFrame({'v_gene': ['TRBV30*07', 'TRBV30*01', 'BAD_V']})
+    in_file = str(tmp_path / 'in.csv')
+    df.to_csv(in_file, index=False)
+
+    async def main():
+        async with AsyncConverter(2) as conv:
+            out = await conv.convert_gene(
+                df, 'imgt', 'adaptive', verbose=False, resolve=True
+            )
+            plain = await conv.convert_gene(df, 'imgt', 'adaptive', verbose=False)
+            await conv.convert_file(
+                in_file,
+                str(tmp_path / 'out.csv'),
+                'imgt',
+                'adaptive',
+                verbose=False,
+                resolve=True,
+            )
+            return conv.loads, out, plain
+
+    loads, out, plain = asyncio.run(main())
+    assert loads == 1
+    pd.testing.assert_frame_equal(
+        out, convert.convert_gene(df, 'imgt', 'adaptive', verbose=False, resolve=True)
+    )
+    assert plain['v_gene'].isna().tolist() == [True, False, True]
+    pd.testing.assert_frame_equal(
+        pd.read_csv(str(tmp_path / 'out.csv'), dtype=str), out.astype(object)
+    )
+
+
+def test_convert_file_species_column(tmp_path):
+    in_file = str(tmp_path / 'in.csv')
+    tenx_df.assign(organism=['human', 'human', 'mouse', 'human']).to_csv(
+        in_file, index=False
+    )
+    out_file = str(tmp_path / 'out.csv')
+    sync_file = str(tmp_path / 'sync.csv')
+
+    async def main():
+        async with AsyncConverter(2) as conv:
+            await conv.mapping('tenx', 'imgt', 'human')
+            await conv.convert_file(
+                in_file, out_file, 'tenx', 'imgt', species='organism', verbose=False
+            )
+            return conv.loads
+
+    # Only the mouse mapping is loaded for the file
+    assert asyncio.run(main()) == 2
+    convert.convert_file(
+        in_file, sync_file, 'tenx', 'imgt', species='organism', verbose=False
+    )
+    with open(out_file) as a, open(sync_file) as b:
+        assert a.read() == b.read()
+
+
+def test_mapping_checks_registry_off_the_loop(monkeypatch):
+    threads = []
+    get_species = registry.get_species
+
+    def recording(species):
+        threads.append(threading.current_thread())
+        return get_species(species)
+
+    monkeypatch.setattr(registry, 'get_species', recording)
+
+    async def main():
+        async with AsyncConverter(1) as conv:
+            await conv.mapping('tenx', 'imgt')
+            await conv.mapping('tenx', 'imgt')
+
+    asyncio.run(main())
+    assert threads
+    assert threading.main_thread() not in threads
+
+
+def test_convert_gene_async_errors():
+    with pytest.raises(ValueError):
+        asyncio.run(convert_gene_async(tenx_df, 'tenx', 'tenx', verbose=False))
+
+
+def test_cancelled_convert_file_leaves_no_output(tmp_path):
+    out_file = str(tmp_path / 'out.csv')
+    release = threading.Event()
+    executor = ThreadPoolExecutor(1)
+
+    async def main():
+        conv = AsyncConverter(executor=executor)
+        # Keep the only worker busy so that the conversion is still queued
+        blocker = asyncio.get_running_loop().run_in_executor(executor, release.wait)
+        task = asyncio.ensure_future(
+            conv.convert_file(tenx_file, out_file, 'tenx', 'imgt', verbose=False)
+        )
+        await asyncio.sleep(0.05)
+        task.cancel()
+        release.set()
+        await blocker
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    executor.shutdown(wait=True)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,178 @@
+import io
+import logging
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from tcrconvert import cli, convert, utils
+
+pa = pytest.importorskip('pyarrow')
+from tcrconvert import arrow
+
+
+def as_lists(df):
+    return {col: [None if pd.isna(x) else x for x in df[col]] for col in df.columns}
+
+
+@pytest.mark.parametrize(
+    'example, sep, frm, to',
+    [
+        ('tenx.csv', ',', 'tenx', 'imgt'),
+        ('tenx.csv', ',', 'tenx', 'adaptive'),
+        ('adaptive.tsv', '\t', 'adaptivev2', 'imgt'),
+    ],
+)
+def test_convert_arrow_matches_convert_gene(example, sep, frm, to):
+    df = pd.read_csv(utils.get_example_path(example), sep=sep, dtype=str)
+    expected = convert.convert_gene(df, frm, to, verbose=False)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    out = arrow.convert_arrow(table, frm, to, verbose=False)
+
+    assert out.schema.names == table.schema.names
+    assert as_lists(out.to_pandas()) == as_lists(expected)
+
+
+def test_convert_arrow_zero_copy():
+    genes = pa.array(['TRAV12-1', 'TRBV15', None, 'TRAV12-1']).dictionary_encode()
+    cdr3 = pa.array(['CAVLIF', 'CASSGF', 'CASSF', 'CAVLF'])
+    table = pa.table({'v_gene': genes, 'cdr3': cdr3})
+
+    out = arrow.convert_arrow(table, 'tenx', 'imgt', verbose=False)
+    v_gene = out.column('v_gene').chunk(0)
+
+    assert v_gene.to_pylist() == ['TRAV12-1*01', 'TRBV15*01', None, 'TRAV12-1*01']
+    # Indices are shared, not copied
+    assert v_gene.indices.buffers()[1].address == genes.indices.buffers()[1].address
+    # Only the dictionary is mapped
+    assert len(v_gene.dictionary) == len(genes.dictionary)
+    # Other columns are passed through
+    assert out.column('cdr3').chunk(0).buffers()[2].address == cdr3.buffers()[2].address
+
+
+def test_convert_arrow_remaps_indices():
+    genes = pa.array(['TRAV12-1', 'TRAV12-1*01', 'BAD', None]).dictionary_encode()
+    out = arrow.convert_arrow(genes, 'imgt', 'tenx', verbose=False)
+
+    assert out.to_pylist() == [None, 'TRAV12-1', None, None]
+    assert out.dictionary.to_pylist() == ['TRAV12-1']
+    assert out.to_pandas().isna().tolist() == [True, False, True, True]
+
+
+def test_convert_arrow_arrays_and_batches(caplog):
+    chunked = pa.chunked_array([['TRAV12-1', 'BAD_GENE'], ['TRBV15', None]])
+    with caplog.at_level(logging.WARNING):
+        out = arrow.convert_arrow(chunked, 'tenx', 'imgt', verbose=False)
+    assert isinstance(out, pa.ChunkedArray)
+    assert out.to_pylist() == ['TRAV12-1*01', None, 'TRBV15*01', None]
+    assert "['BAD_GENE']" in caplog.text
+
+    batch = pa.record_batch(
+        {
+            'myV': pa.array(['TRAV12-1*01', 'TRBV15*01']),
+            'myJ': pa.array(['BAD', 'WORSE']),
+        }
+    )
+    caplog.clear()
+    with caplog.at_level(logging.WARNING):
+        out = arrow.convert_arrow(
+            batch, 'imgt', 'tenx', columns=['myV', 'myJ'], verbose=False
+        )
+    assert isinstance(out, pa.RecordBatch)
+    assert out.column(0).to_pylist() == ['TRAV12-1', 'TRBV15']
+    # Entirely unmapped column is left alone
+    assert out.column(1).equals(batch.column(1))
+    assert "The input column 'myJ' doesn't contain any valid genes" in caplog.text
+
+
+def test_convert_arrow_errors():
+    table = pa.table({'v_gene': ['TRAV12-1']})
+    with pytest.raises(ValueError):
+        arrow.convert_arrow(table, 'tenx', 'tenx')
+    with pytest.raises(TypeError):
+        arrow.convert_arrow(pd.DataFrame({'v_gene': ['TRAV12-1']}), 'tenx', 'imgt')
+    with pytest.raises(ValueError):
+        arrow.convert_arrow(table.slice(0, 0), 'tenx', 'imgt')
+
+
+def ipc_stream(batches, schema):
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+    return sink.getvalue()
+
+
+def test_convert_stream(caplog):
+    df = pd.read_csv(utils.get_example_path('tenx.csv'), dtype=str)
+    expected = convert.convert_gene(df, 'tenx', 'imgt', verbose=False)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.set_column(
+        0, 'barcode', table.column('barcode').dictionary_encode()
+    ).append_column('d2_gene', pa.array(['BAD_D'] * len(df)).dictionary_encode())
+    batches = table.to_batches(max_chunksize=3)
+    batches.insert(1, batches[0].slice(0, 0))
+
+    sink = io.BytesIO()
+    with caplog.at_level(logging.WARNING):
+        n_batches, n_rows = arrow.convert_stream(
+            ipc_stream(batches, table.schema),
+            sink,
+            'tenx',
+            'imgt',
+            columns=['v_gene', 'd_gene', 'j_gene', 'c_gene', 'd2_gene'],
+            verbose=False,
+        )
+    out = pa.ipc.open_stream(sink.getvalue()).read_all()
+
+    assert (n_batches, n_rows) == (len(batches), len(df))
+    assert out.schema == table.schema
+    assert as_lists(out.drop_columns('d2_gene').to_pandas()) == as_lists(expected)
+    # The schema is fixed, so a column with no valid genes is converted too
+    assert out.column('d2_gene').null_count == len(df)
+    assert "['BAD_D']" in caplog.text
+
+
+@pytest.mark.parametrize(
+    'value_type', [pa.large_string(), pa.dictionary(pa.int8(), pa.large_string())]
+)
+def test_convert_stream_large_string(value_type):
+    schema = pa.schema([('v_gene', value_type)])
+    batch = pa.record_batch([pa.array(['TRAV1-2', None]).cast(value_type)], schema)
+    sink = io.BytesIO()
+    arrow.convert_stream(
+        ipc_stream([batch], schema), sink, 'tenx', 'imgt', verbose=False
+    )
+    out = pa.ipc.open_stream(sink.getvalue()).read_all()
+
+    assert out.schema == schema
+    assert out.column('v_gene').to_pylist() == ['TRAV1-2*01', None]
+
+
+@pytest.mark.parametrize(
+    'value_type',
+    [pa.binary(), pa.int64(), pa.dictionary(pa.int32(), pa.binary())]
+    + ([pa.string_view()] if hasattr(pa, 'string_view') else []),
+)
+def test_convert_stream_rejects_other_types(value_type):
+    schema = pa.schema([('v_gene', value_type), ('cdr3', pa.string())])
+    with pytest.raises(ValueError):
+        arrow.convert_stream(
+            ipc_stream([], schema), io.BytesIO(), 'tenx', 'imgt', verbose=False
+        )
+
+
+def test_convert_stream_cli():
+    schema = pa.schema([('v_gene', pa.string()), ('cdr3', pa.string())])
+    batch = pa.record_batch(
+        [pa.array(['TRAV1-2', None]), pa.array(['CA', 'CB'])], schema
+    )
+    result = CliRunner().invoke(
+        cli.entry_point,
+        ['arrow-stream', '-f', 'tenx', '-t', 'imgt', '-v', 'False'],
+        input=ipc_stream([batch, batch], schema),
+    )
+
+    assert result.exit_code == 0
+    out = pa.ipc.open_stream(result.stdout_bytes).read_all()
+    assert out.column('v_gene').to_pylist() == ['TRAV1-2*01', None] * 2
+    assert out.column('cdr3').to_pylist() == ['CA', 'CB'] * 2
@@ -0,0 +1,80 @@
+import json
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from tcrconvert import cli, convert
+from tcrconvert.bench import make_input, run_bench
+
+
+@pytest.mark.parametrize('frm', ['tenx', 'adaptive', 'adaptivev2'])
+def test_make_input_unmapped_share(frm, tmp_path):
+    path = make_input(str(tmp_path / 'tcrs.tsv'), 4000, frm, unmapped=0.2)
+    df = pd.read_csv(path, sep='\t', dtype=str)
+
+    assert len(df) == 4000
+    assert df.columns.tolist() == ['barcode', *convert.col_ref[frm], 'cdr3', 'reads']
+
+    out = convert.convert_gene(df, frm, 'imgt', verbose=False)
+    for col in convert.col_ref[frm]:
+        share = out[col].isna().mean()
+        assert 0.17 < share < 0.23
+        assert df[col].str.contains(col[0].upper()).all()
+
+
+def test_make_input_is_reproducible(tmp_path):
+    a = make_input(str(tmp_path / 'a.csv'), 500, seed=3)
+    b = make_input(str(tmp_path / 'b.csv'), 500, seed=3)
+
+    with open(a) as fa, open(b) as fb:
+        assert fa.read() == fb.read()
+
+
+def test_run_bench_reports_every_path(tmp_path):
+    report = run_bench(
+        [1000, 3000], paths=['pandas', 'passthrough'], workdir=str(tmp_path)
+    )
+
+    assert report[['path', 'rows']].values.tolist() == [
+        ['pandas', 1000],
+        ['passthrough', 1000],
+        ['pandas', 3000],
+        ['passthrough', 3000],
+    ]
+    assert (report['rows_per_s'] > 0).all()
+    assert (report['mb_per_s'] > 0).all()
+    assert (report['lookup_s'] >= 0).all()
+    pandas = report[report['path'] == 'pandas']
+    assert pandas[['read_s', 'convert_s', 'write_s']].notna().all().all()
+    assert report.loc[report['path'] == 'passthrough', 'splice_s'].notna().all()
+    # Inputs and outputs are removed
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_run_bench_checks_arguments():
+    with pytest.raises(ValueError):
+        run_bench([10], paths=['polars'])
+    with pytest.raises(ValueError):
+        run_bench([10], frm='imgt', to='imgt')
+
+
+def test_bench_cli_json():
+    result = CliRunner().invoke(
+        cli.entry_point,
+        [
+            'bench',
+            '-n',
+            '500',
+            '-p',
+            'passthrough',
+            '--unmapped',
+            '0',
+            '--format',
+            'json',
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    (row,) = json.loads(result.output)
+    assert row['path'] == 'passthrough'
+    assert row['rows'] == 500
+    assert row['seconds'] > 0
@@ -3,8 +3,11 @@ import os
 import tempfile
 import shutil
 import pytest
+import logging
+import threading
+import time
 from unittest.mock import patch
-from tcrconvert import build_lookup, utils
+from tcrconvert import build_lookup, convert, registry, utils
 
 
 def test_parse_imgt_fasta():
@@ -174,3 +177,228 @@ def test_save_lookup_tables():
 
     # Delete temp directory
     shutil.rmtree(mock_path, ignore_errors=True)
+
+
+def test_build_lookup_manifest(tmp_path):
+    fastadir = tmp_path / 'fastas'
+    shutil.copytree(utils.get_example_path('fasta_dir'), fastadir)
+    user_dir = tmp_path / 'user'
+
+    with patch('platformdirs.user_data_dir', return_value=str(user_dir)):
+        save_dir = build_lookup.build_lookup_from_fastas(str(fastadir), 'rabbit')
+
+    manifest = build_lookup.read_manifest(save_dir)
+    assert manifest['ruleset_version'] == build_lookup.RULESET_VERSION
+    assert manifest['tcrconvert_version'] == build_lookup.tcrconvert_version()
+    assert manifest['gene_counts'] == {
+        'lookup.csv': 10,
+        'lookup_from_tenx.csv': 8,
+        'lookup_from_adaptive.csv': 21,
+    }
+    trav = manifest['fastas']['test_trav.fa']
+    assert trav['size'] == os.path.getsize(fastadir / 'test_trav.fa')
+    assert trav['sha256'] == build_lookup.file_sha256(fastadir / 'test_trav.fa')
+    assert trav['genes'][0] == 'TRAV1-1*01'
+
+
+def test_build_lookup_incremental(tmp_path, caplog):
+    fastadir = tmp_path / 'fastas'
+    shutil.copytree(utils.get_example_path('fasta_dir'), fastadir)
+    user_dir = tmp_path / 'user'
+    lookup_f = user_dir / 'rabbit' / 'lookup.csv'
+
+    with patch('platformdirs.user_data_dir', return_value=str(user_dir)):
+        build_lookup.build_lookup_from_fastas(str(fastadir), 'rabbit')
+        first_mtime = os.stat(lookup_f).st_mtime_ns
+
+        # Nothing changed: no FASTA is parsed and no table is rewritten
+        with patch.object(
+            build_lookup, 'parse_imgt_fasta', wraps=build_lookup.parse_imgt_fasta
+        ) as parse:
+            with caplog.at_level(logging.INFO):
+                build_lookup.build_lookup_from_fastas(str(fastadir), 'rabbit')
+            assert parse.call_count == 0
+        assert 'Lookup tables for rabbit are up to date' in caplog.text
+        assert os.stat(lookup_f).st_mtime_ns == first_mtime
+
+        # One FASTA changed: only that file is re-parsed
+        with open(fastadir / 'test_trbv.fa', 'a') as f:
+            f.write('>X|TRBV30*01|Homo sapiens|F|\nacgt\n')
+        with patch.object(
+            build_lookup, 'parse_imgt_fasta', wraps=build_lookup.parse_imgt_fasta
+        ) as parse:
+            build_lookup.build_lookup_from_fastas(str(fastadir), 'rabbit')
+            parsed = [os.path.basename(c.args[0]) for c in parse.call_args_list]
+            assert parsed == ['test_trbv.fa']
+        assert 'TRBV30*01,TRBV30,TCRBV30-01*01' in lookup_f.read_text()
+
+        # Forced rebuild re-parses everything
+        with patch.object(
+            build_lookup, 'parse_imgt_fasta', wraps=build_lookup.parse_imgt_fasta
+        ) as parse:
+            build_lookup.build_lookup_from_fastas(str(fastadir), 'rabbit', force=True)
+            assert parse.call_count == 2
+
+        # A new rule-set version invalidates the manifest
+        with patch.object(build_lookup, 'RULESET_VERSION', -1):
+            with patch.object(
+                build_lookup, 'parse_imgt_fasta', wraps=build_lookup.parse_imgt_fasta
+            ) as parse:
+                build_lookup.build_lookup_from_fastas(str(fastadir), 'rabbit')
+                assert parse.call_count == 0
+            manifest = build_lookup.read_manifest(str(user_dir / 'rabbit'))
+            assert manifest['ruleset_version'] == -1
+
+        # Removing a FASTA triggers a rebuild without its genes
+        os.remove(fastadir / 'test_trbv.fa')
+        build_lookup.build_lookup_from_fastas(str(fastadir), 'rabbit')
+        assert 'TRBV' not in lookup_f.read_text()
+
+
+def test_concurrent_build_and_convert(tmp_path):
+    # Two generations of FASTAs that produce different tables
+    fastas_a = tmp_path / 'a'
+    fastas_b = tmp_path / 'b'
+    shutil.copytree(utils.get_example_path('fasta_dir'), fastas_a)
+    shutil.copytree(utils.get_example_path('fasta_dir'), fastas_b)
+    with open(fastas_b / 'test_trbv.fa', 'a') as f:
+        f.write('>X|TRBV30*01|Homo sapiens|F|\nacgt\n')
+
+    user_dir = tmp_path / 'user'
+    tenx = pd.DataFrame({'v_gene': ['TRAV1-1', 'TRBV29-1', 'TRBV30']})
+    errors = []
+
+    def builder(n):
+        try:
+            for i in range(n):
+                fastadir = fastas_a if i % 2 else fastas_b
+                build_lookup.build_lookup_from_fastas(str(fastadir), 'rabbit')
+        except Exception as e:
+            errors.append(e)
+
+    def reader(stop):
+        try:
+            while not stop.is_set():
+                # Each read must be one complete generation, never a mix
+                lookup = convert.read_lookup(str(user_dir / 'rabbit' / 'lookup.csv'))
+                assert len(lookup) in (10, 11)
+                assert lookup.notna().all().all()
+                out = convert.convert_gene(
+                    tenx, 'tenx', 'imgt', 'rabbit', verbose=False
+                )
+                assert out['v_gene'][:2].tolist() == ['TRAV1-1*01', 'TRBV29-1*01']
+        except Exception as e:
+            errors.append(e)
+
+    with patch('platformdirs.user_data_dir', return_value=str(user_dir)):
+        build_lookup.build_lookup_from_fastas(str(fastas_a), 'rabbit')
+
+        stop = threading.Event()
+        readers = [threading.Thread(target=reader, args=(stop,)) for _ in range(4)]
+        builders = [threading.Thread(target=builder, args=(10,)) for _ in range(2)]
+        for t in readers + builders:
+            t.start()
+        for t in builders:
+            t.join()
+        stop.set()
+        for t in readers:
+            t.join()
+
+    assert not errors
+    # Temporary and retired generations are cleaned up
+    assert sorted(os.listdir(user_dir)) == ['.rabbit.lock', 'rabbit']
+
+
+def test_convert_during_first_scan_of_a_swap(tmp_path):
+    user_dir = tmp_path / 'user'
+    rabbit = str(user_dir / 'rabbit')
+    aside = str(user_dir / '.rabbit.old')
+    tenx = pd.DataFrame({'v_gene': ['TRAV1-1']})
+    swapping = threading.Event()
+
+    def swap():
+        # Hold the lock with the folder moved aside, as swap_directory() does
+        with utils.file_lock(utils.lookup_lock_path(rabbit)):
+            os.rename(rabbit, aside)
+            swapping.set()
+            time.sleep(0.3)
+            os.rename(aside, rabbit)
+
+    with patch('platformdirs.user_data_dir', return_value=str(user_dir)):
+        build_lookup.build_lookup_from_fastas(
+            utils.get_example_path('fasta_dir'), 'rabbit'
+        )
+        registry.refresh()
+        swapper = threading.Thread(target=swap)
+        swapper.start()
+        swapping.wait()
+        # The registry is first scanned while the folder is missing
+        out = convert.convert_gene(tenx, 'tenx', 'imgt', 'rabbit', verbose=False)
+        swapper.join()
+
+    assert out['v_gene'].tolist() == ['TRAV1-1*01']
+
+
+def make_reference_root(root, species):
+    for name in species:
+        shutil.copytree(utils.get_example_path('fasta_dir'), root / name)
+    # Folders without FASTAs and hidden folders are not species
+    os.makedirs(root / 'notes')
+    os.makedirs(root / '.cache')
+
+
+def test_find_species_dirs(tmp_path):
+    make_reference_root(tmp_path, ['rabbit', 'llama'])
+    assert build_lookup.find_species_dirs(str(tmp_path)) == {
+        'llama': str(tmp_path / 'llama'),
+        'rabbit': str(tmp_path / 'rabbit'),
+    }
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_build_all_lookups(tmp_path, n_jobs):
+    root = tmp_path / 'refs'
+    make_reference_root(root, ['rabbit', 'llama'])
+    user_dir = tmp_path / 'user'
+
+    with patch('platformdirs.user_data_dir', return_value=str(user_dir)):
+        summary = build_lookup.build_all_lookups(str(root), n_jobs=n_jobs)
+        assert summary['species'].tolist() == ['llama', 'rabbit']
+        assert summary['status'].tolist() == ['built', 'built']
+        assert summary['imgt'].tolist() == [10, 10]
+        assert summary['tenx'].tolist() == [8, 8]
+        assert summary['adaptive'].tolist() == [21, 21]
+        assert (summary['seconds'] >= 0).all()
+
+        summary = build_lookup.build_all_lookups(str(root), n_jobs=n_jobs)
+        assert summary['status'].tolist() == ['up to date', 'up to date']
+
+    for species in ['llama', 'rabbit']:
+        assert os.path.exists(user_dir / species / 'lookup_from_adaptive.csv')
+
+
+def test_build_all_lookups_errors(tmp_path):
+    make_reference_root(tmp_path, ['rabbit', 'bad~name'])
+    with patch('platformdirs.user_data_dir', return_value=str(tmp_path / 'user')):
+        # Names are checked before anything is built
+        with pytest.raises(ValueError, match="'bad~name'"):
+            build_lookup.build_all_lookups(str(tmp_path))
+        assert not os.path.exists(tmp_path / 'user' / 'rabbit')
+
+        with pytest.raises(ValueError):
+            build_lookup.build_all_lookups(str(tmp_path / 'notes'))
+
+
+def test_build_all_lookups_records_logged_errors(tmp_path, monkeypatch):
+    make_reference_root(tmp_path, ['rabbit'])
+
+    def fail(*args):
+        build_lookup.logger.error('No genes found in the FASTA files.')
+        raise (ValueError)
+
+    monkeypatch.setattr(build_lookup, '_build_lookup', fail)
+    with patch('platformdirs.user_data_dir', return_value=str(tmp_path / 'user')):
+        out = build_lookup.build_all_lookups(str(tmp_path), n_jobs=1)
+
+    assert list(out['status']) == ['failed']
+    assert list(out['error']) == ['ValueError: No genes found in the FASTA files.']
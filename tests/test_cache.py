@@ -0,0 +1,189 @@
+import os
+import shutil
+import pytest
+from unittest.mock import patch
+from click.testing import CliRunner
+from tcrconvert import cache, cli, convert, metrics, utils
+
+tcr_file = utils.get_example_path('tenx.csv')
+
+
+def test_cache_hit_and_miss(tmp_path):
+    results = cache.ResultCache(str(tmp_path / 'cache'))
+    out_file = str(tmp_path / 'out.csv')
+    expected = str(tmp_path / 'expected.csv')
+    convert.convert_file(tcr_file, expected, 'tenx', 'imgt', verbose=False)
+
+    convert.convert_file(
+        tcr_file, out_file, 'tenx', 'imgt', verbose=False, cache=results
+    )
+    os.remove(out_file)
+    with patch.object(convert, 'convert_gene') as convert_gene:
+        m = metrics.Metrics()
+        convert.convert_file(
+            tcr_file, out_file, 'tenx', 'imgt', verbose=False, cache=results, metrics=m
+        )
+        convert_gene.assert_not_called()
+
+    assert (results.hits, results.misses) == (1, 1)
+    assert m.value('tcrconvert_cache_lookups', result='hit') == 1
+    with open(out_file) as f, open(expected) as g:
+        assert f.read() == g.read()
+
+    # Other parameters, other input bytes or other lookups miss
+    convert.convert_file(
+        tcr_file, out_file, 'tenx', 'adaptive', verbose=False, cache=results
+    )
+    convert.convert_file(
+        tcr_file, out_file, 'tenx', 'imgt', 'mouse', verbose=False, cache=results
+    )
+    changed = str(tmp_path / 'changed.csv')
+    shutil.copy(tcr_file, changed)
+    with open(changed, 'a') as f:
+        f.write('\n')
+    convert.convert_file(
+        changed, out_file, 'tenx', 'imgt', verbose=False, cache=results
+    )
+    with patch.object(cache, 'lookup_digest', return_value='rebuilt'):
+        convert.convert_file(
+            tcr_file, out_file, 'tenx', 'imgt', verbose=False, cache=results
+        )
+    assert (results.hits, results.misses) == (1, 5)
+
+
+def test_cache_link(tmp_path):
+    results = cache.ResultCache(str(tmp_path / 'cache'), link=True)
+    out_file = str(tmp_path / 'out.csv')
+    for _ in range(2):
+        convert.convert_file(
+            tcr_file, out_file, 'tenx', 'imgt', verbose=False, cache=results
+        )
+
+    key = results.key(
+        tcr_file,
+        frm='tenx',
+        to='imgt',
+        species='human',
+        frm_cols=[],
+        passthrough=False,
+        dtype_backend=None,
+        multi_sep=None,
+        join_sep=None,
+        partial='na',
+        resolve=False,
+        sep=',',
+    )
+    assert os.path.samefile(results.entry(key), out_file)
+
+
+@pytest.mark.parametrize('passthrough', [False, True])
+def test_cache_link_output_rewritten(passthrough, tmp_path):
+    results = cache.ResultCache(str(tmp_path / 'cache'), link=True)
+    out_file = str(tmp_path / 'out.csv')
+    expected = str(tmp_path / 'expected.csv')
+    convert.convert_file(
+        tcr_file, expected, 'tenx', 'imgt', passthrough=passthrough, verbose=False
+    )
+
+    # Writing another result to the output leaves the linked entry alone
+    for to in ['imgt', 'adaptive', 'imgt']:
+        convert.convert_file(
+            tcr_file,
+            out_file,
+            'tenx',
+            to,
+            passthrough=passthrough,
+            verbose=False,
+            cache=results,
+        )
+
+    assert (results.hits, results.misses) == (1, 2)
+    with open(out_file) as f, open(expected) as g:
+        assert f.read() == g.read()
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    results = cache.ResultCache(str(tmp_path / 'cache'), max_bytes=3500)
+    src = tmp_path / 'src'
+    src.write_bytes(b'x' * 1000)
+    for i, key in enumerate(['aa1', 'bb2', 'cc3']):
+        results.put(key, str(src))
+        os.utime(results.entry(key) + '.json', ns=(i * 10**9, i * 10**9))
+    # Using the oldest entry makes it the newest
+    assert results.get('aa1', str(tmp_path / 'out'))
+
+    results.put('dd4', str(src))
+
+    assert os.path.exists(results.entry('aa1'))
+    assert not os.path.exists(results.entry('bb2'))
+    assert os.path.exists(results.entry('cc3'))
+    assert os.path.exists(results.entry('dd4'))
+    assert not os.path.exists(results.entry('bb2') + '.json')
+    assert not results.get('bb2', str(tmp_path / 'out'))
+
+
+def test_cache_hit_keeps_linked_output_times(tmp_path):
+    results = cache.ResultCache(str(tmp_path / 'cache'), link=True)
+    first = str(tmp_path / 'first.csv')
+    convert.convert_file(tcr_file, first, 'tenx', 'imgt', verbose=False, cache=results)
+    os.utime(first, ns=(10**9, 10**9))
+
+    convert.convert_file(
+        tcr_file,
+        str(tmp_path / 'second.csv'),
+        'tenx',
+        'imgt',
+        verbose=False,
+        cache=results,
+    )
+
+    assert results.hits == 1
+    assert os.stat(first).st_mtime_ns == 10**9
+
+
+def test_cache_hit_replays_warnings_and_metrics(tmp_path, caplog):
+    tcr_bad = str(tmp_path / 'bad.csv')
+    with open(tcr_bad, 'w') as f:
+        f.write('barcode,v_gene,j_gene\nA,TRAV1-1,TRAJ99\nB,TRBV99,TRBJ1-1\n')
+    results = cache.ResultCache(str(tmp_path / 'cache'))
+
+    runs = []
+    for name in ['miss.csv', 'hit.csv']:
+        caplog.clear()
+        m = metrics.Metrics()
+        convert.convert_file(
+            tcr_bad,
+            str(tmp_path / name),
+            'tenx',
+            'imgt',
+            verbose=False,
+            cache=results,
+            metrics=m,
+        )
+        warnings = [r.getMessage() for r in caplog.records if r.levelname == 'WARNING']
+        runs.append((warnings, m))
+
+    (miss_warnings, miss), (hit_warnings, hit) = runs
+    assert results.hits == 1
+    assert any('TRAJ99' in w for w in miss_warnings)
+    assert hit_warnings == miss_warnings
+    assert hit.value('tcrconvert_rows') == miss.value('tcrconvert_rows') == 2
+    for col in ['v_gene', 'j_gene']:
+        assert hit.value('tcrconvert_unmapped_rows', column=col) == 1
+    assert hit.value('tcrconvert_unmapped_genes') == 2
+    assert hit.unmapped == miss.unmapped
+
+
+def test_cache_cli(tmp_path):
+    out_file = str(tmp_path / 'out.csv')
+    args = ['convert', '-i', tcr_file, '-o', out_file, '-f', 'tenx', '-t', 'imgt']
+    args += ['--cache-dir', str(tmp_path / 'cache')]
+
+    result = CliRunner().invoke(cli.entry_point, args, catch_exceptions=False)
+    assert result.exit_code == 0
+    os.remove(out_file)
+
+    with patch.object(convert, 'convert_gene', side_effect=AssertionError):
+        result = CliRunner().invoke(cli.entry_point, args, catch_exceptions=False)
+    assert result.exit_code == 0
+    assert os.path.exists(out_file)
@@ -0,0 +1,88 @@
+import json
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from tcrconvert import cli, convert, utils
+from tcrconvert.check import check_coverage, count_genes
+
+tcr_df = pd.DataFrame(
+    {
+        'v_gene': ['TRAV12-1', 'TRBV15', 'BAD_V', 'BAD_V', None],
+        'j_gene': ['TRAJ16', 'TRBJ2-5', 'TRAJ16', None, None],
+        'c_gene': ['TRAC', 'TRBC2', 'TRBC2', 'TRAC', 'TRAC'],
+        'cdr3': ['CAVLIF', 'CASSGF', 'CASSF', 'CAF', 'CASF'],
+    }
+)
+
+
+def test_check_coverage_matches_convert_gene(tmp_path):
+    path = str(tmp_path / 'tcrs.tsv')
+    tcr_df.to_csv(path, sep='\t', index=False)
+    cols = ['v_gene', 'j_gene', 'c_gene', 'cdr3']
+
+    report = check_coverage(path, 'tenx', 'adaptive', frm_cols=cols, verbose=False)
+    report = report.set_index('column')
+
+    assert report.loc['v_gene', ['missing', 'mapped', 'unmapped']].tolist() == [1, 2, 2]
+    assert report.loc['v_gene', 'coverage'] == 0.5
+    assert report.loc['v_gene', 'top_unmapped'] == ['BAD_V']
+    assert report.loc['j_gene', 'coverage'] == 1.0
+    assert report.loc['c_gene', ['mapped', 'no_equivalent']].tolist() == [0, 5]
+    assert report.loc['cdr3', 'skipped']
+    assert not report.loc[['v_gene', 'j_gene', 'c_gene'], 'skipped'].any()
+
+    out = convert.convert_gene(tcr_df, 'tenx', 'adaptive', frm_cols=cols, verbose=False)
+    assert out['cdr3'].equals(tcr_df['cdr3'])
+    assert out['v_gene'].notna().sum() == report.loc['v_gene', 'mapped']
+
+
+def test_check_coverage_sample_and_frame():
+    report = check_coverage(tcr_df, 'tenx', 'imgt', n_rows=2, verbose=False)
+    assert report['rows'].tolist() == [2, 2, 2]
+    assert report['coverage'].tolist() == [1.0, 1.0, 1.0]
+
+    full = check_coverage(tcr_df, 'tenx', 'imgt', verbose=False)
+    assert full['column'].tolist() == ['v_gene', 'j_gene', 'c_gene']
+
+
+def test_count_genes_chunks(tmp_path):
+    path = str(tmp_path / 'tcrs.csv')
+    tcr_df.to_csv(path, index=False)
+    n, missing, counts = count_genes(path, ['v_gene'], chunksize=2)
+    assert n == 5
+    assert missing == {'v_gene': 1}
+    assert counts['v_gene'] == {'TRAV12-1': 1, 'TRBV15': 1, 'BAD_V': 2}
+
+
+def test_check_coverage_errors():
+    with pytest.raises(ValueError):
+        check_coverage(tcr_df, 'tenx', 'tenx')
+    with pytest.raises(ValueError):
+        check_coverage(tcr_df.head(0), 'tenx', 'imgt')
+
+
+def test_check_cli(tmp_path):
+    path = str(tmp_path / 'tcrs.csv')
+    tcr_df.to_csv(path, index=False)
+    args = ['check', '-i', path, '-f', 'tenx', '-t', 'imgt']
+
+    result = CliRunner().invoke(cli.entry_point, args + ['--min-coverage', '0.5'])
+    assert result.exit_code == 0
+    assert 'Most common unmapped genes in v_gene: BAD_V' in result.output
+
+    result = CliRunner().invoke(cli.entry_point, args + ['--min-coverage', '0.9'])
+    assert result.exit_code == 1
+    assert 'Coverage below 0.9 in: v_gene' in result.output
+
+    result = CliRunner().invoke(
+        cli.entry_point, args + ['--format', 'json', '-n', '2', '-v', 'False']
+    )
+    assert result.exit_code == 0
+    assert [r['coverage'] for r in json.loads(result.output)] == [1.0, 1.0, 1.0]
+
+
+def test_check_example_files():
+    report = check_coverage(
+        utils.get_example_path('adaptive.tsv'), 'adaptivev2', 'imgt', verbose=False
+    )
+    assert report['column'].tolist() == ['vMaxResolved', 'dMaxResolved', 'jMaxResolved']
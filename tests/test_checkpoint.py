@@ -0,0 +1,110 @@
+import logging
+import os
+import pytest
+from click.testing import CliRunner
+from tcrconvert import checkpoint, cli, convert, stream
+
+N_ROWS = 300
+
+
+@pytest.fixture
+def tcr_file(tmp_path):
+    rows = []
+    for i in range(N_ROWS):
+        note = f'"line {i}\nnote"' if i % 7 == 0 else f'n{i}'
+        gene = ['TRAV1-2', 'TRBV15', 'BAD_V', 'NA', 'TRAV29/DV5'][i % 5]
+        rows.append(f'{note},{gene},TRAC,CASS{i},x{i % 3}\n')
+        if i % 40 == 0:
+            rows.append('\n')
+    path = tmp_path / 'tcrs.csv'
+    path.write_text('notes,v_gene,c_gene,cdr3,j_gene\n' + ''.join(rows), newline='')
+    return str(path)
+
+
+@pytest.fixture
+def expected(tcr_file, tmp_path, caplog):
+    out = str(tmp_path / 'expected.csv')
+    with caplog.at_level(logging.WARNING):
+        convert.convert_file(tcr_file, out, 'tenx', 'imgt', passthrough=True)
+    log = caplog.text
+    caplog.clear()
+    with open(out, 'rb') as f:
+        return f.read(), log
+
+
+# Records read before the crash, counting the header read first. The second
+# pass, which leaves j_gene as is, starts at record N_ROWS + 11.
+@pytest.mark.parametrize('die_at', [4, 120, N_ROWS + 60])
+def test_resume(tcr_file, expected, tmp_path, monkeypatch, caplog, die_at):
+    out = str(tmp_path / 'out.csv')
+    monkeypatch.setattr(checkpoint, 'CHECKPOINT_BYTES', 500)
+    real = stream.iter_records
+    read = [0]
+
+    def dying(f):
+        for record in real(f):
+            read[0] += 1
+            if read[0] == die_at:
+                raise KeyboardInterrupt
+            yield record
+
+    monkeypatch.setattr(stream, 'iter_records', dying)
+    with pytest.raises(KeyboardInterrupt):
+        convert.convert_file(
+            tcr_file, out, 'tenx', 'imgt', passthrough=True, checkpoint=True
+        )
+    assert os.path.exists(checkpoint.checkpoint_path(out))
+
+    monkeypatch.setattr(stream, 'iter_records', real)
+    caplog.clear()
+    with caplog.at_level(logging.WARNING):
+        convert.convert_file(
+            tcr_file, out, 'tenx', 'imgt', passthrough=True, resume=True
+        )
+
+    with open(out, 'rb') as f:
+        assert f.read() == expected[0]
+    assert caplog.text == expected[1]
+    assert not os.path.exists(checkpoint.checkpoint_path(out))
+
+
+def test_resume_without_checkpoint(tcr_file, expected, tmp_path):
+    out = str(tmp_path / 'out.csv')
+    convert.convert_file(
+        tcr_file, out, 'tenx', 'imgt', passthrough=True, resume=True, verbose=False
+    )
+    with open(out, 'rb') as f:
+        assert f.read() == expected[0]
+
+
+def test_resume_other_options(tcr_file, tmp_path):
+    out = str(tmp_path / 'out.csv')
+    open(out, 'w').close()
+    ckpt = checkpoint.Checkpoint(out, {'to': 'imgt'})
+    ckpt.save(set(), 0, 0, {})
+    assert ckpt.load() == {
+        'params': {'to': 'imgt'},
+        'skip': set(),
+        'offset': 0,
+        'output_bytes': 0,
+        'stats': {},
+    }
+    with pytest.raises(ValueError):
+        convert.convert_file(
+            tcr_file, out, 'tenx', 'imgt', passthrough=True, resume=True
+        )
+
+
+def test_checkpoint_cli(tcr_file, tmp_path):
+    out = str(tmp_path / 'out.csv')
+    args = ['convert', '-i', tcr_file, '-o', out, '-f', 'tenx', '-t', 'imgt']
+    result = CliRunner().invoke(cli.entry_point, args + ['--resume'])
+    assert result.exit_code != 0
+    assert '--passthrough' in result.output
+
+    result = CliRunner().invoke(
+        cli.entry_point, args + ['--passthrough', '--checkpoint']
+    )
+    assert result.exit_code == 0
+    assert os.path.exists(out)
+    assert not os.path.exists(checkpoint.checkpoint_path(out))
@@ -1,4 +1,5 @@
 import os
+import shutil
 import tempfile
 from click.testing import CliRunner
 from unittest.mock import patch
@@ -199,3 +200,55 @@ def test_convert_gene_cli_errors():
 
     assert result_out.exit_code != 0
     assert '"output" must be a .csv or .tsv file' in result_out.output
+
+
+def test_build_lookup_from_fastas_cli_force(tmp_path):
+    fastadir = utils.get_example_path('fasta_dir')
+
+    with patch('platformdirs.user_data_dir', return_value=str(tmp_path)):
+        for extra in [[], [], ['--force']]:
+            result = CliRunner().invoke(
+                cli.entry_point,
+                ['build', '-i', fastadir, '-s', 'rabbit'] + extra,
+                catch_exceptions=False,
+            )
+            assert result.exit_code == 0
+
+    assert os.path.exists(tmp_path / 'rabbit' / 'manifest.json')
+
+
+def test_build_all_lookups_cli(tmp_path):
+    root = tmp_path / 'refs'
+    for species in ['rabbit', 'llama']:
+        shutil.copytree(utils.get_example_path('fasta_dir'), root / species)
+    summary = tmp_path / 'summary.tsv'
+
+    with patch('platformdirs.user_data_dir', return_value=str(tmp_path / 'user')):
+        result = CliRunner().invoke(
+            cli.entry_point,
+            ['build-all', '-i', str(root), '-j', '2', '--summary', str(summary)],
+            catch_exceptions=False,
+        )
+
+    assert result.exit_code == 0
+    assert 'rabbit' in result.output
+    lines = summary.read_text().splitlines()
+    assert lines[0] == 'species\tstatus\timgt\ttenx\tadaptive\tseconds\terror'
+    assert lines[1].startswith('llama\tbuilt\t10\t8\t21\t')
+    assert lines[2].startswith('rabbit\tbuilt\t10\t8\t21\t')
+
+
+def test_convert_cli_multi_valued(tmp_path):
+    in_file = tmp_path / 'multi.tsv'
+    out_file = tmp_path / 'out.tsv'
+    in_file.write_text('vMaxResolved\tcdr3\nTCRBV12-03/12-04\tCASSF\n')
+
+    result = CliRunner().invoke(
+        cli.entry_point,
+        ['convert', '-i', str(in_file), '-o', str(out_file), '-f', 'adaptivev2']
+        + ['-t', 'tenx', '--multi-sep', '/', '--join-sep', ';'],
+        catch_exceptions=False,
+    )
+
+    assert result.exit_code == 0
+    assert out_file.read_text() == 'vMaxResolved\tcdr3\nTRBV12-3;TRBV12-4\tCASSF\n'
@@ -338,3 +338,117 @@ def test_convert_gene_verbose(caplog):
             'These genes are not in IMGT for this species and will be replaced with NA'
             in caplog.text
         )
+
+
+@pytest.mark.parametrize(
+    'dtype',
+    [
+        'string[python]',
+        'string[pyarrow]',
+        'arrow_string',
+        'arrow_dictionary',
+        'category',
+    ],
+)
+def test_convert_gene_keeps_dtype(dtype):
+    pa = pytest.importorskip('pyarrow')
+    dtype = {
+        'arrow_string': pd.ArrowDtype(pa.string()),
+        'arrow_dictionary': pd.ArrowDtype(pa.dictionary(pa.int32(), pa.string())),
+    }.get(dtype, dtype)
+    tenx_df_bad = pd.DataFrame(
+        {
+            'v_gene': ['TRAV12-1', 'TRBV15', 'BAD_V_GENE'],
+            'd_gene': [None, 'TRBD1', None],
+            'c_gene': ['TRAC', 'TRBC2', 'TRBC2'],
+            'cdr3': ['CAVLIF', 'CASSGF', 'CASSF'],
+        }
+    )
+    expected = convert.convert_gene(tenx_df_bad, 'tenx', 'adaptive', verbose=False)
+
+    typed_df = tenx_df_bad.astype(dtype)
+    out = convert.convert_gene(typed_df, 'tenx', 'adaptive', verbose=False)
+
+    for col in out.columns:
+        assert type(out[col].dtype) is type(typed_df[col].dtype)
+        if dtype != 'category':
+            assert out[col].dtype == typed_df[col].dtype
+    pd.testing.assert_frame_equal(
+        out.astype(object).where(out.notna(), None),
+        expected.astype(object).where(expected.notna(), None),
+    )
+
+
+def test_convert_gene_multi_valued(caplog):
+    df = pd.DataFrame(
+        {
+            'v_gene': [
+                'TRBV6-2*01,TRBV6-3*01',
+                'TRBV6-2*01, TRBV6-2*01',
+                'TRAV29/DV5*01',
+                'TRBV6-2*01,BAD_GENE',
+                'BAD_GENE,BAD_GENE_2',
+                None,
+            ],
+        }
+    )
+
+    # Off by default
+    out = convert.convert_gene(df, 'imgt', 'tenx', verbose=False)
+    assert out['v_gene'].isna().tolist() == [True, True, False, True, True, True]
+
+    caplog.clear()
+    out = convert.convert_gene(df, 'imgt', 'tenx', multi_sep=',/', verbose=False)
+    assert out['v_gene'].tolist()[:3] == ['TRBV6-2,TRBV6-3', 'TRBV6-2', 'TRAV29/DV5']
+    assert out['v_gene'].isna().tolist()[3:] == [True, True, True]
+    assert "'BAD_GENE,BAD_GENE_2', 'TRBV6-2*01,BAD_GENE'" in caplog.text
+
+    out = convert.convert_gene(
+        df, 'imgt', 'tenx', multi_sep=',/', join_sep='|', partial='drop', verbose=False
+    )
+    assert out['v_gene'].tolist()[:4] == [
+        'TRBV6-2|TRBV6-3',
+        'TRBV6-2',
+        'TRAV29/DV5',
+        'TRBV6-2',
+    ]
+    assert out['v_gene'].isna().tolist()[4:] == [True, True]
+
+    with pytest.raises(ValueError):
+        convert.convert_gene(df, 'imgt', 'tenx', multi_sep=',', partial='keep')
+
+
+def test_convert_gene_multi_valued_adaptive():
+    df = pd.DataFrame({'vMaxResolved': ['TCRBV12-03/12-04', 'TCRBV12-03*01']})
+    out = convert.convert_gene(df, 'adaptivev2', 'imgt', multi_sep='/', verbose=False)
+    assert out['vMaxResolved'].tolist() == ['TRBV12-3*01/TRBV12-4*01', 'TRBV12-3*01']
+
+
+def test_convert_gene_species_column(caplog):
+    df = pd.DataFrame(
+        {
+            'v_gene': ['TRAV12-1', 'TRAV12-1', 'TRBV15', 'BAD_GENE', None, 'TRAV12-1'],
+            'j_gene': ['TRAJ16', 'TRAJ16', 'TRBJ2-5', 'TRAJ16', 'TRAJ16', None],
+            'species': ['human', 'mouse', 'human', 'mouse', 'human', None],
+            'cdr3': ['CAVLIF', 'CASSGF', 'CASSF', 'CAVLF', 'CASF', 'CAF'],
+        }
+    )
+
+    with caplog.at_level(logging.WARNING):
+        out = convert.convert_gene(df, 'tenx', 'imgt', 'species')
+
+    # Same as converting each species on its own, in the original order
+    for sp in ['human', 'mouse']:
+        rows = df['species'] == sp
+        expected = convert.convert_gene(df[rows], 'tenx', 'imgt', sp, verbose=False)
+        pd.testing.assert_frame_equal(out[rows], expected)
+    assert pd.isna(out.loc[5, 'v_gene'])
+
+    assert "IMGT for mouse and will be replaced with NA:\n ['BAD_GENE']" in caplog.text
+    assert 'for human' not in caplog.text
+    assert "rows with no species in column 'species'" in caplog.text
+
+    with pytest.raises(FileNotFoundError):
+        convert.convert_gene(
+            df.fillna({'species': 'unicorn'}), 'tenx', 'imgt', 'species'
+        )
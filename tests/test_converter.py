@@ -0,0 +1,127 @@
+import os
+import pickle
+import shutil
+import multiprocessing
+import pytest
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import patch
+from tcrconvert import convert, converter, registry, utils
+
+tenx_df = pd.read_csv(utils.get_example_path('tenx.csv'))
+adapt_df = pd.read_csv(utils.get_example_path('adaptive.tsv'), sep='\t', dtype=str)
+imgt_df = pd.read_csv(utils.get_example_path('imgt.csv'))
+
+
+@pytest.fixture(scope='module')
+def conv():
+    return converter.Converter()
+
+
+@pytest.mark.parametrize(
+    'df, frm, to, species',
+    [
+        (tenx_df, 'tenx', 'imgt', 'human'),
+        (tenx_df, 'tenx', 'adaptive', 'mouse'),
+        (adapt_df, 'adaptivev2', 'imgt', 'human'),
+        (adapt_df, 'adaptivev2', 'tenx', 'rhesus'),
+        (imgt_df, 'imgt', 'adaptivev2', 'human'),
+        (imgt_df, 'imgt', 'tenx', 'mouse'),
+    ],
+)
+def test_converter_matches_convert_gene(conv, df, frm, to, species):
+    expected = convert.convert_gene(df, frm, to, species, verbose=False)
+    result = conv.convert(df, frm, to, species, verbose=False)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_converter_custom_columns(conv):
+    df = pd.read_csv(utils.get_example_path('customcols.csv'))
+    cols = ['myVgene', 'myDgene', 'myJgene', 'myCgene', 'myCDR3']
+    expected = convert.convert_gene(df, 'tenx', 'imgt', 'mouse', cols, verbose=False)
+    result = conv.convert(df, 'tenx', 'imgt', 'mouse', cols, verbose=False)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_converter_missing_targets(tmp_path):
+    # A lookup table where some genes have no Adaptive name
+    user_dir = tmp_path / 'user'
+    shutil.copytree(
+        os.path.join(registry.lookup_dirs()[0], 'human'), user_dir / 'rabbit'
+    )
+    lookup_f = str(user_dir / 'rabbit' / 'lookup.csv')
+    lookup = pd.read_csv(lookup_f)
+    lookup.loc[lookup['imgt'].isin(['TRAC*01', 'TRAV1-2*01']), 'adaptive'] = None
+    lookup.to_csv(lookup_f, index=False)
+    df = pd.DataFrame(
+        {'v_gene': ['TRAV1-2*01', 'TRAV1-1*01'], 'c_gene': ['TRAC*01'] * 2}
+    )
+
+    with patch('platformdirs.user_data_dir', return_value=str(user_dir)):
+        mapping = converter.Converter(['rabbit']).mapping('imgt', 'adaptive', 'rabbit')
+        expected = convert.lookup_mapping(pd.read_csv(lookup_f), 'imgt', 'adaptive')
+        assert pd.isna(mapping['TRAC*01'])
+        pd.testing.assert_series_equal(pd.Series(mapping), pd.Series(expected))
+        pd.testing.assert_frame_equal(
+            converter.Converter(['rabbit']).convert(
+                df, 'imgt', 'adaptive', 'rabbit', verbose=False
+            ),
+            convert.convert_gene(df, 'imgt', 'adaptive', 'rabbit', verbose=False),
+        )
+
+
+def test_converter_errors(conv):
+    with pytest.raises(ValueError):
+        conv.convert(tenx_df, 'tenx', 'tenx')
+    with pytest.raises(ValueError):
+        conv.convert(tenx_df, 'tenx', 'imgt', 'rabbit')
+    with pytest.raises(FileNotFoundError):
+        converter.Converter(['non-existent-species'])
+
+
+def test_converter_compact(conv):
+    assert conv.species == ['human', 'mouse', 'rhesus']
+    # Gene names are stored once across all tables and species
+    assert len(conv._names) == len(set(conv._names))
+    assert conv.nbytes < 200_000
+    clone = pickle.loads(pickle.dumps(conv))
+    pd.testing.assert_frame_equal(
+        clone.convert(tenx_df, 'tenx', 'imgt', verbose=False),
+        conv.convert(tenx_df, 'tenx', 'imgt', verbose=False),
+    )
+
+
+def convert_in_worker(conv, df):
+    return conv.convert(df, 'tenx', 'adaptive', 'human', verbose=False)
+
+
+def test_converter_shared_memory():
+    expected = convert.convert_gene(tenx_df, 'tenx', 'adaptive', verbose=False)
+
+    with converter.Converter(['human', 'mouse']).share() as conv:
+        # Pickles carry only the shared memory block names
+        payload = pickle.dumps(conv)
+        assert len(payload) < 1_000
+
+        clone = pickle.loads(payload)
+        assert not clone._codes[('human', 'tenx')].flags.writeable
+        pd.testing.assert_frame_equal(
+            clone.convert(tenx_df, 'tenx', 'adaptive', verbose=False), expected
+        )
+        clone.close()
+
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=2, mp_context=ctx) as pool:
+            results = list(pool.map(convert_in_worker, [conv] * 4, [tenx_df] * 4))
+        for result in results:
+            pd.testing.assert_frame_equal(result, expected)
+
+    assert conv._shm is None
+
+
+def test_converter_species_column(conv):
+    df = pd.concat([tenx_df.assign(species=sp) for sp in ['human', 'mouse']])
+    df = df.sample(frac=1, random_state=0).reset_index(drop=True)
+    expected = convert.convert_gene(df, 'tenx', 'imgt', 'species', verbose=False)
+    result = conv.convert(df, 'tenx', 'imgt', 'species', verbose=False)
+    pd.testing.assert_frame_equal(result, expected)
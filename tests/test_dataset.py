@@ -0,0 +1,155 @@
+import os
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from tcrconvert import cli, convert
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from tcrconvert.dataset import convert_dataset, parse_filter
+
+lake_df = pd.DataFrame(
+    {
+        'study': ['S1', 'S1', 'S1', 'S2', 'S2', 'S3'],
+        'sample': ['A', 'A', 'B', 'A', 'C', 'A'],
+        'v_gene': ['TRAV1-2', 'TRBV15', 'BAD_V', 'TRBV15', 'TRAV12-1', 'TRBV15'],
+        'j_gene': ['TRAJ16', 'TRBJ2-5', 'TRAJ16', None, 'TRAJ16', 'TRBJ2-5'],
+        'productive': [True, False, True, True, True, False],
+        'reads': [5, 10, 15, 20, 25, 30],
+    }
+)
+
+
+@pytest.fixture
+def lake(tmp_path):
+    path = str(tmp_path / 'lake')
+    ds.write_dataset(
+        pa.Table.from_pandas(lake_df, preserve_index=False),
+        path,
+        format='parquet',
+        partitioning=['study', 'sample'],
+        partitioning_flavor='hive',
+    )
+    return path
+
+
+def read_output(path):
+    table = ds.dataset(path, format='parquet', partitioning='hive').to_table()
+    return table.to_pandas().sort_values('reads', ignore_index=True)
+
+
+def test_convert_dataset_keeps_layout(lake, tmp_path):
+    out = str(tmp_path / 'out')
+    summary = convert_dataset(lake, out, 'tenx', 'imgt', verbose=False)
+
+    assert sorted(summary['fragment']) == sorted(
+        os.path.relpath(f, lake) for f in ds.dataset(lake, format='parquet').files
+    )
+    assert summary['rows'].sum() == len(lake_df)
+
+    got = read_output(out)
+    expected = convert.convert_gene(lake_df, 'tenx', 'imgt', verbose=False)
+    assert (
+        got['v_gene'].fillna('NA').tolist() == expected['v_gene'].fillna('NA').tolist()
+    )
+    assert got['study'].tolist() == lake_df['study'].tolist()
+    # Partition keys are only in the folder names
+    one = os.path.join(out, summary['fragment'][0])
+    assert pq.read_schema(one).names == ['v_gene', 'j_gene', 'productive', 'reads']
+
+
+def test_convert_dataset_filters_and_selects(lake, tmp_path):
+    out = str(tmp_path / 'out')
+    summary = convert_dataset(
+        lake,
+        out,
+        'tenx',
+        'imgt',
+        where=['study in S1,S2', 'productive = true', 'reads > 10'],
+        select=['v_gene', 'reads'],
+        verbose=False,
+    )
+
+    # No row of S1/A passes, so it is not written
+    assert sorted(summary['fragment'].str.split('/').str[:2].str.join('/')) == [
+        'study=S1/sample=B',
+        'study=S2/sample=A',
+        'study=S2/sample=C',
+    ]
+    got = read_output(out)
+    assert got['reads'].tolist() == [15, 20, 25]
+    assert got['v_gene'].tolist() == [None, 'TRBV15*01', 'TRAV12-1*01']
+    assert pq.read_schema(os.path.join(out, summary['fragment'][0])).names == [
+        'v_gene',
+        'reads',
+    ]
+
+
+def test_convert_dataset_in_parallel(lake, tmp_path):
+    serial = str(tmp_path / 'serial')
+    par = str(tmp_path / 'parallel')
+    convert_dataset(lake, serial, 'tenx', 'adaptive', verbose=False)
+    convert_dataset(lake, par, 'tenx', 'adaptive', n_jobs=2, verbose=False)
+
+    pd.testing.assert_frame_equal(read_output(serial), read_output(par))
+
+
+def test_parse_filter_casts_values():
+    schema = pa.schema([('reads', pa.int64()), ('study', pa.string())])
+    table = pa.table({'reads': [5, 10, 15], 'study': ['S1', 'S2', "S'3"]})
+
+    def rows(text):
+        expr = parse_filter(text, schema)
+        return ds.dataset(table).to_table(filter=expr).column('reads').to_pylist()
+
+    assert rows('reads >= 10') == [10, 15]
+    assert rows('reads!=10') == [5, 15]
+    assert rows('study == "S1"') == [5]
+    assert rows('study in S2, "S\'3"') == [10, 15]
+
+
+@pytest.mark.parametrize('text', ['reads', 'nope = 1', 'reads = many'])
+def test_parse_filter_errors(text):
+    schema = pa.schema([('reads', pa.int64())])
+    with pytest.raises(ValueError):
+        parse_filter(text, schema)
+
+
+def test_convert_dataset_errors(lake, tmp_path):
+    with pytest.raises(ValueError):
+        convert_dataset(lake, os.path.join(lake, 'out'), 'tenx', 'imgt')
+    with pytest.raises(ValueError):
+        convert_dataset(lake, str(tmp_path / 'out'), 'tenx', 'imgt', select=['x'])
+    # Files of an earlier run could be mistaken for part of this one
+    convert_dataset(lake, str(tmp_path / 'out'), 'tenx', 'imgt', verbose=False)
+    with pytest.raises(ValueError):
+        convert_dataset(lake, str(tmp_path / 'out'), 'tenx', 'imgt', where='study = S1')
+    with pytest.raises(FileNotFoundError):
+        convert_dataset(str(tmp_path / 'none'), str(tmp_path / 'new'), 'tenx', 'imgt')
+
+
+def test_dataset_cli(lake, tmp_path):
+    out = str(tmp_path / 'out')
+    result = CliRunner().invoke(
+        cli.entry_point,
+        [
+            'dataset',
+            '-i',
+            lake,
+            '-o',
+            out,
+            '-f',
+            'tenx',
+            '-t',
+            'imgt',
+            '-w',
+            'study = S3',
+            '-v',
+            'False',
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert os.listdir(out) == ['study=S3']
+    assert read_output(out)['v_gene'].tolist() == ['TRBV15*01']
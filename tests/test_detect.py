@@ -0,0 +1,103 @@
+import logging
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from tcrconvert import cli, convert, detect, utils
+
+
+@pytest.mark.parametrize(
+    'example, frm, columns',
+    [
+        ('tenx.csv', 'tenx', ['v_gene', 'd_gene', 'j_gene', 'c_gene']),
+        (
+            'adaptive.tsv',
+            'adaptivev2',
+            ['vMaxResolved', 'dMaxResolved', 'jMaxResolved'],
+        ),
+        ('imgt.csv', 'imgt', ['vGene', 'Jgene']),
+        ('customcols.csv', 'tenx', ['myVgene', 'myDgene', 'myJgene', 'myCgene']),
+    ],
+)
+def test_detect_format(example, frm, columns):
+    found = detect.detect_format(utils.get_example_path(example), verbose=False)
+
+    assert found['frm'] == frm
+    assert found['columns'] == columns
+    assert found['species'] == 'human'
+    assert found['confidence'] == 1.0
+
+
+def test_detect_format_dataframe():
+    df = pd.DataFrame(
+        {
+            'v_resolved': ['TCRAV12-01*01', 'TCRBV15-01*01'],
+            'j_resolved': ['TCRAJ16-01*01', None],
+            'cdr3': ['CAVLIF', 'CASSGF'],
+        }
+    )
+    found = detect.detect_format(df, 'human', verbose=False)
+
+    assert found['frm'] == 'adaptive'
+    assert found['columns'] == ['v_resolved', 'j_resolved']
+
+    # Only the first rows are looked at
+    df = pd.concat([df, pd.DataFrame({'cdr3': ['TRAV1-2'] * 10})])
+    assert detect.detect_format(df, n_rows=2, verbose=False)['frm'] == 'adaptive'
+
+
+def test_detect_format_errors(caplog):
+    mixed = pd.DataFrame(
+        {
+            'a': ['TRAV12-1', 'TRBV15', 'TRAJ16'],
+            'b': ['TRAV12-1*01', 'TRBV15*01', 'TRAJ16*01'],
+        }
+    )
+    with caplog.at_level(logging.ERROR):
+        with pytest.raises(ValueError):
+            detect.detect_format(mixed, verbose=False)
+        assert 'Input format is ambiguous' in caplog.text
+
+    caplog.clear()
+    with caplog.at_level(logging.ERROR):
+        with pytest.raises(ValueError):
+            detect.detect_format(pd.DataFrame({'x': ['a', 'b']}), verbose=False)
+        assert 'Could not find any gene columns' in caplog.text
+
+    with pytest.raises(ValueError):
+        detect.detect_format(pd.DataFrame({'x': []}), verbose=False)
+
+
+def test_convert_file_auto(tmp_path):
+    in_file = utils.get_example_path('tenx.csv')
+    auto = str(tmp_path / 'auto.csv')
+    explicit = str(tmp_path / 'explicit.csv')
+
+    convert.convert_file(in_file, auto, 'auto', 'imgt', verbose=False)
+    convert.convert_file(in_file, explicit, 'tenx', 'imgt', verbose=False)
+
+    with open(auto) as a, open(explicit) as b:
+        assert a.read() == b.read()
+
+
+def test_convert_gene_cli_auto(tmp_path, caplog):
+    out_file = str(tmp_path / 'out.tsv')
+    result = CliRunner().invoke(
+        cli.entry_point,
+        [
+            'convert',
+            '-i',
+            utils.get_example_path('adaptive.tsv'),
+            '-o',
+            out_file,
+            '-f',
+            'auto',
+            '-t',
+            'imgt',
+        ],
+        catch_exceptions=False,
+    )
+
+    assert result.exit_code == 0
+    assert "Detected 'adaptivev2' gene names for human" in caplog.text
+    out = pd.read_csv(out_file, sep='\t', dtype=str)
+    assert out['vMaxResolved'].iloc[0] == 'TRBV14*01'
@@ -0,0 +1,123 @@
+import logging
+import pandas as pd
+import pytest
+from tcrconvert import convert, utils
+
+duckdb = pytest.importorskip('duckdb')
+from tcrconvert.duckdb import (
+    convert_relation,
+    lookup_relation,
+    register_lookups,
+)
+
+
+@pytest.fixture(scope='module')
+def con():
+    return register_lookups(duckdb.connect(), ['human', 'mouse'])
+
+
+def as_lists(df):
+    return {col: [None if pd.isna(x) else x for x in df[col]] for col in df.columns}
+
+
+@pytest.mark.parametrize(
+    'example, sep, frm, to, species',
+    [
+        ('tenx.csv', ',', 'tenx', 'imgt', 'human'),
+        ('tenx.csv', ',', 'tenx', 'adaptive', 'mouse'),
+        ('adaptive.tsv', '\t', 'adaptivev2', 'imgt', 'human'),
+        ('adaptive.tsv', '\t', 'adaptivev2', 'tenx', 'human'),
+        ('imgt.csv', ',', 'imgt', 'adaptivev2', 'human'),
+    ],
+)
+def test_convert_relation_matches_convert_gene(con, example, sep, frm, to, species):
+    df = pd.read_csv(utils.get_example_path(example), sep=sep, dtype=str)
+    expected = convert.convert_gene(df, frm, to, species, verbose=False)
+
+    con.register('tcrs', df)
+    out = convert_relation(con, 'tcrs', frm, to, species, verbose=False).df()
+
+    assert list(out.columns) == list(df.columns)
+    assert as_lists(out) == as_lists(expected)
+
+
+def test_tcr_convert_macro(con):
+    rows = con.sql(
+        """
+        SELECT tcr_convert(gene, 'tenx', 'imgt'),
+               tcr_convert(gene, 'tenx', 'imgt', species := 'mouse')
+        FROM (VALUES ('TRAV12-1'), ('TRBV15'), ('BAD_GENE'), (NULL)) AS t(gene)
+        """
+    ).fetchall()
+
+    mapping = convert.lookup_mapping(
+        convert.read_lookup(convert.choose_lookup('tenx', 'imgt', 'mouse')),
+        'tenx',
+        'imgt',
+    )
+    assert rows[0] == ('TRAV12-1*01', mapping.get('TRAV12-1'))
+    assert rows[1][0] == 'TRBV15*01'
+    assert rows[2:] == [(None, None), (None, None)]
+
+    # NoData maps to NULL
+    table = lookup_relation('human')
+    nodata = table[
+        (table['from_format'] == 'tenx') & (table['to_format'] == 'adaptive')
+    ]
+    gene = nodata.loc[nodata['to_gene'].isna(), 'from_gene'].iloc[0]
+    assert con.execute(
+        "SELECT tcr_convert(?, 'tenx', 'adaptive')", [gene]
+    ).fetchone() == (None,)
+
+
+def test_convert_relation_parquet(con, tmp_path):
+    tcr_file = utils.get_example_path('tenx.csv')
+    path = str(tmp_path / 'tcrs.parquet')
+    out_path = str(tmp_path / 'out.parquet')
+    con.execute(f"COPY (SELECT * FROM read_csv('{tcr_file}')) TO '{path}'")
+
+    rel = convert_relation(
+        con, f"read_parquet('{path}')", 'tenx', 'imgt', verbose=False
+    )
+    rel.write_parquet(out_path)
+    out = con.sql(f"SELECT * FROM read_parquet('{out_path}')").df()
+
+    cols = ['v_gene', 'j_gene', 'c_gene']
+    expected = convert.convert_gene(
+        pd.read_csv(tcr_file, dtype=str), 'tenx', 'imgt', verbose=False
+    )
+    assert as_lists(out[cols]) == as_lists(expected[cols])
+
+
+def test_convert_relation_checks(con, caplog):
+    df = pd.DataFrame(
+        {
+            'v_gene': ['TRAV12-1', 'BAD_GENE', None],
+            'cdr3': ['CASSF', 'CASSGF', 'CAVLF'],
+        }
+    )
+    con.register('tcrs', df)
+
+    with caplog.at_level(logging.WARNING):
+        out = convert_relation(
+            con, 'tcrs', 'tenx', 'imgt', frm_cols=['v_gene', 'cdr3'], verbose=False
+        ).df()
+    assert "'cdr3' doesn't contain any valid genes" in caplog.text
+    assert "['BAD_GENE']" in caplog.text
+    assert as_lists(out) == {
+        'v_gene': ['TRAV12-1*01', None, None],
+        'cdr3': ['CASSF', 'CASSGF', 'CAVLF'],
+    }
+
+    # Without checks every gene column is converted lazily
+    out = convert_relation(
+        con, 'tcrs', 'tenx', 'imgt', frm_cols=['v_gene', 'cdr3'], check=False
+    ).df()
+    assert out['cdr3'].isna().all()
+
+    with pytest.raises(ValueError):
+        convert_relation(con, 'tcrs', 'tenx', 'tenx')
+    with pytest.raises(ValueError):
+        convert_relation(con, 'tcrs', 'tenx', 'imgt', frm_cols=['missing'])
+    with pytest.raises(ValueError):
+        convert_relation(con, '(SELECT * FROM tcrs LIMIT 0)', 'tenx', 'imgt')
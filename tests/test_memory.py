@@ -0,0 +1,157 @@
+"""Peak memory per input row, checked against a budget
+
+Each measurement runs in a fresh interpreter that records the tracemalloc
+peak of the call and the RSS high-water mark of the whole process. Memory
+per row is the slope between two input sizes, so the fixed cost of the
+interpreter, pandas and the lookup tables cancels out. Budgets are in
+``tests/data/memory_budget.json``; raise them only on purpose.
+
+Run ``python -m tests.test_memory report`` to print the current numbers.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+import numpy as np
+import pandas as pd
+import pytest
+from tcrconvert import convert
+
+BUDGET_FILE = os.path.join(os.path.dirname(__file__), 'data', 'memory_budget.json')
+
+
+def make_tcr_file(path, n_rows, unmapped=0.05, seed=0):
+    """Write a 10X-style CSV with ``n_rows`` rows of known and unknown genes"""
+
+    rng = np.random.default_rng(seed)
+    lookup = convert.read_lookup(convert.choose_lookup('tenx', 'imgt', verbose=False))
+    df = pd.DataFrame({'barcode': [f'BC{i:09d}-1' for i in range(n_rows)]})
+    for col, prefix in [
+        ('v_gene', 'V'),
+        ('d_gene', 'D'),
+        ('j_gene', 'J'),
+        ('c_gene', 'C'),
+    ]:
+        genes = lookup['tenx'][lookup['tenx'].str[3] == prefix].to_numpy()
+        values = rng.choice(genes, n_rows).astype(object)
+        values[rng.random(n_rows) < unmapped] = f'TRB{prefix}999'
+        df[col] = values
+    df['cdr3'] = rng.choice(
+        ['CASSLGQAYEQYF', 'CAVMDSSYKLIF', 'CASSGLAGGYNEQFF'], n_rows
+    )
+    df['reads'] = rng.integers(1, 10000, n_rows)
+    df.to_csv(path, index=False)
+
+
+def make_fasta_dir(path, n_genes):
+    """Write an IMGT-style FASTA folder with ``n_genes`` gene records"""
+
+    os.makedirs(path)
+    with open(os.path.join(path, 'genes.fa'), 'w') as f:
+        for i in range(n_genes):
+            name = f'TRBV{i // 4 + 1}-{i % 4 + 1}*0{i % 3 + 1}'
+            f.write(f'>X{i}|{name}|Homo sapiens|F|V-REGION|1..60|60 nt|1| | | | |\n')
+            f.write('acgt' * 15 + '\n')
+
+
+def rss_high_water():
+    """RSS high-water mark of this process in bytes"""
+
+    import resource
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def probe(kind, workdir):
+    """Run one workload on the input in ``workdir`` and return its peak memory"""
+
+    from unittest.mock import patch
+    from tcrconvert import build_lookup, cli
+
+    in_file = os.path.join(workdir, 'in.csv')
+    fasta_dir = os.path.join(workdir, 'fasta')
+
+    if kind == 'convert_gene':
+        df = pd.read_csv(in_file, dtype=str)
+        tracemalloc.start()
+        convert.convert_gene(df, 'tenx', 'imgt', verbose=False)
+    elif kind == 'cli':
+        args = ['convert', '-i', in_file, '-o', os.path.join(workdir, 'out.csv')]
+        tracemalloc.start()
+        cli.entry_point.main(
+            args + ['-f', 'tenx', '-t', 'imgt', '-v', 'False'], standalone_mode=False
+        )
+    else:
+        user_dir = os.path.join(workdir, 'data')
+        with patch('platformdirs.user_data_dir', return_value=user_dir):
+            tracemalloc.start()
+            build_lookup.build_lookup_from_fastas(fasta_dir, 'synthetic')
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'tracemalloc': peak, 'rss': rss_high_water()}
+
+
+def measure(kind, size, workdir):
+    """Generate an input of ``size`` rows and run ``probe()`` on it in a fresh interpreter"""
+
+    os.makedirs(workdir)
+    if kind == 'build':
+        make_fasta_dir(os.path.join(workdir, 'fasta'), size)
+    else:
+        make_tcr_file(os.path.join(workdir, 'in.csv'), size)
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [root, env.get('PYTHONPATH')]))
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), 'probe', kind, workdir],
+        check=True,
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    return json.loads(out.stdout.splitlines()[-1])
+
+
+def per_row(kind, sizes, workdir):
+    """Peak memory per input row, as the slope between two input sizes"""
+
+    small, large = sizes
+    a = measure(kind, small, os.path.join(workdir, 'small'))
+    b = measure(kind, large, os.path.join(workdir, 'large'))
+    return {key: (b[key] - a[key]) / (large - small) for key in a}
+
+
+with open(BUDGET_FILE) as f:
+    BUDGET = json.load(f)
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='needs the resource module')
+@pytest.mark.parametrize('kind', list(BUDGET))
+def test_peak_memory_per_row(kind, tmp_path):
+    budget = BUDGET[kind]
+    used = per_row(kind, budget['sizes'], str(tmp_path))
+
+    for key in ['tracemalloc', 'rss']:
+        limit = budget[f'{key}_bytes_per_row']
+        assert used[key] <= limit, (
+            f'{kind}: {used[key]:.0f} {key} bytes per row is over the budget of {limit}'
+        )
+
+
+if __name__ == '__main__':
+    if sys.argv[1] == 'probe':
+        _, _, kind, workdir = sys.argv
+        print(json.dumps(probe(kind, workdir)))
+    else:
+        import tempfile
+
+        for kind, budget in BUDGET.items():
+            with tempfile.TemporaryDirectory() as tmp:
+                used = per_row(kind, budget['sizes'], tmp)
+            print(kind, {key: round(value) for key, value in used.items()})
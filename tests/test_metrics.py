@@ -0,0 +1,150 @@
+import os
+import pytest
+from unittest.mock import patch
+from click.testing import CliRunner
+from tcrconvert import cli, convert, registry, utils
+from tcrconvert.metrics import Metrics, record_metrics
+
+
+def parse(text):
+    samples = {}
+    for line in text.splitlines():
+        if not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_render():
+    metrics = Metrics(species='hu"man')
+    metrics.inc('tcrconvert_rows', 3)
+    metrics.inc('tcrconvert_rows', 2)
+    metrics.set('tcrconvert_stage_seconds', 0.5, stage='read')
+    metrics.add_unmapped(['A', 'B'])
+    metrics.add_unmapped(['B'])
+
+    assert metrics.render() == (
+        '# TYPE tcrconvert_rows counter\n'
+        '# HELP tcrconvert_rows Input rows processed.\n'
+        'tcrconvert_rows_total{species="hu\\"man"} 5\n'
+        '# TYPE tcrconvert_unmapped_genes gauge\n'
+        '# HELP tcrconvert_unmapped_genes Distinct gene names that could not be converted.\n'
+        'tcrconvert_unmapped_genes{species="hu\\"man"} 2\n'
+        '# TYPE tcrconvert_stage_seconds gauge\n'
+        '# UNIT tcrconvert_stage_seconds seconds\n'
+        '# HELP tcrconvert_stage_seconds Wall time spent in each stage.\n'
+        'tcrconvert_stage_seconds{species="hu\\"man",stage="read"} 0.5\n'
+        '# EOF\n'
+    )
+
+    with pytest.raises(KeyError):
+        metrics.inc('tcrconvert_typo')
+
+
+@pytest.mark.parametrize('passthrough', [False, True])
+def test_convert_file_metrics(tmp_path, passthrough):
+    in_file = tmp_path / 'in.csv'
+    in_file.write_text(
+        'v_gene,j_gene,c_gene\nTRBV15,BAD_J,TRAC\nBAD_V,BAD_J2,\nBAD_V,BAD_J,TRAC\n'
+    )
+    out_file = str(tmp_path / 'out.csv')
+    metrics = Metrics()
+
+    convert.convert_file(
+        str(in_file),
+        out_file,
+        'tenx',
+        'imgt',
+        verbose=False,
+        passthrough=passthrough,
+        metrics=metrics,
+    )
+
+    assert metrics.value('tcrconvert_rows') == 3
+    assert metrics.value('tcrconvert_unmapped_rows', column='v_gene') == 2
+    assert metrics.value('tcrconvert_unmapped_rows', column='c_gene') == 0
+    assert metrics.value('tcrconvert_unmapped_rows', column='j_gene') is None
+    assert metrics.value('tcrconvert_skipped_columns', column='j_gene') == 1
+    assert metrics.value('tcrconvert_unmapped_genes') == 1
+    assert metrics.value('tcrconvert_read_bytes') == os.path.getsize(in_file)
+    assert metrics.value('tcrconvert_written_bytes') == os.path.getsize(out_file)
+    assert metrics.value('tcrconvert_lookup_load_seconds') > 0
+    stage = 'splice' if passthrough else 'write'
+    assert metrics.value('tcrconvert_stage_seconds', stage=stage) > 0
+
+
+def test_record_metrics_failure(tmp_path):
+    path = tmp_path / 'job.prom'
+    with pytest.raises(ValueError), record_metrics(str(path), command='test') as m:
+        m.inc('tcrconvert_rows', 1)
+        raise ValueError
+
+    samples = parse(path.read_text())
+    assert samples['tcrconvert_rows_total{command="test"}'] == 1
+    assert samples['tcrconvert_last_run_success{command="test"}'] == 0
+    assert os.listdir(tmp_path) == ['job.prom']
+
+    with record_metrics(None) as metrics:
+        assert metrics is None
+
+
+def test_convert_gene_cli_metrics(tmp_path):
+    metrics_file = tmp_path / 'convert.prom'
+    result = CliRunner().invoke(
+        cli.entry_point,
+        [
+            'convert',
+            '-i',
+            utils.get_example_path('tenx.csv'),
+            '-o',
+            str(tmp_path / 'out.tsv'),
+            '-f',
+            'tenx',
+            '-t',
+            'adaptive',
+            '--metrics-file',
+            str(metrics_file),
+        ],
+        catch_exceptions=False,
+    )
+
+    assert result.exit_code == 0
+    text = metrics_file.read_text()
+    assert text.endswith('# EOF\n')
+    samples = parse(text)
+    labels = 'command="convert",frm="tenx",species="human",to="adaptive"'
+    assert samples[f'tcrconvert_rows_total{{{labels}}}'] == 4
+    assert samples[f'tcrconvert_last_run_success{{{labels}}}'] == 1
+    assert (
+        'tcrconvert_stage_seconds{command="convert",frm="tenx",species="human",'
+        'stage="read",to="adaptive"}' in samples
+    )
+
+
+def test_build_lookup_from_fastas_cli_metrics(tmp_path):
+    metrics_file = tmp_path / 'build.prom'
+    args = [
+        'build',
+        '-i',
+        utils.get_example_path('fasta_dir'),
+        '-s',
+        'rabbit',
+        '--metrics-file',
+        str(metrics_file),
+    ]
+
+    with patch('platformdirs.user_data_dir', return_value=str(tmp_path / 'data')):
+        result = CliRunner().invoke(cli.entry_point, args, catch_exceptions=False)
+        assert result.exit_code == 0
+        samples = parse(metrics_file.read_text())
+        labels = 'command="build",species="rabbit"'
+        assert samples[f'tcrconvert_lookup_built{{{labels}}}'] == 1
+        assert samples[f'tcrconvert_lookup_genes{{{labels},table="lookup.csv"}}'] == 10
+        assert samples[f'tcrconvert_read_bytes_total{{{labels}}}'] > 0
+        assert samples[f'tcrconvert_written_bytes_total{{{labels}}}'] > 0
+
+        # Second build is skipped
+        result = CliRunner().invoke(cli.entry_point, args, catch_exceptions=False)
+        samples = parse(metrics_file.read_text())
+        assert samples[f'tcrconvert_lookup_built{{{labels}}}'] == 0
+    registry.refresh()
@@ -0,0 +1,86 @@
+import logging
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+from tcrconvert import convert, converter, parallel
+
+
+@pytest.fixture
+def tcr_df():
+    rng = np.random.default_rng(1)
+    n = 3000
+    genes = ['TRAV12-1', 'TRBV15', 'TRAV29/DV5', 'TRBV20/OR9-2', 'BAD_V', None]
+    return pd.DataFrame(
+        {
+            'v_gene': rng.choice(np.array(genes, dtype=object), n),
+            'j_gene': rng.choice(
+                np.array(['TRAJ16', 'TRBJ2-5', 'BAD_J'], dtype=object), n
+            ),
+            'c_gene': rng.choice(np.array(['TRAC', 'TRBC2', np.nan], dtype=object), n),
+            'myCDR3': rng.choice(np.array(['CAVLIF', 'CASSGF'], dtype=object), n),
+            'reads': rng.integers(0, 100, n),
+        }
+    )
+
+
+def test_resolve_jobs(monkeypatch):
+    monkeypatch.setattr('os.cpu_count', lambda: 8)
+    assert parallel.resolve_jobs(None) == 1
+    assert parallel.resolve_jobs(3) == 3
+    assert parallel.resolve_jobs(-1) == 8
+    assert parallel.resolve_jobs(-2) == 7
+    assert parallel.use_parallel(10, 4, min_rows=100) == 1
+    assert parallel.use_parallel(100, 4, min_rows=100) == 4
+    assert parallel.use_parallel(10**9, None) == 1
+    assert parallel.use_parallel(100, 16, min_rows=100) == 8
+
+
+def test_convert_gene_parallel(tcr_df, monkeypatch, caplog):
+    cols = ['v_gene', 'j_gene', 'c_gene', 'myCDR3']
+    with caplog.at_level(logging.WARNING):
+        expected = convert.convert_gene(tcr_df, 'tenx', 'adaptive', frm_cols=cols)
+    serial_log = caplog.text
+
+    monkeypatch.setattr(parallel, 'MIN_PARALLEL_ROWS', 1000)
+    monkeypatch.setattr('os.cpu_count', lambda: 4)
+    caplog.clear()
+    with caplog.at_level(logging.WARNING):
+        out = convert.convert_gene(tcr_df, 'tenx', 'adaptive', frm_cols=cols, n_jobs=3)
+
+    pd.testing.assert_frame_equal(out, expected)
+    assert caplog.text == serial_log
+    assert "['BAD_J', 'BAD_V']" in caplog.text
+    assert "The input column 'myCDR3' doesn't contain any valid genes" in caplog.text
+
+
+def test_convert_gene_parallel_fallback(tcr_df, monkeypatch):
+    def fail(*args):
+        raise AssertionError('small inputs should not start a process pool')
+
+    monkeypatch.setattr(parallel, 'map_columns_parallel', fail)
+    out = convert.convert_gene(tcr_df, 'tenx', 'imgt', verbose=False, n_jobs=4)
+    assert out['v_gene'].notna().any()
+
+
+def test_workers_attach_to_shared_tables(tcr_df, monkeypatch):
+    payloads = []
+    pool = parallel.ProcessPoolExecutor
+
+    def recording_pool(*args, initargs=(), **kwargs):
+        payloads.append(pickle.dumps(initargs))
+        return pool(*args, initargs=initargs, **kwargs)
+
+    monkeypatch.setattr(parallel, 'ProcessPoolExecutor', recording_pool)
+    monkeypatch.setattr(parallel, 'MIN_PARALLEL_ROWS', 1000)
+    monkeypatch.setattr('os.cpu_count', lambda: 4)
+    expected = convert.convert_gene(tcr_df, 'tenx', 'imgt', verbose=False)
+    out = convert.convert_gene(tcr_df, 'tenx', 'imgt', verbose=False, n_jobs=2)
+    with converter.Converter(['human']).share() as conv:
+        from_conv = conv.convert(tcr_df, 'tenx', 'imgt', verbose=False, n_jobs=2)
+
+    pd.testing.assert_frame_equal(out, expected)
+    pd.testing.assert_frame_equal(from_conv, expected)
+    # Only shared memory block names are sent, not the gene names
+    assert len(payloads) == 2
+    assert all(len(p) < 1_000 for p in payloads)
@@ -0,0 +1,82 @@
+import os
+import pytest
+import pandas as pd
+from importlib.resources import files
+from unittest.mock import patch
+from click.testing import CliRunner
+from tcrconvert import build_lookup, cli, convert, registry, utils
+
+
+@pytest.fixture
+def user_dir(tmp_path):
+    registry.refresh()
+    with patch('platformdirs.user_data_dir', return_value=str(tmp_path)):
+        yield tmp_path
+    registry.refresh()
+
+
+def test_list_species_bundled(user_dir):
+    out = registry.list_species()
+    assert out['species'].tolist() == ['human', 'mouse', 'rhesus']
+    assert (out['source'] == 'bundled').all()
+
+    human = out.iloc[0]
+    data_dir = os.path.join(files('tcrconvert'), 'data', 'human')
+    assert human['path'] == data_dir
+    assert human['imgt'] == len(pd.read_csv(os.path.join(data_dir, 'lookup.csv')))
+    assert human['adaptive'] == len(
+        pd.read_csv(os.path.join(data_dir, 'lookup_from_adaptive.csv'))
+    )
+    assert human['formats'] == ['imgt', 'tenx', 'adaptive', 'adaptivev2']
+
+
+def test_choose_lookup_uses_cache(user_dir):
+    expected = convert.choose_lookup('tenx', 'imgt', 'mouse', verbose=False)
+
+    # Once scanned, resolving a species does not touch the filesystem
+    with (
+        patch('os.path.exists', side_effect=AssertionError),
+        patch('os.listdir', side_effect=AssertionError),
+        patch('os.path.isfile', side_effect=AssertionError),
+    ):
+        assert convert.choose_lookup('tenx', 'imgt', 'mouse', verbose=False) == expected
+
+
+def test_registry_refreshes_after_build(user_dir):
+    assert 'rabbit' not in registry.list_species()['species'].tolist()
+
+    build_lookup.build_lookup_from_fastas(utils.get_example_path('fasta_dir'), 'rabbit')
+
+    out = registry.list_species().set_index('species')
+    assert out.loc['rabbit', 'source'] == 'user'
+    assert out.loc['rabbit', 'path'] == str(user_dir / 'rabbit')
+    assert out.loc['rabbit', ['imgt', 'tenx', 'adaptive']].tolist() == [10, 8, 21]
+    manifest = build_lookup.read_manifest(str(user_dir / 'rabbit'))
+    assert out.loc['rabbit', 'built'] == manifest['built']
+
+
+def test_registry_finds_species_built_elsewhere(user_dir):
+    registry.get_registry()
+
+    # Tables written by another process after the registry was scanned
+    os.makedirs(user_dir / 'llama')
+    lookup = pd.read_csv(utils.get_example_path('fasta_dir/lookup.csv'))
+    lookup.to_csv(user_dir / 'llama' / 'lookup.csv', index=False)
+
+    assert convert.choose_lookup('imgt', 'tenx', 'llama') == str(
+        user_dir / 'llama' / 'lookup.csv'
+    )
+    info = registry.get_species('llama')
+    assert info['formats'] == ['imgt']
+    assert info['tenx'] is None
+
+    # Formats without a table are still reported as missing
+    with pytest.raises(FileNotFoundError):
+        convert.choose_lookup('tenx', 'imgt', 'llama')
+
+
+def test_list_species_cli(user_dir):
+    result = CliRunner().invoke(cli.entry_point, ['species'], catch_exceptions=False)
+    assert result.exit_code == 0
+    assert 'imgt,tenx,adaptive,adaptivev2' in result.output
+    assert 'rhesus' in result.output
@@ -0,0 +1,109 @@
+import logging
+import pandas as pd
+import pytest
+from tcrconvert import convert
+from tcrconvert.check import check_coverage
+from tcrconvert.metrics import Metrics
+from tcrconvert.resolve import get_resolver
+
+
+@pytest.mark.parametrize(
+    'gene, frm, to, expected',
+    [
+        ('TRBV30*07', 'imgt', 'adaptive', 'TCRBV30-01*07'),
+        ('TRBV30*07', 'imgt', 'tenx', 'TRBV30'),
+        ('TRAC*05', 'imgt', 'adaptive', 'NoData'),
+        ('TRBV99-3', 'tenx', 'adaptivev2', 'TCRBV99-03*01'),
+        ('TRBV99', 'tenx', 'imgt', 'TRBV99*01'),
+        ('TCRBV30-01*07', 'adaptive', 'imgt', 'TRBV30*07'),
+        ('TCRBV05-01*09', 'adaptive', 'imgt', 'TRBV5-1*09'),
+        ('TCRAV29-01*03', 'adaptive', 'tenx', 'TRAV29/DV5'),
+        ('TCRBV20-or09_02*05', 'adaptive', 'imgt', 'TRBV20/OR9-2*05'),
+        ('TCRBV99-02', 'adaptivev2', 'adaptive', 'TCRBV99-02'),
+        # Could be TRBV99-1 or TRBV99
+        ('TCRBV99-01*01', 'adaptive', 'imgt', None),
+        ('TCRBV99', 'adaptive', 'imgt', None),
+        ('BAD_V', 'tenx', 'imgt', None),
+        ('TRBV30', 'imgt', 'tenx', None),
+    ],
+)
+def test_resolve(gene, frm, to, expected):
+    assert get_resolver('human').resolve(gene, frm, to) == expected
+
+
+@pytest.mark.parametrize('species', ['human', 'mouse', 'rhesus'])
+@pytest.mark.parametrize('frm', ['imgt', 'tenx'])
+def test_resolver_matches_lookup_tables(species, frm):
+    lookup = convert.read_lookup(convert.choose_lookup(frm, 'imgt', species, False))
+    resolver = get_resolver(species)
+    for to in ['imgt', 'tenx', 'adaptive']:
+        if to != frm:
+            for gene, out in convert.lookup_mapping(lookup, frm, to).items():
+                assert resolver.resolve(gene, frm, to) == out
+
+
+def test_convert_gene_resolve(caplog):
+    df = pd.DataFrame({'v_gene': ['TRBV30*07', 'TRBV30*01', 'BAD_V', None]})
+    plain = convert.convert_gene(df, 'imgt', 'adaptive', verbose=False)
+    assert plain['v_gene'].isna().tolist() == [True, False, True, True]
+
+    metrics = Metrics()
+    with caplog.at_level(logging.WARNING):
+        out = convert.convert_gene(
+            df, 'imgt', 'adaptive', verbose=False, metrics=metrics, resolve=True
+        )
+    assert out['v_gene'].tolist()[:2] == ['TCRBV30-01*07', 'TCRBV30-01*01']
+    assert out['v_gene'].isna().tolist() == [False, False, True, True]
+    assert "converted with the naming rules: ['TRBV30*07']" in caplog.text
+    assert "['BAD_V']" in caplog.text
+    assert metrics.value('tcrconvert_rule_derived_genes') == 1
+
+
+def test_convert_gene_resolve_by_species(caplog):
+    df = pd.DataFrame(
+        {
+            'v_gene': ['TRBV30*07', 'TRBV30*07', 'TRAV1-2*01'],
+            'organism': ['human', 'mouse', 'human'],
+        }
+    )
+    with caplog.at_level(logging.WARNING):
+        out = convert.convert_gene(
+            df, 'imgt', 'tenx', species='organism', verbose=False, resolve=True
+        )
+    assert out['v_gene'].tolist() == ['TRBV30', 'TRBV30', 'TRAV1-2']
+    assert 'not in the lookup tables for human' in caplog.text
+    assert 'not in the lookup tables for mouse' in caplog.text
+
+
+def test_convert_gene_resolve_keeps_given_mappings():
+    df = pd.DataFrame({'v_gene': ['TRBV30*07'], 'organism': ['human']})
+    human = convert.lookup_mapping(
+        convert.read_lookup(convert.choose_lookup('imgt', 'tenx', verbose=False)),
+        'imgt',
+        'tenx',
+    )
+    mappings = {'human': human}
+
+    out = convert.convert_gene(
+        df,
+        'imgt',
+        'tenx',
+        species='organism',
+        verbose=False,
+        resolve=True,
+        mapping=mappings,
+    )
+    assert out['v_gene'].tolist() == ['TRBV30']
+    assert mappings['human'] is human
+    assert 'TRBV30*07' not in human
+
+
+def test_check_coverage_resolve():
+    df = pd.DataFrame({'v_gene': ['TRBV30*07', 'TRBV30*07,TRBV30*01', 'BAD_V']})
+    report = check_coverage(df, 'imgt', 'tenx', multi_sep=',', verbose=False)
+    assert report.loc[0, ['mapped', 'rule_derived', 'unmapped']].tolist() == [0, 0, 3]
+
+    report = check_coverage(
+        df, 'imgt', 'tenx', multi_sep=',', resolve=True, verbose=False
+    )
+    assert report.loc[0, ['mapped', 'rule_derived', 'unmapped']].tolist() == [2, 2, 1]
@@ -0,0 +1,96 @@
+import logging
+import pytest
+from tcrconvert import convert, shard, stream
+
+
+@pytest.fixture
+def tcr_file(tmp_path):
+    # Quoted line breaks, CRLF records, blank lines and no final line break
+    rows = []
+    for i in range(400):
+        note = f'"line {i}\nstill ""note"" {i}"' if i % 7 == 0 else f'n{i}'
+        gene = ['TRAV1-2', 'TRBV15', 'BAD_V', 'NA', '"TRAV29/DV5"'][i % 5]
+        eol = '\r\n' if i % 11 == 0 else '\n'
+        rows.append(f'{note},{gene},TRAC,CASS{i},x{i % 3}{eol}')
+        if i % 50 == 0:
+            rows.append('\n')
+    path = tmp_path / 'big.csv'
+    path.write_text(
+        'notes,v_gene,c_gene,cdr3,j_gene\n' + ''.join(rows).rstrip('\n'),
+        newline='',
+    )
+    return str(path)
+
+
+def test_use_shards(monkeypatch):
+    monkeypatch.setattr('os.cpu_count', lambda: 8)
+    assert shard.use_shards(10**12, None) == 1
+    assert shard.use_shards(10, 4, min_bytes=100) == 1
+    assert shard.use_shards(100, -1, min_bytes=100) == 8
+
+
+@pytest.mark.parametrize('n_shards', [2, 7, 50])
+def test_plan_shards(tcr_file, n_shards):
+    with open(tcr_file, 'rb') as f:
+        start = len(f.readline())
+    with convert._open_text(tcr_file) as f:
+        expected = list(stream.iter_records(f))[1:]
+
+    ranges = shard.plan_shards(tcr_file, start, n_shards)
+    assert 1 < len(ranges) <= n_shards
+    assert ranges[0][0] == start
+    records = []
+    for (a, b), (c, _) in zip(ranges, ranges[1:] + [(None, None)]):
+        assert c is None or b == c
+        with shard.open_range(tcr_file, a, b) as f:
+            records += list(stream.iter_records(f))
+    assert records == expected
+
+
+def test_open_range_closes_file_on_error(tcr_file, monkeypatch):
+    opened = []
+    init = shard._ByteRange.__init__
+
+    def record(self, *args):
+        init(self, *args)
+        opened.append(self._f)
+
+    def fail(*args, **kwargs):
+        raise MemoryError
+
+    monkeypatch.setattr(shard._ByteRange, '__init__', record)
+    monkeypatch.setattr(shard.io, 'BufferedReader', fail)
+    with pytest.raises(MemoryError):
+        shard.open_range(tcr_file, 0, 10)
+    assert opened[0].closed
+
+
+def test_record_start(tmp_path):
+    path = tmp_path / 'quoted.csv'
+    path.write_bytes(b'h\n"a\nb",c\nd\n')
+    assert shard.record_start(str(path), 2, odd=False) == 2
+    assert shard.record_start(str(path), 4, odd=True) == 10
+    assert shard.record_start(str(path), 5, odd=True) == 10
+    assert shard.record_start(str(path), 11, odd=False) == 12
+
+
+def test_splice_sharded(tcr_file, tmp_path, monkeypatch, caplog):
+    serial = str(tmp_path / 'serial.csv')
+    sharded = str(tmp_path / 'sharded.csv')
+    with caplog.at_level(logging.WARNING):
+        convert.convert_file(tcr_file, serial, 'tenx', 'imgt', passthrough=True)
+    serial_log = caplog.text
+
+    monkeypatch.setattr(shard, 'MIN_SHARD_BYTES', 0)
+    caplog.clear()
+    with caplog.at_level(logging.WARNING):
+        convert.convert_file(
+            tcr_file, sharded, 'tenx', 'imgt', passthrough=True, n_jobs=3
+        )
+
+    with open(serial, 'rb') as a, open(sharded, 'rb') as b:
+        assert a.read() == b.read()
+    assert caplog.text == serial_log
+    assert "['BAD_V']" in caplog.text
+    assert "The input column 'j_gene' doesn't contain any valid genes" in caplog.text
+    assert not [p for p in tmp_path.iterdir() if '.shard-' in p.name]
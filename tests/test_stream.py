@@ -0,0 +1,198 @@
+import io
+import logging
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from tcrconvert import cli, convert, stream, utils
+
+
+def test_iter_records():
+    f = io.StringIO('a,b\r\n"x\ny",z\n"""q""",w\nlast,row')
+    assert list(stream.iter_records(f)) == [
+        'a,b\r\n',
+        '"x\ny",z\n',
+        '"""q""",w\n',
+        'last,row',
+    ]
+
+
+def test_field_spans():
+    body = 'TRAV1-2,"a,b",,"say ""hi""",end'
+    spans = stream.field_spans(body, ',')
+    assert [stream.unquote(body[a:b]) for a, b in spans] == [
+        'TRAV1-2',
+        'a,b',
+        '',
+        'say "hi"',
+        'end',
+    ]
+    assert stream.field_spans('a\tb\t', '\t') == [(0, 1), (2, 3), (4, 4)]
+
+
+def test_quote():
+    assert stream.quote('TRAV1-2*01', ',') == 'TRAV1-2*01'
+    assert stream.quote('a,b', ',') == '"a,b"'
+    assert stream.quote('a,b', '\t') == 'a,b'
+    assert stream.quote('say "hi"', '\t') == '"say ""hi"""'
+
+
+def test_splice_records():
+    mapping = {'TRAV1-1': 'TRAV1-1*01', 'TRAC': 'NoData'}
+    stats = {0: stream.new_stats(), 2: stream.new_stats()}
+    records = ['TRAV1-1,"x,\ny",TRAC\n', '\n', '"TRAV1-1",NA,BAD']
+    out = list(stream.splice_records(records, ',', {0: mapping, 2: mapping}, stats))
+
+    assert out == ['TRAV1-1*01,"x,\ny",\n', 'TRAV1-1*01,NA,\n']
+    assert stats[0] == {'rows': 2, 'bad': 0, 'bad_genes': set()}
+    assert stats[2] == {'rows': 2, 'bad': 1, 'bad_genes': {'BAD'}}
+
+
+@pytest.mark.parametrize(
+    'example, frm, to, species, frm_cols',
+    [
+        ('tenx.csv', 'tenx', 'imgt', 'human', []),
+        ('tenx.csv', 'tenx', 'adaptive', 'human', []),
+        ('adaptive.tsv', 'adaptive', 'imgt', 'human', []),
+        ('imgt.csv', 'imgt', 'tenx', 'human', ['vGene', 'Jgene']),
+        (
+            'customcols.csv',
+            'tenx',
+            'adaptive',
+            'mouse',
+            ['myVgene', 'myDgene', 'myJgene', 'myCgene', 'myCDR3'],
+        ),
+    ],
+)
+def test_convert_file_passthrough(tmp_path, example, frm, to, species, frm_cols):
+    in_file = utils.get_example_path(example)
+    ext = example[-3:]
+    via_pandas = str(tmp_path / f'pandas.{ext}')
+    via_splice = str(tmp_path / f'splice.{ext}')
+
+    convert.convert_file(in_file, via_pandas, frm, to, species, frm_cols)
+    convert.convert_file(
+        in_file, via_splice, frm, to, species, frm_cols, passthrough=True
+    )
+
+    with open(via_pandas) as a, open(via_splice) as b:
+        assert a.read() == b.read()
+
+
+def test_convert_file_passthrough_quoted(tmp_path):
+    in_file = tmp_path / 'quoted.csv'
+    in_file.write_text(
+        'v_gene,note,j_gene,c_gene\n'
+        '"TRAV12-1","line one\nline two",TRAJ16,TRAC\n'
+        'TRBV15,"has, comma",,"TRBC2"\n'
+        'BAD_V,"say ""hi""",TRBJ2-5,TRBC2\n'
+    )
+    via_pandas = str(tmp_path / 'pandas.csv')
+    via_splice = str(tmp_path / 'splice.csv')
+
+    convert.convert_file(str(in_file), via_pandas, 'tenx', 'imgt')
+    convert.convert_file(str(in_file), via_splice, 'tenx', 'imgt', passthrough=True)
+
+    with open(via_pandas) as a, open(via_splice) as b:
+        assert a.read() == b.read()
+
+
+def test_convert_file_passthrough_messages(tmp_path, caplog):
+    in_file = tmp_path / 'in.csv'
+    in_file.write_text('v_gene,j_gene\nTRBV15,BAD_J\nBAD_V,BAD_J2\n')
+    out_file = str(tmp_path / 'out.csv')
+
+    with caplog.at_level(logging.WARNING):
+        convert.convert_file(
+            str(in_file), out_file, 'tenx', 'imgt', verbose=False, passthrough=True
+        )
+
+    assert "The input column 'j_gene' doesn't contain any valid genes" in caplog.text
+    assert "['BAD_V']" in caplog.text
+    with open(out_file) as f:
+        assert f.read() == 'v_gene,j_gene\nTRBV15*01,BAD_J\n,BAD_J2\n'
+
+    # Empty input
+    empty = tmp_path / 'empty.csv'
+    empty.write_text('v_gene,j_gene\n')
+    with pytest.raises(ValueError):
+        convert.convert_file(str(empty), out_file, 'tenx', 'imgt', passthrough=True)
+
+    # Mismatched delimiters
+    with pytest.raises(ValueError):
+        convert.convert_file(
+            str(in_file), str(tmp_path / 'out.tsv'), 'tenx', 'imgt', passthrough=True
+        )
+
+
+def test_convert_gene_cli_passthrough(tmp_path):
+    out_file = str(tmp_path / 'out.csv')
+    args = [
+        'convert',
+        '-i',
+        utils.get_example_path('tenx.csv'),
+        '-f',
+        'tenx',
+        '-t',
+        'imgt',
+    ]
+
+    result = CliRunner().invoke(
+        cli.entry_point,
+        args + ['-o', out_file, '--passthrough'],
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 0
+    with open(out_file) as f:
+        assert f.readline().startswith('barcode,is_cell,contig_id')
+        assert ',TRAV29/DV5*01,,TRAJ12*01,TRAC*01,' in f.readline()
+
+    result = CliRunner().invoke(
+        cli.entry_point, args + ['-o', str(tmp_path / 'out.tsv'), '--passthrough']
+    )
+    assert result.exit_code != 0
+    assert 'must both be CSV or both be TSV' in result.output
+
+
+def test_convert_file_dtype_backend(tmp_path):
+    pytest.importorskip('pyarrow')
+    in_file = utils.get_example_path('tenx.csv')
+    via_object = str(tmp_path / 'object.csv')
+    via_arrow = str(tmp_path / 'arrow.csv')
+
+    convert.convert_file(in_file, via_object, 'tenx', 'adaptive', verbose=False)
+    result = CliRunner().invoke(
+        cli.entry_point,
+        [
+            'convert',
+            '-i',
+            in_file,
+            '-o',
+            via_arrow,
+            '-f',
+            'tenx',
+            '-t',
+            'adaptive',
+            '--dtype-backend',
+            'pyarrow',
+        ],
+        catch_exceptions=False,
+    )
+
+    assert result.exit_code == 0
+    with open(via_object) as a, open(via_arrow) as b:
+        assert a.read() == b.read()
+
+
+def test_convert_file_dtype_backend_needs_pandas_2(tmp_path, monkeypatch):
+    pytest.importorskip('pyarrow')
+    monkeypatch.setattr(pd, '__version__', '1.5.3')
+
+    with pytest.raises(ImportError):
+        convert.convert_file(
+            utils.get_example_path('tenx.csv'),
+            str(tmp_path / 'out.csv'),
+            'tenx',
+            'imgt',
+            dtype_backend='pyarrow',
+            verbose=False,
+        )
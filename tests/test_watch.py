@@ -0,0 +1,162 @@
+import os
+import json
+import shutil
+import threading
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from tcrconvert import cli, convert, converter, utils, watch
+
+
+@pytest.fixture(scope='module')
+def conv():
+    return converter.Converter('human')
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    in_dir = tmp_path / 'spool'
+    out_dir = tmp_path / 'out'
+    in_dir.mkdir()
+    return str(in_dir), str(out_dir)
+
+
+def make_watcher(dirs, conv, **kwargs):
+    kwargs = {'interval': 0, 'settle': 0, 'verbose': False, **kwargs}
+    return watch.Watcher(*dirs, 'tenx', 'imgt', converter=conv, **kwargs)
+
+
+def expected(path):
+    sep = convert.delimiter(path)
+    df = pd.read_csv(path, sep=sep, dtype=str)
+    return convert.convert_gene(df, 'tenx', 'imgt', verbose=False)
+
+
+def test_watch_converts_files(dirs, conv):
+    in_dir, out_dir = dirs
+    shutil.copy(utils.get_example_path('tenx.csv'), in_dir)
+    tenx = pd.read_csv(utils.get_example_path('tenx.csv'), dtype=str)
+    tenx.to_csv(os.path.join(in_dir, 'b.tsv'), sep='\t', index=False)
+    # Hidden, temporary and other files are left alone
+    for name in ['.partial.csv', 'notes.txt']:
+        shutil.copy(utils.get_example_path('tenx.csv'), os.path.join(in_dir, name))
+
+    assert make_watcher(dirs, conv, workers=2, queue_size=1).run(once=True) == 2
+
+    assert sorted(os.listdir(out_dir)) == [watch.LEDGER_NAME, 'b.tsv', 'tenx.csv']
+    result = pd.read_csv(os.path.join(out_dir, 'b.tsv'), sep='\t', dtype=str)
+    pd.testing.assert_frame_equal(result, expected(os.path.join(in_dir, 'b.tsv')))
+
+
+def test_watch_restart_uses_ledger(dirs, conv):
+    in_dir, out_dir = dirs
+    shutil.copy(utils.get_example_path('tenx.csv'), os.path.join(in_dir, 'a.csv'))
+    make_watcher(dirs, conv).run(once=True)
+    mtime = os.stat(os.path.join(out_dir, 'a.csv')).st_mtime_ns
+
+    # Nothing to redo
+    assert make_watcher(dirs, conv).run(once=True) == 0
+    assert os.stat(os.path.join(out_dir, 'a.csv')).st_mtime_ns == mtime
+
+    # New files and new versions of old files are picked up
+    shutil.copy(utils.get_example_path('tenx.csv'), os.path.join(in_dir, 'b.csv'))
+    with open(os.path.join(in_dir, 'a.csv'), 'a') as f:
+        f.write(
+            'AAA-1,True,AAA-1_contig_1,True,1,TRB,TRBV20-1,None,TRBJ2-7,TRBC2,True,True,CASS,TGT,1,1,clonotype9,None\n'
+        )
+    assert make_watcher(dirs, conv).run(once=True) == 2
+
+    ledger = watch.Ledger(os.path.join(out_dir, watch.LEDGER_NAME))
+    assert len(ledger) == 3
+    assert ledger.get(watch.file_key(os.path.join(in_dir, 'a.csv')))['status'] == 'done'
+
+
+def test_watch_waits_for_complete_files(dirs, conv):
+    in_dir, _ = dirs
+    path = os.path.join(in_dir, 'a.csv')
+    watcher = make_watcher(dirs, conv)
+
+    with open(path, 'w') as f:
+        f.write('v_gene,j_gene\n')
+    assert watcher.scan() == []
+    with open(path, 'a') as f:
+        f.write('TRBV20-1,TRBJ2-7\n')
+    assert watcher.scan() == []
+    assert watcher.scan() == [path]
+
+    # Too recently modified
+    watcher = make_watcher(dirs, conv, settle=3600)
+    watcher.scan()
+    assert watcher.scan() == []
+
+
+def test_watch_records_failures(dirs, conv, caplog):
+    in_dir, out_dir = dirs
+    with open(os.path.join(in_dir, 'empty.csv'), 'w') as f:
+        f.write('v_gene,j_gene\n')
+
+    assert make_watcher(dirs, conv).run(once=True) == 0
+    assert 'Could not convert' in caplog.text
+    assert os.listdir(out_dir) == [watch.LEDGER_NAME]
+    with open(os.path.join(out_dir, watch.LEDGER_NAME)) as f:
+        assert json.loads(f.readline())['status'] == 'failed'
+
+    # Not retried until the file changes
+    assert make_watcher(dirs, conv).run(once=True) == 0
+    with open(os.path.join(out_dir, watch.LEDGER_NAME)) as f:
+        assert len(f.readlines()) == 1
+
+
+def test_watch_raises_unexpected_errors(dirs, conv, monkeypatch):
+    in_dir, _ = dirs
+    shutil.copy(utils.get_example_path('tenx.csv'), in_dir)
+    watcher = make_watcher(dirs, conv)
+
+    def broken(*args):
+        raise TypeError('bug')
+
+    monkeypatch.setattr(watcher.converter, 'convert', broken)
+    with pytest.raises(TypeError):
+        watcher.run(once=True)
+    # Not recorded, so it is converted once the bug is fixed
+    assert len(watcher.ledger) == 0
+    monkeypatch.undo()
+    assert watcher.run(once=True) == 1
+
+
+def test_watch_stop(dirs, conv):
+    watcher = make_watcher(dirs, conv, interval=0.01)
+    thread = threading.Thread(target=watcher.run)
+    thread.start()
+    shutil.copy(utils.get_example_path('tenx.csv'), dirs[0])
+    for _ in range(500):
+        if watcher.processed:
+            break
+        threading.Event().wait(0.01)
+    watcher.stop()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert watcher.processed == 1
+
+
+def test_watch_errors(dirs, conv):
+    in_dir, out_dir = dirs
+    with pytest.raises(ValueError):
+        make_watcher((in_dir, in_dir), conv)
+    with pytest.raises(ValueError):
+        make_watcher((out_dir + '_missing', out_dir), conv)
+    with pytest.raises(ValueError):
+        make_watcher(dirs, conv, workers=0)
+
+
+def test_watch_cli(dirs):
+    in_dir, out_dir = dirs
+    shutil.copy(utils.get_example_path('tenx.csv'), in_dir)
+    args = ['watch', '-i', in_dir, '-o', out_dir, '-f', 'tenx', '-t', 'imgt']
+    result = CliRunner().invoke(
+        cli.entry_point, args + ['--once', '--interval', '0', '--settle', '0']
+    )
+
+    assert result.exit_code == 0, result.output
+    assert 'Converted 1 files' in result.output
+    assert os.path.exists(os.path.join(out_dir, 'tenx.csv'))